@@ -0,0 +1,171 @@
+"""Admission control for heavy pipeline endpoints.
+
+Each endpoint has a limit on pipelines in flight and on requests waiting for
+a slot, and every pipeline reserves an estimated amount of memory against a
+process-wide budget. A request that can neither start nor queue, or that
+waits longer than its queue timeout, is rejected with a Retry-After estimate
+instead of slowing down everything already running.
+
+Limits are overridable per endpoint with
+ADMISSION_LIMITS='{"generate_parallel_svg": {"max_in_flight": 2, "memory_mb": 200}}'.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MEMORY_BUDGET_MB = float(os.getenv('ADMISSION_MEMORY_BUDGET_MB', '1536'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '30'))
+
+# Memory estimates cover the decoded 1024x1024 images a pipeline holds at once
+# (base64 strings, bytes and PIL copies) plus SVG text
+DEFAULT_LIMITS = {
+    'generate_svg': {'max_in_flight': 4, 'max_queued': 8, 'memory_mb': 60},
+    'generate_parallel_svg': {'max_in_flight': 3, 'max_queued': 6, 'memory_mb': 150},
+    'generate_parallel_svg_batch': {'max_in_flight': 1, 'max_queued': 2, 'memory_mb': 450},
+    'chat_create': {'max_in_flight': 3, 'max_queued': 6, 'memory_mb': 60},
+}
+ADMISSION_LIMITS = json.loads(os.getenv('ADMISSION_LIMITS', '{}'))
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries a Retry-After estimate in seconds"""
+
+    def __init__(self, endpoint, reason, retry_after):
+        super().__init__(f"{endpoint} is at capacity ({reason})")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Endpoint:
+    def __init__(self, name, max_in_flight, max_queued, memory_mb):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.memory_mb = memory_mb
+        self.in_flight = 0
+        self.queued = 0
+        self.durations = deque(maxlen=50)
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+
+class AdmissionController:
+    """In-flight, queue-depth and memory limits shared by all endpoints of a process"""
+
+    def __init__(self, memory_budget_mb=ADMISSION_MEMORY_BUDGET_MB, limits=None):
+        self.memory_budget_mb = memory_budget_mb
+        self.memory_in_use_mb = 0.0
+        self.endpoints = {}
+        self._cond = threading.Condition()
+        limits = limits or {}
+        for name in set(DEFAULT_LIMITS) | set(limits):
+            self.configure(name, **dict(DEFAULT_LIMITS.get(name, {}), **limits.get(name, {})))
+
+    def configure(self, name, max_in_flight=2, max_queued=4, memory_mb=100):
+        with self._cond:
+            self.endpoints[name] = _Endpoint(name, int(max_in_flight), int(max_queued), float(memory_mb))
+
+    def _endpoint(self, name):
+        if name not in self.endpoints:
+            self.configure(name)
+        return self.endpoints[name]
+
+    def _fits(self, endpoint):
+        if endpoint.in_flight >= endpoint.max_in_flight:
+            return False
+        # A lone request larger than the whole budget still runs rather than deadlocking
+        return self.memory_in_use_mb == 0 or self.memory_in_use_mb + endpoint.memory_mb <= self.memory_budget_mb
+
+    def retry_after(self, endpoint):
+        """Seconds until a slot is likely free, from recent pipeline durations"""
+        average = sum(endpoint.durations) / len(endpoint.durations) if endpoint.durations else 30.0
+        return max(1, math.ceil(average * (endpoint.queued + 1) / endpoint.max_in_flight))
+
+    def acquire(self, name, timeout=ADMISSION_QUEUE_TIMEOUT):
+        """Take a slot, waiting up to timeout in the queue; timeout=None waits without a queue limit"""
+        with self._cond:
+            endpoint = self._endpoint(name)
+            if not self._fits(endpoint):
+                if timeout is not None and (endpoint.queued >= endpoint.max_queued or timeout <= 0):
+                    endpoint.stats['rejected'] += 1
+                    raise Rejected(name, 'queue full', self.retry_after(endpoint))
+
+                endpoint.queued += 1
+                endpoint.stats['queued'] += 1
+                deadline = None if timeout is None else time.monotonic() + timeout
+                try:
+                    while not self._fits(endpoint):
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            endpoint.stats['timed_out'] += 1
+                            raise Rejected(name, 'queue timeout', self.retry_after(endpoint))
+                        self._cond.wait(remaining)
+                finally:
+                    endpoint.queued -= 1
+
+            endpoint.in_flight += 1
+            endpoint.stats['admitted'] += 1
+            self.memory_in_use_mb += endpoint.memory_mb
+            return time.monotonic()
+
+    def release(self, name, started):
+        with self._cond:
+            endpoint = self.endpoints[name]
+            endpoint.in_flight -= 1
+            endpoint.durations.append(time.monotonic() - started)
+            self.memory_in_use_mb = max(0.0, self.memory_in_use_mb - endpoint.memory_mb)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, name, timeout=ADMISSION_QUEUE_TIMEOUT):
+        """Hold a slot for the duration of the block; raises Rejected when at capacity"""
+        started = self.acquire(name, timeout)
+        try:
+            yield
+        finally:
+            self.release(name, started)
+
+    def summary(self):
+        """Current utilization and counters per endpoint"""
+        with self._cond:
+            return {
+                'memory_budget_mb': self.memory_budget_mb,
+                'memory_in_use_mb': round(self.memory_in_use_mb, 1),
+                'endpoints': {
+                    name: dict(
+                        endpoint.stats,
+                        in_flight=endpoint.in_flight,
+                        max_in_flight=endpoint.max_in_flight,
+                        queued_now=endpoint.queued,
+                        max_queued=endpoint.max_queued,
+                        memory_mb=endpoint.memory_mb,
+                        avg_duration_s=round(sum(endpoint.durations) / len(endpoint.durations), 2) if endpoint.durations else None
+                    )
+                    for name, endpoint in self.endpoints.items()
+                }
+            }
+
+
+controller = AdmissionController(limits=ADMISSION_LIMITS)
+
+
+@contextmanager
+def admit(name, timeout=ADMISSION_QUEUE_TIMEOUT):
+    """controller.admit() on the process-wide controller, a no-op when disabled"""
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    with controller.admit(name, timeout):
+        yield
+
+
+def summary():
+    return controller.summary() if ADMISSION_ENABLED else {'enabled': False}
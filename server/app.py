@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 import os
 import requests
 import json
@@ -15,11 +15,6 @@ from datetime import datetime
 from dotenv import load_dotenv
 # import vtracer  # Add vtracer import - temporarily disabled due to Render compilation issues
 import asyncio
-import aiohttp
-from functools import lru_cache
-import hashlib
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
@@ -104,15 +99,44 @@ PROMPT_ENHANCER_MODEL = "gpt-4o-mini"
 GPT_IMAGE_MODEL = "gpt-image-1"
 SVG_GENERATOR_MODEL = "gpt-4o-mini"
 CHAT_ASSISTANT_MODEL = "gpt-4o-mini"
+DESIGN_BRIEF_MODEL = "gpt-4o-mini"
+DESIGN_BRIEF_MAX_TOKENS = 8000
 
 # Add parallel SVG processing imports
-from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 import numpy as np
-
-# Add after existing imports
+import functools
+import threading
+import time
+from stage_graph import StageError, StageGraph, StopPipeline, parse_include
+import llm_client
+import rate_limiter
+from prompt_heuristics import build_local_image_prompt
+import speculative_image
+from response_cache import response_cache, make_key
+import similar_prompts
+import singleflight
+import circuit_breaker
+import hedging
+from job_queue import job_queue
+import admission
+import checkpoints
+import fewshot
+import context_compressor
+import design_brief
+import vector_classifier
+import batch_runner
+import sse
+from sse import sse_event
+
+# Add after existing imports; the layer modules below need OpenCV, so a missing
+# cv2 only disables the parallel pipeline
 try:
-    import vtracer
+    import text_layer
+    import text_removal
+    import background_plate
+    import vectorize
+    import vtracer_tuning
     import remove_text_simple
     import png_to_svg_converter
     PARALLEL_FEATURES_AVAILABLE = True
@@ -128,16 +152,78 @@ os.makedirs(UNIFIED_STORAGE_DIR, exist_ok=True)
 PARALLEL_OUTPUTS_DIR = os.path.join(IMAGES_DIR, 'parallel')
 os.makedirs(PARALLEL_OUTPUTS_DIR, exist_ok=True)
 
+# Identical concurrent requests, and identical stage calls across pipelines,
+# share one in-flight computation
+REQUEST_FLIGHTS = singleflight.SingleFlight('requests')
+STAGE_FLIGHTS = singleflight.SingleFlight('stages')
+
+def text_stage_routes(stage, model, api_key, openrouter_model=None, default_order=None, openai_params=None):
+    """A stage's routes in its configured order (hedging.STAGE_ROUTES), OpenAI then OpenRouter by default.
+
+    model is used on OpenAI and openrouter_model (the same OpenAI model by
+    default) on OpenRouter unless the route pins one; default_order replaces
+    the global default for this stage and openai_params override call params
+    on OpenAI routes.
+    """
+    routes = []
+    for provider, pinned_model in hedging.stage_route_order(stage, default_order):
+        if provider == 'openai':
+            routes.append(hedging.route('openai', pinned_model or model, api_key, **(openai_params or {})))
+        elif provider == 'openrouter':
+            if OPENROUTER_API_KEY:
+                routes.append(hedging.route('openrouter', pinned_model or openrouter_model or f"openai/{model}",
+                                            OPENROUTER_API_KEY))
+        else:
+            logger.warning(f"Unknown provider {provider!r} in the routes for stage {stage}")
+    return routes or [hedging.route('openai', model, api_key, **(openai_params or {}))]
+
+def cached_chat(api_key, model, messages, temperature=None, stage=None, cache=True, **params):
+    """llm_client.chat() behind the persistent response cache, hedged when a stage is given.
+
+    cache=False still shares identical in-flight calls but neither reads nor
+    writes the cache, for callers that only cache a reply once it validates.
+    """
+    # The whole conversation is keyed, so assistant turns and max_tokens count too
+    key = make_key(model, None, messages, temperature, response_format=params.get('response_format'),
+                   max_tokens=params.get('max_tokens'))
+    use_cache = cache and response_cache is not None
+
+    if use_cache:
+        content = response_cache.get(key)
+        if content is not None:
+            logger.info(f"Response cache hit for {model}: {str(messages[-1]['content'])[:60]}...")
+            return llm_client.ChatResult('openai', model, 200, content=content, cached=True)
+
+    def call():
+        if stage:
+            return hedging.hedged_chat(stage, text_stage_routes(stage, model, api_key), messages,
+                                       temperature=temperature, **params)
+        return llm_client.chat(model, messages, api_key=api_key, temperature=temperature, **params)
+
+    result, shared = STAGE_FLIGHTS.do(key, call)
+    if result.truncated:
+        # A reply cut off at max_tokens is used once but never replayed
+        logger.warning(f"{model} reply hit max_tokens, not caching it")
+    elif result.ok and use_cache and not shared:
+        response_cache.set(key, result.content)
+    return result
+
+def routed_vision(stage, model, system_prompt, text, image_data, **params):
+    """Vision call on the stage's routes, so an open OpenAI circuit fails over to OpenRouter"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": llm_client.vision_content(text, image_data)}
+    ]
+    return hedging.hedged_chat(stage, text_stage_routes(stage, model, OPENAI_API_KEY_SVG), messages, **params)
+
 def check_vector_suitability(user_input):
-    """Check if the prompt is suitable for SVG vector graphics"""
+    """Check if the prompt is suitable for SVG vector graphics, locally unless the classifier is unsure"""
     logger.info(f"Checking vector suitability for: {user_input[:100]}...")
-    
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
+    return vector_classifier.check(user_input, llm_vector_suitability)
 
+def llm_vector_suitability(user_input):
+    """LLM suitability check for the classifier's uncertain band; None when the call fails"""
+    
     payload = {
         "model": PLANNER_MODEL,
         "messages": [
@@ -167,34 +253,27 @@ Provide guidance if the request isn't suitable."""
             }
         ],
         "temperature": 0.7,
-        "max_tokens": 5000
+        "max_tokens": 500
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
+    result = llm_client.chat(api_key=OPENAI_API_KEY_ENHANCER, **payload)
 
-    if response.status_code != 200:
-        logger.error(f"Vector suitability check error: {response_data}")
-        return {"not_suitable": False}  # Default to allowing if check fails
+    if not result.ok:
+        logger.error(f"Vector suitability check error: {result.error}")
+        return None
 
-    analysis = response_data["choices"][0]["message"]["content"].lower()
+    analysis = result.content.lower()
     not_suitable = "not suitable" in analysis or "unsuitable" in analysis
     
     return {
         "not_suitable": not_suitable,
-        "guidance": response_data["choices"][0]["message"]["content"] if not_suitable else None
+        "guidance": result.content if not_suitable else None
     }
 
 def plan_design(user_input):
     """Plan the design approach based on user input with enhanced focus on image generation quality"""
     logger.info(f"Planning design for: {user_input[:100]}...")
     
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
     # Use simplified, practical planning approach focused on concrete specifications
     system_content = """You are a practical design planner. Create a clear, actionable plan for the design request that focuses on specific, implementable details.
 
@@ -244,25 +323,18 @@ Focus on creating a practical, implementable plan with specific details that can
         "max_tokens":  6000
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
+    result = cached_chat(OPENAI_API_KEY_ENHANCER, stage='plan_design', **payload)
 
-    if response.status_code != 200:
-        logger.error(f"Design planning error: {response_data}")
+    if not result.ok:
+        logger.error(f"Design planning error: {result.error}")
         return "Error in design planning"
 
-    return response_data["choices"][0]["message"]["content"]
+    return result.content
 
 def generate_design_knowledge(design_plan, user_input):
     """Generate specific design knowledge based on the plan and user input with focus on stunning visuals"""
     logger.info("Generating design knowledge...")
     
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
     # Use practical, actionable design knowledge approach
     system_content = """You are a practical design knowledge expert. Provide specific, actionable design insights and best practices that can be directly implemented.
 
@@ -316,31 +388,17 @@ Focus on providing concrete, implementable advice that will directly improve des
         "max_tokens": 18000
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
+    result = cached_chat(OPENAI_API_KEY_ENHANCER, stage='generate_design_knowledge', **payload)
 
-    if response.status_code != 200:
-        logger.error(f"Design knowledge generation error: {response_data}")
+    if not result.ok:
+        logger.error(f"Design knowledge generation error: {result.error}")
         return "Error in generating design knowledge"
 
-    return response_data["choices"][0]["message"]["content"]
+    return result.content
 
-def pre_enhance_prompt(user_input):
-    """Initial enhancement of user query using proven examples and detailed specifications"""
-    logger.info(f"Pre-enhancing prompt: {user_input[:100]}...")
-    
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
-    payload = {
-        "model": PRE_ENHANCER_MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": """You are an expert prompt enhancer specializing in creating detailed, comprehensive prompts that generate exceptional graphic designs. Your task is to transform basic user requests into rich, detailed prompts following the proven format from high-quality training examples.
+# Pre-enhancer system prompt pieces; the examples between the formats and the
+# closing instructions are retrieved per request from the few-shot corpus
+PRE_ENHANCER_INSTRUCTIONS = """You are an expert prompt enhancer specializing in creating detailed, comprehensive prompts that generate exceptional graphic designs. Your task is to transform basic user requests into rich, detailed prompts following the proven format from high-quality training examples.
 
 CRITICAL REQUIREMENTS:
 1. Follow the EXACT format structure from the examples below
@@ -351,36 +409,26 @@ CRITICAL REQUIREMENTS:
 6. Ensure professional typography hierarchy
 7. Create prompts that result in visually stunning, usable designs
 
-TESTIMONIAL DESIGN FORMAT (use this structure for testimonials):
+"""
+
+PRE_ENHANCER_FORMATS = {
+    'testimonial': """TESTIMONIAL DESIGN FORMAT (use this structure for testimonials):
 "Create a testimonial with a [background color] background featuring a [container description]. The layout includes a [title description] at the [position], styled with the [font name] font, placed [positioning details]. Below, there are [decorative element count and description] arranged [arrangement], adding [visual effect]. The body text, written in [font name] font, is [positioning] and displays [content description], ensuring [quality requirement]. Finally, include [additional elements] to enhance [design goal].
 
 **Image:** No image
 **Fonts:** [Font 1], [Font 2], [Font 3]
 **Custom Elements:** [Element description] *[count]"
-
-COMING SOON DESIGN FORMAT (use this structure for coming soon pages):
+""",
+    'coming_soon': """COMING SOON DESIGN FORMAT (use this structure for coming soon pages):
 "Create a coming soon page with a [background description] background, featuring [main layout elements]. The layout includes [primary text] styled in [font details] at [size and positioning]. Below, [secondary elements] are positioned [placement details]. The design incorporates [decorative elements] with [color specifications] for [visual purpose]. Additional elements include [supporting content] in [font specifications], [positioning], ensuring [design quality]. The overall composition maintains [design principles] suitable for [target purpose].
 
 **Image:** No image  
 **Fonts:** [Font 1], [Font 2], [Font 3]
 **Custom Elements:** [Element description] *[count]"
+"""
+}
 
-ENHANCED TRAINING EXAMPLES - USE THESE AS REFERENCE:
-
-TESTIMONIAL EXAMPLES:
-- "Create a testimonial with a teal background featuring a beige square container at the center. The layout includes a large bold 'TESTIMONIAL' text at the top, styled with the Alfarn font, placed in the middle of the container. Below, there are three decorative circles in orange arranged horizontally, adding a playful touch. The body text, written in PT Serif font, is centered and displays a series of lines about customer experience, ensuring a clear and engaging read. Finally, include square quotation marks on either side of the testimonial text to enhance the visual appeal and authenticity.
-
-**Image:** No image
-**Fonts:** Alfarn, PT Serif, Aileron  
-**Custom Elements:** Square quotation marks *2"
-
-- "Create a testimonial with a white background featuring a large pink circle at the center. The layout includes testimonial text placed centrally with multiple lines, and the customer's name at the bottom. Decoratively, there are four 4-spoke stars located in each corner of the design and a dotted circle element subtly integrated around the testimonial. The text is styled using the Raleway font, with the testimonial text in a size of 42, and the customer's name in a larger size of 48, both in black and dark blue respectively. The design maintains a clean, professional appearance suitable for showcasing customer feedback.
-
-**Image:** No image
-**Fonts:** Raleway
-**Custom Elements:** 4 spoke star *4, dotted circle"
-
-MANDATORY ENHANCEMENTS:
+PRE_ENHANCER_CLOSING = """MANDATORY ENHANCEMENTS:
 - Always specify exact font names, sizes, and styling
 - Include precise color specifications (hex codes when possible)
 - Detail container shapes, borders, and backgrounds
@@ -390,6 +438,28 @@ MANDATORY ENHANCEMENTS:
 - Add professional finishing touches
 
 Transform the user's request into this comprehensive format while maintaining design excellence and usability."""
+
+def pre_enhancer_system_prompt(user_input):
+    """Pre-enhancer instructions with only the formats and examples relevant to the request"""
+    examples = fewshot.select_examples(user_input)
+    # Without a relevant example there is no evidence for one format, so all of them go in
+    categories = {example['category'] for example in examples} & set(PRE_ENHANCER_FORMATS) or set(PRE_ENHANCER_FORMATS)
+    formats = "\n".join(text for category, text in PRE_ENHANCER_FORMATS.items() if category in categories)
+    prompt = PRE_ENHANCER_INSTRUCTIONS + formats + "\n"
+    if examples:
+        prompt += "ENHANCED TRAINING EXAMPLES - USE THESE AS REFERENCE:\n\n" + fewshot.format_examples(examples) + "\n\n"
+    return prompt + PRE_ENHANCER_CLOSING
+
+def pre_enhance_prompt(user_input):
+    """Initial enhancement of user query using proven examples and detailed specifications"""
+    logger.info(f"Pre-enhancing prompt: {user_input[:100]}...")
+    
+    payload = {
+        "model": PRE_ENHANCER_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": pre_enhancer_system_prompt(user_input)
             },
             {
                 "role": "user",
@@ -401,27 +471,20 @@ Transform the user's request into this comprehensive format while maintaining de
     }
 
     logger.info(f"Calling OpenAI Chat API for initial prompt enhancement with model: {PRE_ENHANCER_MODEL}")
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
+    result = cached_chat(OPENAI_API_KEY_ENHANCER, stage='pre_enhance_prompt', **payload)
 
-    if response.status_code != 200:
-        logger.error(f"OpenAI API error: {response_data}")
-        logger.error(f"Response status code: {response.status_code}")
-        logger.error(f"Response headers: {response.headers}")
-        raise Exception(f"OpenAI API error: {response_data.get('error', {}).get('message', 'Unknown error')}")
+    if not result.ok:
+        logger.error(f"OpenAI API error: {result.error}")
+        logger.error(f"Response status code: {result.status}")
+        logger.error(f"Response headers: {result.headers}")
+        raise Exception(f"OpenAI API error: {result.error}")
 
-    enhanced_prompt = response_data["choices"][0]["message"]["content"]
+    enhanced_prompt = result.content
     logger.info(f"Successfully enhanced prompt. Result: {enhanced_prompt[:100]}...")
     return enhanced_prompt
 
 def enhance_prompt_with_chat(user_input):
     """Enhance user prompt using Chat Completions API with proven quality requirements"""
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
     payload = {
         "model": PROMPT_ENHANCER_MODEL,
         "messages": [
@@ -478,34 +541,64 @@ Transform the design description into a comprehensive SVG specification that wil
     }
 
     logger.info(f"Calling OpenAI Chat API for prompt enhancement with model: {PROMPT_ENHANCER_MODEL}")
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
-
-    if response.status_code != 200:
-        logger.error(f"OpenAI API error: {response_data}")
-        raise Exception(f"OpenAI API error: {response_data.get('error', {}).get('message', 'Unknown error')}")
-
-    return response_data["choices"][0]["message"]["content"]
+    result = cached_chat(OPENAI_API_KEY_ENHANCER, stage='enhance_prompt_with_chat', **payload)
+
+    if not result.ok:
+        logger.error(f"OpenAI API error: {result.error}")
+        raise Exception(f"OpenAI API error: {result.error}")
+
+    return result.content
+
+def generate_design_brief(user_input):
+    """Plan, typography, palette, image prompt and SVG spec from one structured-output call"""
+    logger.info(f"Generating design brief: {user_input[:100]}...")
+
+    # Only a brief that passed validation is cached; caching raw replies would
+    # replay an invalid first reply and its re-asks on every identical request
+    key = make_key(DESIGN_BRIEF_MODEL, design_brief.SYSTEM_PROMPT, user_input, 0.8,
+                   response_format=design_brief.response_format(), max_tokens=DESIGN_BRIEF_MAX_TOKENS)
+    if response_cache is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.info(f"Response cache hit for design brief: {user_input[:60]}...")
+            return json.loads(cached)
+
+    def chat(messages, response_format):
+        return cached_chat(OPENAI_API_KEY_ENHANCER, model=DESIGN_BRIEF_MODEL, messages=messages,
+                           temperature=0.8, stage='design_brief', cache=False, max_tokens=DESIGN_BRIEF_MAX_TOKENS,
+                           response_format=response_format)
+
+    brief = design_brief.request_brief(user_input, chat)
+    if response_cache is not None:
+        response_cache.set(key, json.dumps(brief))
+    return brief
+
+def add_design_brief_stages(graph):
+    """Brief mode: the planning stages become fields of one design_brief stage"""
+    graph.add('design_brief', lambda user_input: generate_design_brief(user_input), deps=['user_input'])
+    graph.add('design_plan', lambda design_brief: design_brief['design_plan'], deps=['design_brief'])
+    graph.add('design_knowledge', design_brief.design_knowledge, deps=['design_brief'])
+    graph.add('design_context', build_design_context,
+              deps=['design_plan', 'design_knowledge', 'user_input'])
+    graph.add('pre_enhanced_prompt', lambda design_brief: design_brief['image_prompt'], deps=['design_brief'])
+    graph.add('enhanced_prompt', lambda design_brief: design_brief['svg_spec'], deps=['design_brief'])
 
 def enhance_prompt_for_gpt_image(user_prompt, design_context=None):
     """Enhance user prompt using OpenAI specifically for GPT Image-1 to create mind-blowing designs"""
     logger.info(f"Enhancing prompt for GPT Image-1: {user_prompt[:100]}...")
     
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
     # Analyze prompt to determine design type for specialized enhancement
     prompt_lower = user_prompt.lower()
     is_coming_soon = any(word in prompt_lower for word in ['coming soon', 'coming', 'soon', 'announcement', 'launch', 'reveal'])
     is_testimonial = any(word in prompt_lower for word in ['testimonial', 'review', 'quote', 'feedback', 'recommendation'])
     is_poster = any(word in prompt_lower for word in ['poster', 'flyer', 'announcement', 'event'])
 
-    # Create specialized system prompt based on design type
+    # Create specialized system prompt based on design type, with the closest
+    # examples of that type from the few-shot corpus
     if is_coming_soon:
-        system_prompt = """You are an expert prompt enhancer for GPT Image-1, specializing in creating EXCEPTIONAL "Coming Soon" graphics following the proven format structure from high-quality training examples. Transform user requests into comprehensive, detailed prompts that generate visually stunning coming soon designs.
+        examples = fewshot.format_examples(
+            fewshot.select_examples(user_prompt, category='coming_soon'), field='summary')
+        system_prompt = f"""You are an expert prompt enhancer for GPT Image-1, specializing in creating EXCEPTIONAL "Coming Soon" graphics following the proven format structure from high-quality training examples. Transform user requests into comprehensive, detailed prompts that generate visually stunning coming soon designs.
 
 CRITICAL FORMAT REQUIREMENTS FOR COMING SOON PAGES:
 Use this EXACT structure: "Create a coming soon page with a [background description] background, featuring [main layout elements]. The layout includes [primary text] styled in [font details] at [size and positioning]. Below, [secondary elements] are positioned [placement details]. The design incorporates [decorative elements] with [color specifications] for [visual purpose]. Additional elements include [supporting content] in [font specifications], [positioning], ensuring [design quality]. The overall composition maintains [design principles] suitable for [target purpose]."
@@ -520,11 +613,7 @@ MANDATORY ELEMENTS TO SPECIFY:
 7. SUPPORTING CONTENT: Website links, dates, company names with positioning
 
 PROVEN SUCCESSFUL EXAMPLES TO FOLLOW:
-- Black background with gray border, Bebas Neue font for "COMING" and "SOON", Allura decorative fonts
-- Deep blue background with white/orange Tektur font, shadows and white lines, rotated composition
-- Beige background with modern fonts, cursive and bold combinations, decorative SVG elements
-- Light beige with dark brown "COMING SOON", Open Sans dates, minimalist approach
-- Dark green natural theme with Bebas Neue, countdown sections, angled graphics
+{examples}
 
 TECHNICAL SPECIFICATIONS:
 - Size: 1024x1024 pixels optimized for GPT Image-1
@@ -537,7 +626,9 @@ TECHNICAL SPECIFICATIONS:
 Transform the user's coming soon request into this comprehensive format ensuring maximum visual impact and professional quality."""
 
     elif is_testimonial:
-        system_prompt = """You are an expert prompt enhancer for GPT Image-1, specializing in creating EXCEPTIONAL testimonial graphics following the proven format structure from high-quality training examples. Transform user requests into comprehensive, detailed prompts that generate professional testimonial designs.
+        examples = fewshot.format_examples(
+            fewshot.select_examples(user_prompt, category='testimonial'), field='summary')
+        system_prompt = f"""You are an expert prompt enhancer for GPT Image-1, specializing in creating EXCEPTIONAL testimonial graphics following the proven format structure from high-quality training examples. Transform user requests into comprehensive, detailed prompts that generate professional testimonial designs.
 
 CRITICAL FORMAT REQUIREMENTS FOR TESTIMONIALS:
 Use this EXACT structure: "Create a testimonial with a [background color] background featuring a [container description]. The layout includes a [title description] at the [position], styled with the [font name] font, placed [positioning details]. Below, there are [decorative element count and description] arranged [arrangement], adding [visual effect]. The body text, written in [font name] font, is [centered/positioned] and displays [content description], ensuring [quality requirement]. Finally, include [additional elements] to enhance [design goal]."
@@ -552,10 +643,7 @@ MANDATORY ELEMENTS TO SPECIFY:
 7. VISUAL ELEMENTS: Stars, quotes, borders, graphics with exact specifications
 
 PROVEN SUCCESSFUL EXAMPLES TO FOLLOW:
-- Teal background with beige square container, Alfarn font titles, PT Serif body text, orange circles, square quotation marks
-- White background with large pink circle, Raleway font, 4-spoke stars in corners, dotted circle elements
-- Mint green background with red titles, white rounded rectangles, five blue stars for ratings
-- Golden background with white containers, Courier Std headings, five red five-spoke stars
+{examples}
 
 TECHNICAL SPECIFICATIONS:
 - Size: 1024x1024 pixels optimized for GPT Image-1
@@ -609,7 +697,7 @@ Return ONLY the enhanced prompt optimized for GPT Image-1, no explanations."""
     # Prepare the user content
     user_content = f"Original request: {user_prompt}"
     if design_context:
-        user_content += f"\n\nDesign context: {design_context[:300]}..."
+        user_content += f"\n\nDesign context: {stage_context(design_context, 'enhance_prompt_for_gpt_image', 300, user_prompt)}"
 
     payload = {
         "model": PROMPT_ENHANCER_MODEL,
@@ -629,15 +717,14 @@ Return ONLY the enhanced prompt optimized for GPT Image-1, no explanations."""
 
     try:
         logger.info(f"Calling OpenAI for GPT Image-1 prompt enhancement with model: {PROMPT_ENHANCER_MODEL}")
-        response = requests.post(url, headers=headers, json=payload)
-        response_data = response.json()
+        result = cached_chat(OPENAI_API_KEY_ENHANCER, stage='enhance_prompt_for_gpt_image', **payload)
 
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error for GPT Image enhancement: {response_data}")
+        if not result.ok:
+            logger.error(f"OpenAI API error for GPT Image enhancement: {result.error}")
             # Fallback to original prompt if API fails
             return user_prompt
 
-        enhanced_prompt = response_data["choices"][0]["message"]["content"].strip()
+        enhanced_prompt = result.content.strip()
         
         # Ensure prompt isn't too long for GPT Image-1
         if len(enhanced_prompt) > 1000:
@@ -651,25 +738,43 @@ Return ONLY the enhanced prompt optimized for GPT Image-1, no explanations."""
         # Return original prompt as fallback
         return user_prompt
 
-def generate_image_with_gpt(enhanced_prompt, design_context=None):
+def generate_image_with_gpt(enhanced_prompt, design_context=None, optimize_prompt=True):
     """Generate image using GPT Image-1 model with enhanced prompting"""
     try:
         logger.info("Generating image with GPT Image-1")
 
         # Enhance the prompt specifically for GPT Image-1
-        optimized_prompt = enhance_prompt_for_gpt_image(enhanced_prompt, design_context)
+        if optimize_prompt:
+            optimized_prompt = enhance_prompt_for_gpt_image(enhanced_prompt, design_context)
+        else:
+            optimized_prompt = enhanced_prompt
         logger.info(f"Optimized prompt: {optimized_prompt[:200]}...")
 
-        response = openai.images.generate(
-            model=GPT_IMAGE_MODEL,
-            prompt=optimized_prompt,
-            size="1024x1024",
-            quality="low"   # Changed from "low" to "standard" for better quality
-        )
+        key = make_key(GPT_IMAGE_MODEL, None, optimized_prompt, None)
+        image, _ = STAGE_FLIGHTS.do(key, lambda: store_generated_image(llm_client.run(request_gpt_image(optimized_prompt))))
+        return image
+    except Exception as e:
+        logger.error(f"Error generating image with GPT Image-1: {str(e)}")
+        raise
+
+def request_gpt_image(prompt):
+    """Coroutine for a GPT Image-1 generation on the shared client loop"""
+    return llm_client.agenerate_image(
+        GPT_IMAGE_MODEL,
+        prompt,
+        size="1024x1024",
+        quality="low",   # Changed from "low" to "standard" for better quality
+        api_key=OPENAI_API_KEY_SVG
+    )
+
+def store_generated_image(result):
+    """Save a GPT Image-1 result and return (base64, relative path, public URL)"""
+    try:
+        if not result.ok:
+            raise Exception(f"GPT Image-1 API error: {result.error}")
 
         # Get base64 image data from the response
-        # The response structure changed in newer versions of the API
-        image_base64 = response.data[0].b64_json if hasattr(response.data[0], 'b64_json') else response.data[0].url
+        image_base64 = result.b64_json or result.url
 
         # Create session ID for this generation
         session_id = f"svg_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
@@ -858,162 +963,271 @@ def get_templates():
         }
     })
 
+def build_design_context(design_plan, design_knowledge, user_input):
+    """Combine design plan and knowledge into the context passed to the enhancers"""
+    return f"""Design Plan:
+{design_plan}
+
+Design Knowledge and Best Practices:
+{design_knowledge}
+
+Original Request:
+{user_input}"""
+
+def stage_context(design_context, stage, legacy_chars, query):
+    """design_context compressed to a stage's budget, or its first legacy_chars when compression is off"""
+    if not context_compressor.CONTEXT_COMPRESSION_ENABLED:
+        return design_context[:legacy_chars] + "..."
+    return context_compressor.compress(design_context, stage, query=query)
+
+def pre_enhancer_context(design_context):
+    """design_context cut to the pre-enhancer budget; the original request is kept whole.
+
+    Only for a built design_context: a user's own prompt is never compressed.
+    """
+    return context_compressor.compress(design_context, 'pre_enhance_prompt', protect=('Original Request',))
+
+def new_session_id(prefix):
+    """Create a unique session id for the unified storage folder"""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def log_stage_output(label, content, max_lines=10):
+    """Log the first lines of a stage's text output"""
+    logger.info(f"\n{label}:")
+    for line in content.split('\n')[:max_lines]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+
+def admission_rejected(e):
+    """429 with Retry-After for a request the admission controller turned away"""
+    logger.warning(f"Rejected request: {str(e)}")
+    response = jsonify({'error': 'Server is at capacity, retry later', 'reason': e.reason, 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def run_admitted(endpoint, make_response):
+    """Build a response under an admission slot; streamed responses keep the slot until closed"""
+    if not admission.ADMISSION_ENABLED:
+        return make_response()
+    try:
+        started = admission.controller.acquire(endpoint)
+    except admission.Rejected as e:
+        return admission_rejected(e)
+
+    try:
+        response = make_response()
+    except BaseException:
+        admission.controller.release(endpoint, started)
+        raise
+    body = response[0] if isinstance(response, tuple) else response
+    if isinstance(body, Response) and body.is_streamed:
+        body.call_on_close(lambda: admission.controller.release(endpoint, started))
+    else:
+        admission.controller.release(endpoint, started)
+    return response
+
+def admitted(endpoint):
+    """Decorator running a view through run_admitted()"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return run_admitted(endpoint, lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
+
+def vector_suitability_stage(user_input):
+    """Stage 1 gate: stop the pipeline if the request is not suitable for SVG"""
+    logger.info("\n[STAGE 1: Vector Suitability Check]")
+    vector_suitability = check_vector_suitability(user_input)
+    logger.info(f"Result: {'Suitable' if not vector_suitability.get('not_suitable', False) else 'Not Suitable'}")
+    if vector_suitability.get('not_suitable', False):
+        logger.warning("Design request not suitable for SVG format")
+        raise StopPipeline(vector_suitability)
+    return vector_suitability
+
+def similar_prompt_inputs(endpoint, user_input, reuse_similar=True):
+    """Graph inputs for a request, seeded with artifacts from a near-duplicate prompt"""
+    inputs = {'user_input': user_input}
+    match = similar_prompts.find_reusable_artifacts(endpoint, user_input) if reuse_similar else None
+    if match:
+        inputs.update(match['artifacts'])
+        logger.info(f"Reusing {sorted(match['artifacts'])} from similar prompt: {match['prompt'][:100]}")
+    return inputs, match
+
+def similar_prompt_summary(match):
+    if not match:
+        return None
+    return {
+        'prompt': match['prompt'],
+        'similarity': match['similarity'],
+        'reused_stages': sorted(match['artifacts'])
+    }
+
+# Stages that only feed the response for display; they run when a downstream
+# stage consumes them or when the client lists them in include=
+OPTIONAL_STAGES = ('design_brief', 'design_plan', 'design_knowledge', 'design_context',
+                   'pre_enhanced_prompt', 'enhanced_prompt', 'image_prompt')
+
+def request_data():
+    """JSON body of the current request, with include= also accepted as a query parameter"""
+    data = dict(request.json or {})
+    if 'include' in request.args and 'include' not in data:
+        data['include'] = request.args['include']
+    return data
+
+def build_generate_svg_graph(pipeline_mode='staged'):
+    """Stage graph for /api/generate-svg.
+
+    Suitability, planning and pre-enhancement only depend on the user input and
+    run concurrently; image generation waits for the suitability gate. In brief
+    mode the planning stages come from a single design brief call.
+    """
+    graph = StageGraph('generate_svg')
+    graph.add('vector_suitability', vector_suitability_stage, deps=['user_input'])
+    graph.add('session_id', lambda: new_session_id('svg'))
+    if pipeline_mode == 'brief':
+        add_design_brief_stages(graph)
+    else:
+        graph.add('design_plan', lambda user_input: plan_design(user_input), deps=['user_input'])
+        graph.add('design_knowledge',
+                  lambda design_plan, user_input: generate_design_knowledge(design_plan, user_input),
+                  deps=['design_plan', 'user_input'])
+        graph.add('design_context', build_design_context,
+                  deps=['design_plan', 'design_knowledge', 'user_input'])
+        graph.add('pre_enhanced_prompt', lambda user_input: pre_enhance_prompt(user_input), deps=['user_input'])
+        graph.add('enhanced_prompt',
+                  lambda pre_enhanced_prompt: enhance_prompt_with_chat(pre_enhanced_prompt),
+                  deps=['pre_enhanced_prompt'])
+    # Use pre-enhanced prompt for GPT Image-1
+    graph.add('generated_image',
+              lambda pre_enhanced_prompt, design_context: generate_image_with_gpt(pre_enhanced_prompt, design_context),
+              deps=['pre_enhanced_prompt', 'design_context'], after=['vector_suitability'])
+    graph.add('svg_code',
+              lambda generated_image, pre_enhanced_prompt: generate_svg_from_image(generated_image[0], pre_enhanced_prompt),
+              deps=['generated_image', 'pre_enhanced_prompt'])
+    graph.add('svg_saved',
+              lambda svg_code, session_id: save_svg(svg_code, prefix="svg", session_id=session_id),
+              deps=['svg_code', 'session_id'])
+    return graph
+
+GENERATE_SVG_GRAPHS = {mode: build_generate_svg_graph(mode) for mode in design_brief.PIPELINE_MODES}
+
+# Stages whose outputs make up the /api/generate-svg response; the enhanced
+# prompt is not used for the image, so it only runs when included
+GENERATE_SVG_TARGETS = ['vector_suitability', 'design_plan', 'design_knowledge', 'pre_enhanced_prompt',
+                        'generated_image', 'svg_code', 'svg_saved']
+
+def run_generate_svg_pipeline(user_input, skip_enhancement=False, reuse_similar=True, pipeline_mode='staged',
+                              include=()):
+    """Run the generate-svg graph for one request and return the response payload"""
+    inputs, similar_match = similar_prompt_inputs('generate_svg', user_input, reuse_similar)
+    graph_run = GENERATE_SVG_GRAPHS[pipeline_mode].run(inputs, targets=GENERATE_SVG_TARGETS + list(include))
+
+    if not similar_match:
+        similar_prompts.remember_artifacts('generate_svg', user_input, graph_run.results)
+
+    design_plan = graph_run['design_plan']
+    design_knowledge = graph_run['design_knowledge']
+    pre_enhanced_prompt = graph_run['pre_enhanced_prompt']
+    enhanced_prompt = graph_run.get('enhanced_prompt')
+    gpt_image_base64, gpt_image_path, _ = graph_run['generated_image']
+    svg_code = graph_run['svg_code']
+    _, svg_relative_path, _ = graph_run['svg_saved']
+    log_stage_output("Design Plan Generated", design_plan)
+    if enhanced_prompt is not None:
+        log_stage_output("SVG-Enhanced Prompt Generated", enhanced_prompt, max_lines=5)
+
+    return {
+        "original_prompt": user_input,
+        "pre_enhanced_prompt": pre_enhanced_prompt,
+        "enhanced_prompt": enhanced_prompt,
+        "gpt_image_base64": gpt_image_base64,
+        "gpt_image_url": f"/static/images/{gpt_image_path}",
+        "svg_code": svg_code,
+        "svg_path": svg_relative_path,
+        "stages": {
+            "vector_suitability": {
+                "completed": True,
+                "suitable": True
+            },
+            "design_plan": {
+                "completed": True,
+                "content": design_plan
+            },
+            "design_knowledge": {
+                "completed": True, 
+                "content": design_knowledge
+            },
+            "pre_enhancement": {
+                "completed": True,
+                "skipped": skip_enhancement,
+                "content": pre_enhanced_prompt
+            },
+            "prompt_enhancement": {
+                "completed": enhanced_prompt is not None,
+                "skipped": skip_enhancement or enhanced_prompt is None,
+                "content": enhanced_prompt
+            },
+            "image_generation": {
+                "completed": True, 
+                "image_url": f"/static/images/{gpt_image_path}"
+            },
+            "svg_generation": {
+                "completed": True, 
+                "svg_path": svg_relative_path
+            }
+        },
+        "timings": graph_run.summary(),
+        "similar_prompt": similar_prompt_summary(similar_match),
+        "pipeline_mode": pipeline_mode,
+        "included": {name: graph_run[name] for name in include},
+        "progress": 100
+    }
+
 @app.route('/api/generate-svg', methods=['POST'])
+@admitted('generate_svg')
 def generate_svg():
     """Universal SVG generator endpoint for any design request"""
     try:
-        data = request.json
+        data = request_data()
         user_input = data.get('prompt', '')
         skip_enhancement = data.get('skip_enhancement', False)
 
         if not user_input:
             return jsonify({"error": "No prompt provided"}), 400
+        try:
+            pipeline_mode = design_brief.resolve_mode(data.get('pipeline_mode'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        include, include_error = parse_include(data.get('include'), GENERATE_SVG_GRAPHS[pipeline_mode], OPTIONAL_STAGES)
+        if include_error:
+            return jsonify({"error": include_error}), 400
 
         logger.info("="*80)
         logger.info(f"Starting new design request: {user_input}")
         logger.info("="*80)
 
-        # Stage 1: Check if prompt is suitable for SVG vector graphics
-        logger.info("\n[STAGE 1: Vector Suitability Check]")
-        logger.info("-"*50)
-        logger.info("Checking if design is suitable for SVG format...")
-        vector_suitability = check_vector_suitability(user_input)
-        logger.info("Vector suitability check complete")
-        logger.info(f"Result: {'Suitable' if not vector_suitability.get('not_suitable', False) else 'Not Suitable'}")
-        
-        if vector_suitability.get('not_suitable', False):
-            logger.warning("Design request not suitable for SVG format")
+        key = singleflight.request_key('generate_svg', data)
+        try:
+            response, shared = REQUEST_FLIGHTS.do(key, lambda: run_generate_svg_pipeline(
+                user_input, skip_enhancement, data.get('reuse_similar', True), pipeline_mode, include))
+        except StopPipeline as stop:
+            vector_suitability = stop.payload or {}
             return jsonify({
                 "error": "Not suitable for SVG",
                 "guidance": vector_suitability.get('guidance', "Your request may not be ideal for SVG vector graphics. Please consider a simpler, more graphic design oriented request."),
                 "progress_stage": "vector_suitability",
                 "progress": 10
             }), 400
-        
-        # Stage 2: Planning Phase - Create structured design plan
-        logger.info("\n[STAGE 2: Planning Phase]")
-        logger.info("-"*50)
-        logger.info("Creating structured design plan...")
-        logger.info(f"Using model: {PLANNER_MODEL}")
-        design_plan = plan_design(user_input)
-        logger.info("\nDesign Plan Generated:")
-        for line in design_plan.split('\n')[:10]:  # Log first 10 lines of plan
-            logger.info(f"  {line}")
-        logger.info("  ...")
-        
-        # Stage 3: Design Knowledge Generation - Gather design best practices
-        logger.info("\n[STAGE 3: Design Knowledge Generation]")
-        logger.info("-"*50)
-        logger.info("Gathering design knowledge and best practices...")
-        logger.info(f"Using model: {DESIGN_KNOWLEDGE_MODEL}")
-        design_knowledge = generate_design_knowledge(design_plan, user_input)
-        logger.info("\nDesign Knowledge Generated:")
-        for line in design_knowledge.split('\n')[:10]:  # Log first 10 lines of knowledge
-            logger.info(f"  {line}")
-        logger.info("  ...")
-        
-        # Combine design plan and knowledge for enhanced prompts
-        logger.info("\nCombining design plan and knowledge...")
-        design_context = f"""Design Plan:
-{design_plan}
-
-Design Knowledge and Best Practices:
-{design_knowledge}
 
-Original Request:
-{user_input}"""
-        logger.info("Design context preparation complete")
-        
-        # Stage 4: Pre-Enhancement Phase - Convert to detailed format
-        logger.info("\n[STAGE 4: Pre-Enhancement Phase]")
-        logger.info("-"*50)
-        logger.info("Converting user input to detailed format using JSONL examples...")
-        logger.info(f"Using model: {PRE_ENHANCER_MODEL}")
-        pre_enhanced_prompt = pre_enhance_prompt(user_input)
-        logger.info("\nPre-Enhanced Prompt Generated:")
-        for line in pre_enhanced_prompt.split('\n')[:5]:  # Log first 5 lines
-            logger.info(f"  {line}")
-        logger.info("  ...")
-        
-        # Stage 5: SVG Enhancement Phase - Convert to SVG technical specs
-        logger.info("\n[STAGE 5: SVG Enhancement Phase]")
-        logger.info("-"*50)
-        logger.info("Converting design description to SVG technical specifications...")
-        logger.info(f"Using model: {PROMPT_ENHANCER_MODEL}")
-        enhanced_prompt = enhance_prompt_with_chat(pre_enhanced_prompt)
-        logger.info("\nSVG-Enhanced Prompt Generated:")
-        for line in enhanced_prompt.split('\n')[:5]:  # Log first 5 lines
-            logger.info(f"  {line}")
-        logger.info("  ...")
-        
-        # Use the enhanced prompt for image generation
-        prompt_to_use = pre_enhanced_prompt  # Use pre-enhanced for GPT Image-1
-
-        # Stage 6: Generate image using GPT Image-1
-        logger.info("STAGE 6: Image Generation Phase")
-        gpt_image_base64, gpt_image_filename = generate_image_with_gpt(prompt_to_use, design_context)
-        logger.info("Image generated with GPT Image-1")
-
-        # Stage 7: Generate SVG using vtracer
-        logger.info("STAGE 7: SVG Generation Phase")
-        svg_code = generate_svg_from_image(gpt_image_base64, prompt_to_use)
-        logger.info("SVG code generated from image")
-        
-        # Save the SVG in the same session
-        svg_filename, svg_relative_path, _ = save_svg(svg_code, prefix="svg", session_id=session_id)
-
-        return jsonify({
-            "original_prompt": user_input,
-            "pre_enhanced_prompt": pre_enhanced_prompt,
-            "enhanced_prompt": enhanced_prompt,
-            "gpt_image_base64": gpt_image_base64,
-            "gpt_image_url": f"/static/images/{gpt_image_filename}",
-            "svg_code": svg_code,
-            "svg_path": svg_relative_path,
-            "stages": {
-                "vector_suitability": {
-                    "completed": True,
-                    "suitable": True
-                },
-                "design_plan": {
-                    "completed": True,
-                    "content": design_plan if 'design_plan' in locals() else ""
-                },
-                "design_knowledge": {
-                    "completed": True, 
-                    "content": design_knowledge if 'design_knowledge' in locals() else ""
-                },
-                "pre_enhancement": {
-                    "completed": True,
-                    "skipped": skip_enhancement,
-                    "content": pre_enhanced_prompt
-                },
-                "prompt_enhancement": {
-                    "completed": True,
-                    "skipped": skip_enhancement,
-                    "content": enhanced_prompt
-                },
-                "image_generation": {
-                    "completed": True, 
-                    "image_url": f"/static/images/{gpt_image_filename}"
-                },
-                "svg_generation": {
-                    "completed": True, 
-                    "svg_path": svg_relative_path
-                }
-            },
-            "progress": 100
-        })
+        return jsonify(dict(response, coalesced=shared))
 
     except Exception as e:
         logger.error(f"Error in generate_svg: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def chat_with_ai_about_design(messages, current_svg=None):
-    """Enhanced conversational AI that can discuss and modify designs"""
-    logger.info("Starting conversational AI interaction")
-    logger.info(f"Processing {len(messages)} messages with {'SVG context' if current_svg else 'no context'}")
-
+def build_chat_messages(messages, current_svg=None):
+    """System prompt plus trimmed conversation history for the chat assistant"""
     # Create system prompt that includes SVG knowledge
     system_prompt = """You are an expert AI design assistant with deep knowledge of SVG creation and manipulation. You can:
 
@@ -1066,39 +1280,51 @@ Current context: You are helping a user with their design project."""
                 "content": content
             })
 
+    return ai_messages
+
+CHAT_FALLBACK_RESPONSE = "I apologize, but I'm having trouble generating a response. Could you please rephrase your request?"
+
+def chat_with_ai_about_design(messages, current_svg=None):
+    """Enhanced conversational AI that can discuss and modify designs"""
+    logger.info("Starting conversational AI interaction")
+    logger.info(f"Processing {len(messages)} messages with {'SVG context' if current_svg else 'no context'}")
+    ai_messages = build_chat_messages(messages, current_svg)
+
     try:
-        # Use OpenAI client directly instead of raw API calls
-        client = openai.OpenAI(api_key=OPENAI_API_KEY_ENHANCER)
-        response = client.chat.completions.create(
-            model=CHAT_ASSISTANT_MODEL,
-            messages=ai_messages,
+        result = llm_client.chat(
+            CHAT_ASSISTANT_MODEL,
+            ai_messages,
+            api_key=OPENAI_API_KEY_ENHANCER,
             temperature=0.7,
             max_tokens=8000
         )
         
         # Extract the response content safely
-        if response and response.choices and len(response.choices) > 0:
-            ai_response = response.choices[0].message.content
+        if result.ok:
+            ai_response = result.content
             logger.info(f"AI response generated: {ai_response[:100]}...")
             return ai_response
         else:
-            logger.error("Empty or invalid response from OpenAI")
-            return "I apologize, but I'm having trouble generating a response. Could you please rephrase your request?"
+            logger.error(f"Empty or invalid response from OpenAI: {result.error}")
+            return CHAT_FALLBACK_RESPONSE
             
     except Exception as e:
         logger.error(f"Error in chat_with_ai_about_design: {str(e)}")
         return "I apologize, but I encountered an error while processing your request. Please try again."
 
-def modify_svg_with_ai(original_svg, modification_request):
-    """Use AI to modify an existing SVG based on user request"""
-    logger.info(f"Modifying SVG with request: {modification_request}")
-    
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_SVG}"
-    }
+def stream_chat_about_design(messages, current_svg=None):
+    """Streaming form of chat_with_ai_about_design: returns an llm_client.ChatStream"""
+    logger.info(f"Streaming conversational AI response for {len(messages)} messages")
+    return llm_client.ChatStream(
+        CHAT_ASSISTANT_MODEL,
+        build_chat_messages(messages, current_svg),
+        api_key=OPENAI_API_KEY_ENHANCER,
+        temperature=0.7,
+        max_tokens=8000
+    )
 
+def svg_modification_payload(original_svg, modification_request):
+    """Chat payload asking the SVG model to apply a modification request"""
     system_prompt = """You are an expert SVG modifier. Given an original SVG and a modification request, create a new SVG that incorporates the requested changes.
 
 Rules:
@@ -1126,17 +1352,24 @@ The SVG should be production-ready and properly formatted."""
         "temperature": 1,
         "max_tokens": 8000
     }
+    return payload
+
+def modify_svg_with_ai(original_svg, modification_request):
+    """Use AI to modify an existing SVG based on user request"""
+    logger.info(f"Modifying SVG with request: {modification_request}")
+    payload = svg_modification_payload(original_svg, modification_request)
 
     logger.info("Calling AI for SVG modification")
-    response = requests.post(url, headers=headers, json=payload)
-    response_data = response.json()
+    result = llm_client.chat(api_key=OPENAI_API_KEY_SVG, **payload)
 
-    if response.status_code != 200:
-        logger.error(f"SVG modification error: {response_data}")
+    if not result.ok:
+        logger.error(f"SVG modification error: {result.error}")
         return None
 
-    modified_content = response_data["choices"][0]["message"]["content"]
-    
+    return extract_modified_svg(result.content, original_svg)
+
+def extract_modified_svg(modified_content, original_svg):
+    """Pull the SVG element out of a modification response, or keep the original"""
     # Extract SVG code
     svg_pattern = r'<svg.*?<\/svg>'
     svg_matches = re.search(svg_pattern, modified_content, re.DOTALL)
@@ -1148,6 +1381,185 @@ The SVG should be production-ready and properly formatted."""
     logger.warning("Could not extract modified SVG, returning original")
     return original_svg
 
+def create_chat_design(latest_message):
+    """Run the chat assistant's design creation stages (plan through SVG)"""
+    # Create session ID for this chat conversation
+    chat_session_id = f"chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    # Stage 1: Planning Phase
+    logger.info("\n[STAGE 1: Planning Phase]")
+    logger.info("-"*50)
+    logger.info("Creating structured design plan...")
+    logger.info(f"Using model: {PLANNER_MODEL}")
+    design_plan = plan_design(latest_message)
+    logger.info("\nDesign Plan Generated:")
+    for line in design_plan.split('\n')[:10]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+
+    # Stage 2: Design Knowledge Generation
+    logger.info("\n[STAGE 2: Design Knowledge Generation]")
+    logger.info("-"*50)
+    logger.info("Gathering design knowledge and best practices...")
+    logger.info(f"Using model: {DESIGN_KNOWLEDGE_MODEL}")
+    design_knowledge = generate_design_knowledge(design_plan, latest_message)
+    logger.info("\nDesign Knowledge Generated:")
+    for line in design_knowledge.split('\n')[:10]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+
+    # Stage 3: Pre-enhancement
+    logger.info("\n[STAGE 3: Pre-enhancement Phase]")
+    logger.info("-"*50)
+    logger.info("Pre-enhancing prompt with design context...")
+    logger.info(f"Using model: {PRE_ENHANCER_MODEL}")
+    design_context = f"""Design Plan:\n{design_plan}\n\nDesign Knowledge:\n{design_knowledge}\n\nOriginal Request:\n{latest_message}"""
+    pre_enhanced = pre_enhance_prompt(pre_enhancer_context(design_context))
+    logger.info("\nPre-enhanced Prompt:")
+    for line in pre_enhanced.split('\n')[:10]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+
+    # Stage 4: Final Enhancement
+    logger.info("\n[STAGE 4: Final Enhancement Phase]")
+    logger.info("-"*50)
+    logger.info("Enhancing prompt with technical specifications...")
+    logger.info(f"Using model: {PROMPT_ENHANCER_MODEL}")
+    enhanced_prompt = enhance_prompt_with_chat(pre_enhanced)
+    logger.info("\nEnhanced Prompt Generated:")
+    for line in enhanced_prompt.split('\n')[:10]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+
+    # Stage 5: Image Generation
+    logger.info("\n[STAGE 5: Image Generation]")
+    logger.info("-"*50)
+    logger.info("Generating initial design image...")
+    logger.info(f"Using model: {GPT_IMAGE_MODEL}")
+    image_base64, image_filename, _ = generate_image_with_gpt(enhanced_prompt, design_context)
+    logger.info(f"Image generated and saved as: {image_filename}")
+
+    # Stage 6: SVG Generation
+    logger.info("\n[STAGE 6: SVG Generation]")
+    logger.info("-"*50)
+    logger.info("Converting design to SVG format...")
+    logger.info(f"Using model: {SVG_GENERATOR_MODEL}")
+    svg_code = generate_svg_from_image(image_base64, enhanced_prompt)
+    svg_filename, svg_relative_path, _ = save_svg(svg_code, prefix="assistant_svg", session_id=chat_session_id)
+    logger.info(f"SVG generated and saved as: {svg_filename}")
+    return svg_code, svg_relative_path, svg_filename, image_filename
+
+def creation_explanation_prompt(svg_code):
+    return f"I've created a design for the user. Here's the SVG code:\n\n```svg\n{svg_code}\n```\n\nPlease explain this design to the user in a friendly, conversational way. Describe the elements, colors, layout, and how it addresses their request."
+
+def modification_explanation_prompt(latest_message, modified_svg):
+    return f"I've modified the design based on the user's request: '{latest_message}'. Here's the updated SVG:\n\n```svg\n{modified_svg}\n```\n\nPlease explain what changes were made and how the design now better meets their needs."
+
+def creation_response(ai_explanation, svg_code):
+    return f"{ai_explanation}\n\n```svg\n{svg_code}\n```\n\nFeel free to ask me to modify any aspect of this design!"
+
+def modification_response(ai_explanation, modified_svg):
+    return f"{ai_explanation}\n\n```svg\n{modified_svg}\n```\n\nIs there anything else you'd like me to adjust?"
+
+def stream_tokens(chat_stream, phase):
+    """Yield a 'token' SSE event per chunk; returns the final ChatResult"""
+    for text in chat_stream:
+        yield sse_event('token', {'phase': phase, 'text': text})
+    if not chat_stream.result.ok:
+        logger.error(f"Streamed {phase} failed: {chat_stream.result.error}")
+    return chat_stream.result
+
+def stream_explanation(messages, svg_code):
+    """Stream a chat reply and return its text, falling back to the canned apology"""
+    result = yield from stream_tokens(stream_chat_about_design(messages, svg_code), 'explanation')
+    return result.content if result.ok else CHAT_FALLBACK_RESPONSE
+
+def stream_chat_assistant_events(messages, latest_message, request_type, current_svg):
+    """SSE form of /api/chat-assistant: tokens as they arrive, then the final SVG"""
+    svg_code, svg_relative_path = current_svg, None
+    try:
+        if request_type == 'create':
+            yield sse_event('status', {'stage': 'design_creation'})
+            svg_code, svg_relative_path, _, _ = create_chat_design(latest_message)
+            yield sse_event('svg', {'svg_code': svg_code, 'svg_path': svg_relative_path})
+            temp_messages = messages + [{"role": "user", "content": creation_explanation_prompt(svg_code)}]
+            ai_explanation = yield from stream_explanation(temp_messages, svg_code)
+            full_response = creation_response(ai_explanation, svg_code)
+
+        elif request_type == 'modify':
+            payload = svg_modification_payload(current_svg, latest_message)
+            result = yield from stream_tokens(llm_client.ChatStream(api_key=OPENAI_API_KEY_SVG, **payload), 'svg')
+            modified_svg = extract_modified_svg(result.content, current_svg) if result.ok else None
+
+            if modified_svg and modified_svg != current_svg:
+                mod_session_id = f"mod_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+                _, svg_relative_path, _ = save_svg(modified_svg, prefix="modified_svg", session_id=mod_session_id)
+                svg_code = modified_svg
+                yield sse_event('svg', {'svg_code': svg_code, 'svg_path': svg_relative_path})
+                temp_messages = messages + [{"role": "user", "content": modification_explanation_prompt(latest_message, modified_svg)}]
+                ai_explanation = yield from stream_explanation(temp_messages, modified_svg)
+                full_response = modification_response(ai_explanation, modified_svg)
+            else:
+                # Fallback to conversational response
+                full_response = yield from stream_explanation(messages, current_svg)
+
+        else:
+            full_response = yield from stream_explanation(messages, current_svg)
+
+        messages.append({"role": "assistant", "content": full_response})
+        yield sse_event('done', {
+            "response": full_response,
+            "svg_code": svg_code,
+            "svg_path": svg_relative_path,
+            "messages": messages
+        })
+
+    except Exception as e:
+        logger.error(f"Error in streamed chat_assistant: {str(e)}")
+        yield sse_event('error', {'error': str(e)})
+
+def run_chat_creation(messages, latest_message):
+    """Chat assistant create path: design stages plus the explanation; appends the reply to messages"""
+    svg_code, svg_relative_path, svg_filename, image_filename = create_chat_design(latest_message)
+    
+    # Stage 7: Design Explanation
+    logger.info("\n[STAGE 7: Design Explanation]")
+    logger.info("-"*50)
+    logger.info("Generating design explanation...")
+    logger.info(f"Using model: {CHAT_ASSISTANT_MODEL}")
+    
+    temp_messages = messages + [{"role": "user", "content": creation_explanation_prompt(svg_code)}]
+    ai_explanation = chat_with_ai_about_design(temp_messages, svg_code)
+    
+    logger.info("\nExplanation Generated:")
+    for line in ai_explanation.split('\n')[:5]:
+        logger.info(f"  {line}")
+    logger.info("  ...")
+    
+    # Create comprehensive response
+    full_response = creation_response(ai_explanation, svg_code)
+    
+    messages.append({"role": "assistant", "content": full_response})
+    
+    response_data = {
+        "response": full_response,
+        "svg_code": svg_code,
+        "svg_path": svg_relative_path,
+        "messages": messages
+    }
+    
+    logger.info("\n[Design Creation Complete]")
+    logger.info("="*80)
+    logger.info("Summary:")
+    logger.info(f"- Design plan created")
+    logger.info(f"- Design knowledge gathered")
+    logger.info(f"- Prompt enhanced and refined")
+    logger.info(f"- Image generated: {image_filename}")
+    logger.info(f"- SVG created: {svg_filename}")
+    logger.info(f"- Explanation provided")
+    logger.info("="*80)
+    return response_data
+
 @app.route('/api/chat-assistant', methods=['POST'])
 def chat_assistant():
     try:
@@ -1192,117 +1604,27 @@ def chat_assistant():
                     logger.info("Found existing SVG in conversation")
                     break
 
+        if data.get('stream', False):
+            request_type = 'create' if is_create_request else 'modify' if is_modify_request and current_svg else 'conversation'
+            logger.info(f"Streaming {request_type} response")
+            make_response = lambda: Response(
+                stream_with_context(stream_chat_assistant_events(messages, latest_message, request_type, current_svg)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+            return run_admitted('chat_create', make_response) if request_type == 'create' else make_response()
+
         if is_create_request:
             logger.info("\n[Starting New Design Creation]")
             logger.info("-"*50)
             
             try:
-                # Create session ID for this chat conversation
-                chat_session_id = f"chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
-                
-                # Stage 1: Planning Phase
-                logger.info("\n[STAGE 1: Planning Phase]")
-                logger.info("-"*50)
-                logger.info("Creating structured design plan...")
-                logger.info(f"Using model: {PLANNER_MODEL}")
-                design_plan = plan_design(latest_message)
-                logger.info("\nDesign Plan Generated:")
-                for line in design_plan.split('\n')[:10]:
-                    logger.info(f"  {line}")
-                logger.info("  ...")
-
-                # Stage 2: Design Knowledge Generation
-                logger.info("\n[STAGE 2: Design Knowledge Generation]")
-                logger.info("-"*50)
-                logger.info("Gathering design knowledge and best practices...")
-                logger.info(f"Using model: {DESIGN_KNOWLEDGE_MODEL}")
-                design_knowledge = generate_design_knowledge(design_plan, latest_message)
-                logger.info("\nDesign Knowledge Generated:")
-                for line in design_knowledge.split('\n')[:10]:
-                    logger.info(f"  {line}")
-                logger.info("  ...")
-
-                # Stage 3: Pre-enhancement
-                logger.info("\n[STAGE 3: Pre-enhancement Phase]")
-                logger.info("-"*50)
-                logger.info("Pre-enhancing prompt with design context...")
-                logger.info(f"Using model: {PRE_ENHANCER_MODEL}")
-                design_context = f"""Design Plan:\n{design_plan}\n\nDesign Knowledge:\n{design_knowledge}\n\nOriginal Request:\n{latest_message}"""
-                pre_enhanced = pre_enhance_prompt(design_context)
-                logger.info("\nPre-enhanced Prompt:")
-                for line in pre_enhanced.split('\n')[:10]:
-                    logger.info(f"  {line}")
-                logger.info("  ...")
-
-                # Stage 4: Final Enhancement
-                logger.info("\n[STAGE 4: Final Enhancement Phase]")
-                logger.info("-"*50)
-                logger.info("Enhancing prompt with technical specifications...")
-                logger.info(f"Using model: {PROMPT_ENHANCER_MODEL}")
-                enhanced_prompt = enhance_prompt_with_chat(pre_enhanced)
-                logger.info("\nEnhanced Prompt Generated:")
-                for line in enhanced_prompt.split('\n')[:10]:
-                    logger.info(f"  {line}")
-                logger.info("  ...")
-                
-                # Stage 5: Image Generation
-                logger.info("\n[STAGE 5: Image Generation]")
-                logger.info("-"*50)
-                logger.info("Generating initial design image...")
-                logger.info(f"Using model: {GPT_IMAGE_MODEL}")
-                image_base64, image_filename = generate_image_with_gpt(enhanced_prompt, design_context)
-                logger.info(f"Image generated and saved as: {image_filename}")
-                
-                # Stage 6: SVG Generation
-                logger.info("\n[STAGE 6: SVG Generation]")
-                logger.info("-"*50)
-                logger.info("Converting design to SVG format...")
-                logger.info(f"Using model: {SVG_GENERATOR_MODEL}")
-                svg_code = generate_svg_from_image(image_base64, enhanced_prompt)
-                svg_filename, svg_relative_path, _ = save_svg(svg_code, prefix="assistant_svg", session_id=chat_session_id)
-                logger.info(f"SVG generated and saved as: {svg_filename}")
-                
-                # Stage 7: Design Explanation
-                logger.info("\n[STAGE 7: Design Explanation]")
-                logger.info("-"*50)
-                logger.info("Generating design explanation...")
-                logger.info(f"Using model: {CHAT_ASSISTANT_MODEL}")
-                
-                explanation_prompt = f"I've created a design for the user. Here's the SVG code:\n\n```svg\n{svg_code}\n```\n\nPlease explain this design to the user in a friendly, conversational way. Describe the elements, colors, layout, and how it addresses their request."
-                
-                temp_messages = messages + [{"role": "user", "content": explanation_prompt}]
-                ai_explanation = chat_with_ai_about_design(temp_messages, svg_code)
-                
-                logger.info("\nExplanation Generated:")
-                for line in ai_explanation.split('\n')[:5]:
-                    logger.info(f"  {line}")
-                logger.info("  ...")
-                
-                # Create comprehensive response
-                full_response = f"{ai_explanation}\n\n```svg\n{svg_code}\n```\n\nFeel free to ask me to modify any aspect of this design!"
-                
-                messages.append({"role": "assistant", "content": full_response})
-                
-                response_data = {
-                    "response": full_response,
-                    "svg_code": svg_code,
-                    "svg_path": svg_relative_path,
-                    "messages": messages
-                }
-                
-                logger.info("\n[Design Creation Complete]")
-                logger.info("="*80)
-                logger.info("Summary:")
-                logger.info(f"- Design plan created")
-                logger.info(f"- Design knowledge gathered")
-                logger.info(f"- Prompt enhanced and refined")
-                logger.info(f"- Image generated: {image_filename}")
-                logger.info(f"- SVG created: {svg_filename}")
-                logger.info(f"- Explanation provided")
-                logger.info("="*80)
-                
+                with admission.admit('chat_create'):
+                    response_data = run_chat_creation(messages, latest_message)
                 return jsonify(response_data)
-                
+
+            except admission.Rejected as e:
+                return admission_rejected(e)
             except Exception as e:
                 logger.error(f"Error in design creation: {str(e)}")
                 error_response = "I encountered an error while creating the design. Let me try a different approach or you can rephrase your request."
@@ -1324,12 +1646,10 @@ def chat_assistant():
                     svg_filename, svg_relative_path, _ = save_svg(modified_svg, prefix="modified_svg", session_id=mod_session_id)
                     
                     # Get AI explanation of the changes
-                    change_explanation_prompt = f"I've modified the design based on the user's request: '{latest_message}'. Here's the updated SVG:\n\n```svg\n{modified_svg}\n```\n\nPlease explain what changes were made and how the design now better meets their needs."
-                    
-                    temp_messages = messages + [{"role": "user", "content": change_explanation_prompt}]
+                    temp_messages = messages + [{"role": "user", "content": modification_explanation_prompt(latest_message, modified_svg)}]
                     ai_explanation = chat_with_ai_about_design(temp_messages, modified_svg)
                     
-                    full_response = f"{ai_explanation}\n\n```svg\n{modified_svg}\n```\n\nIs there anything else you'd like me to adjust?"
+                    full_response = modification_response(ai_explanation, modified_svg)
                     
                     messages.append({"role": "assistant", "content": full_response})
                     
@@ -1376,12 +1696,6 @@ def build_advanced_image_prompt(user_input, design_context):
     """Build an advanced image prompt optimized for creating stunning visuals"""
     logger.info(f"Building advanced image prompt: {user_input[:100]}...")
     
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_ENHANCER}"
-    }
-
     # Detect design type for specialized prompt building
     user_lower = user_input.lower()
     is_coming_soon = any(word in user_lower for word in ['coming soon', 'coming', 'soon', 'announcement', 'launch'])
@@ -1471,7 +1785,7 @@ Create a final prompt that will generate exceptional professional visuals."""
             },
             {
                 "role": "user",
-                "content": f"Enhanced Prompt: {user_input}\n\nDesign Context: {design_context[:500]}..."
+                "content": f"Enhanced Prompt: {user_input}\n\nDesign Context: {stage_context(design_context, 'build_advanced_image_prompt', 500, user_input)}"
             }
         ],
         "temperature": 0.7,
@@ -1480,15 +1794,14 @@ Create a final prompt that will generate exceptional professional visuals."""
 
     try:
         logger.info("Calling OpenAI for advanced image prompt building")
-        response = requests.post(url, headers=headers, json=payload)
-        response_data = response.json()
+        result = llm_client.chat(api_key=OPENAI_API_KEY_ENHANCER, **payload)
 
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error for advanced prompt building: {response_data}")
+        if not result.ok:
+            logger.error(f"OpenAI API error for advanced prompt building: {result.error}")
             # Fallback to simplified prompt
             return f"Create a stunning visual design: {user_input}. Professional quality, 1024x1024 resolution, high contrast, vibrant colors, clear typography, balanced composition."
 
-        final_prompt = response_data["choices"][0]["message"]["content"].strip()
+        final_prompt = result.content.strip()
         
         # Ensure prompt isn't too long for GPT Image-1
         if len(final_prompt) > 1000:
@@ -1502,14 +1815,35 @@ Create a final prompt that will generate exceptional professional visuals."""
         # Return simplified fallback
         return f"Create a stunning visual design: {user_input}. Professional quality, 1024x1024 resolution, high contrast, vibrant colors, clear typography, balanced composition."
 
+def transcribe_text_region(png_bytes):
+    """Exact text of a small image crop, for lines the local OCR is unsure about"""
+    result = routed_vision(
+        'ocr_region',
+        "gpt-4o-mini",
+        "You transcribe text from image crops. Reply with only the exact text shown, on one line, with no quotes or commentary. Reply with nothing if there is no text.",
+        "Transcribe the text in this image.",
+        png_bytes,
+        temperature=0,
+        max_tokens=100
+    )
+    if not result.ok:
+        logger.warning(f"Text region transcription failed: {result.error}")
+        return None
+    return result.content.strip()
+
 def process_ocr_svg(image_data):
-    """Generate a text-only SVG using gpt-4o-mini by passing the image directly to the chat API."""
+    """Generate a text-only SVG, locally from OCR or with gpt-4o-mini reading the whole image."""
     if not PARALLEL_FEATURES_AVAILABLE:
         raise NotImplementedError("Parallel features not available - missing dependencies")
-    
-    # Base64-encode the PNG image
-    img_b64 = base64.b64encode(image_data).decode('utf-8')
-    
+
+    if text_layer.TEXT_LAYER_ENGINE == 'local':
+        try:
+            svg_code = text_layer.build_text_svg(image_data, transcribe=transcribe_text_region)
+            svg_filename, svg_relative_path, session_id = save_svg(svg_code, prefix='text_svg')
+            return svg_code, svg_relative_path
+        except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError, OSError, ValueError) as e:
+            logger.warning(f"Local text layer failed, using the vision model: {str(e)}")
+
     # Build prompts matching generate_svg_from_image style
     system_prompt = """You are an expert SVG text generator. Your task is to create precise, clean SVG code that contains ONLY text elements from the provided image. Follow these guidelines:
 1. Create SVG with dimensions 1080x1080 pixels
@@ -1526,36 +1860,22 @@ def process_ocr_svg(image_data):
 Focus on producing clean SVG code that contains ONLY the text content from the input image.
 Return ONLY the SVG code without any explanations or comments."""
 
-    user_content = [
-        {"type": "text", "text": "Generate an SVG that contains only text elements exactly as seen in the image."},
-        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_b64}"}}
-    ]
-    
-    # Call Chat Completions API directly to support image_url message
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
-        ],
-        "temperature": 1,
-        "max_tokens": 8000
-    }
-    
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_SVG}"
-    }
-    
-    response = requests.post(url, headers=headers, json=payload)
-    data = response.json()
+    # Vision call with the PNG passed inline as an image_url message
+    result = routed_vision(
+        'ocr_svg',
+        "gpt-4o-mini",
+        system_prompt,
+        "Generate an SVG that contains only text elements exactly as seen in the image.",
+        image_data,
+        temperature=1,
+        max_tokens=8000
+    )
     
-    if response.status_code != 200:
-        logger.error(f"Error generating text SVG: {data}")
+    if not result.ok:
+        logger.error(f"Error generating text SVG: {result.error}")
         raise Exception("Text SVG generation failed")
     
-    content = data["choices"][0]["message"]["content"]
+    content = result.content
     
     # Extract the SVG
     match = re.search(r'<svg.*?</svg>', content, re.DOTALL)
@@ -1565,17 +1885,35 @@ Return ONLY the SVG code without any explanations or comments."""
     svg_filename, svg_relative_path, session_id = save_svg(svg_code, prefix='text_svg')
     return svg_code, svg_relative_path
 
+def estimate_background_plate(image_data):
+    """Fit the background locally; the plate's SVG markup is the fifth element of the result"""
+    plate = background_plate.estimate_plate(image_data)
+    background_base64 = base64.b64encode(plate['preview_png']).decode('utf-8')
+    session_id = f"bg_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    background_filename, background_relative_path, _ = save_image(background_base64, prefix="background", session_id=session_id)
+    background_full_path = os.path.join(IMAGES_DIR, background_relative_path)
+    background_public_url = get_public_image_url(background_relative_path)
+    logger.info(f"Background plate saved: {background_filename} ({plate['kind']}, rms {plate['rms']})")
+    return background_base64, background_filename, background_full_path, background_public_url, plate['layer']
+
+def background_layer(background):
+    """SVG markup of a locally fitted plate, or None for image backgrounds and older 4-tuples"""
+    return background[4] if len(background) > 4 else None
+
 def process_background_extraction(image_data):
-    """Extract background using gpt-4o-mini vision to analyze and recreate background"""
+    """Extract the background: fitted locally, or described by gpt-4o-mini vision and regenerated"""
     if not PARALLEL_FEATURES_AVAILABLE:
         raise NotImplementedError("Parallel features not available - missing dependencies")
+
+    if background_plate.BACKGROUND_PLATE_ENGINE == 'local':
+        try:
+            return estimate_background_plate(image_data)
+        except (ValueError, OSError, np.linalg.LinAlgError) as e:
+            logger.warning(f"Local background plate failed, regenerating remotely: {str(e)}")
     
     logger.info("Starting background extraction using gpt-4o-mini vision...")
     
     try:
-        # Base64-encode the PNG image for vision analysis
-        img_b64 = base64.b64encode(image_data).decode('utf-8')
-        
         # First, analyze the background with gpt-4o-mini vision
         system_prompt = """You are an expert image background extractor. Your task is to analyze the provided image and extract ONLY the core background colors and gradients, ignoring all other elements.
 
@@ -1594,52 +1932,41 @@ DO NOT include or describe:
 
 Provide a minimal description focused purely on recreating the base background colors/gradients."""
 
-        user_content = [
-            {"type": "text", "text": "Analyze this image and describe only the background elements in detail, ignoring all text and main graphic elements."},
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_b64}"}}
-        ]
-        
         # Call gpt-4o-mini for background analysis
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            "temperature": 1,
-            "max_tokens":  6000
-        }
-        
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {OPENAI_API_KEY_SVG}"
-        }
-        
         logger.info("Analyzing background with gpt-4o-mini vision...")
-        response = requests.post(url, headers=headers, json=payload)
-        analysis_data = response.json()
+        analysis = routed_vision(
+            'background_analysis',
+            "gpt-4o-mini",
+            system_prompt,
+            "Analyze this image and describe only the background elements in detail, ignoring all text and main graphic elements.",
+            image_data,
+            temperature=1,
+            max_tokens=6000
+        )
         
-        if response.status_code != 200:
-            logger.error(f"Error analyzing background: {analysis_data}")
+        if not analysis.ok:
+            logger.error(f"Error analyzing background: {analysis.error}")
             raise Exception("Background analysis failed")
         
-        background_description = analysis_data["choices"][0]["message"]["content"]
+        background_description = analysis.content
         logger.info(f"Background analysis: {background_description[:200]}...")
         
         # Now use GPT Image-1 to generate background based on description
         background_generation_prompt = f"Create a clean background based on this description: {background_description}. The background should be 1024x1024 pixels, without any text, icons, or graphic elements - just the background pattern, colors, and textures described."
         
         logger.info("Generating background with GPT Image-1...")
-        response = openai.images.generate(
-            model=GPT_IMAGE_MODEL,
-            prompt=background_generation_prompt,
+        generation = llm_client.generate_image(
+            GPT_IMAGE_MODEL,
+            background_generation_prompt,
             size="1024x1024",
-            quality="low"
+            quality="low",
+            api_key=OPENAI_API_KEY_SVG
         )
+        if not generation.ok:
+            raise Exception(f"Background generation failed: {generation.error}")
         
         # Get the background-only image
-        background_base64 = response.data[0].b64_json if hasattr(response.data[0], 'b64_json') else response.data[0].url
+        background_base64 = generation.b64_json or generation.url
         
         # Handle URL vs base64 response
         if background_base64.startswith('http'):
@@ -1663,7 +1990,7 @@ Provide a minimal description focused purely on recreating the base background c
         
         logger.info(f"Background extracted and saved: {background_filename}")
         logger.info(f"Background public URL: {background_public_url}")
-        return background_base64, background_filename, background_full_path, background_public_url
+        return background_base64, background_filename, background_full_path, background_public_url, None
         
     except Exception as e:
         logger.error(f"Error in background extraction: {str(e)}")
@@ -1678,54 +2005,32 @@ Provide a minimal description focused purely on recreating the base background c
         
         logger.warning("Using original image as background fallback")
         logger.info(f"Fallback background public URL: {fallback_public_url}")
-        return image_base64, fallback_filename, fallback_full_path, fallback_public_url
+        return image_base64, fallback_filename, fallback_full_path, fallback_public_url, None
 
 def process_clean_svg(image_data):
-    """Process text AND background removal and convert to clean SVG (elements only)"""
+    """Process text AND background removal and convert to clean SVG (elements only).
+
+    Everything stays in memory: returns (svg_code, svg_filename, edited_png_base64),
+    and the elements_*_path stages persist the SVG and PNG into the session.
+    """
     if not PARALLEL_FEATURES_AVAILABLE:
         raise NotImplementedError("Parallel features not available - missing dependencies")
     
-    # Save the original image bytes to a temporary PNG file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    temp_input_path = f"temp_input_{timestamp}_{uuid.uuid4()}.png"
-    with open(temp_input_path, "wb") as f:
-        f.write(image_data)
 
-    try:
-        # Remove text from the image using remove_text_simple
-        # This will be our elements-only image (text removed, but background may still be present)
-        # V-Tracer will handle the vectorization and naturally isolate the vector elements
-        final_edited_path = remove_text_simple.remove_text(temp_input_path)
-        logger.info("Text removed from image, proceeding with V-Tracer for element isolation...")
-
-        # Convert the final edited PNG to SVG using vtracer with optimized settings
-        output_svg_path = os.path.join(IMAGES_DIR, f"elements_{timestamp}_{uuid.uuid4().hex[:8]}.svg")
-        vtracer.convert_image_to_svg_py(
-            final_edited_path,
-            output_svg_path,
-            colormode='color',
-            hierarchical='stacked',
-            mode='spline',
-            filter_speckle=4,
-            color_precision=6,
-            layer_difference=16,
-            corner_threshold=60,
-            length_threshold=4.0,
-            max_iterations=10,
-            splice_threshold=45,
-            path_precision=3
-        )
+    # Remove text from the image, locally by OCR mask and inpainting unless the
+    # mask is too complex, in which case gpt-image-1 edits within the mask.
+    # This will be our elements-only image (text removed, but background may still be present)
+    # V-Tracer will handle the vectorization and naturally isolate the vector elements
+    edited_bytes, removal = text_removal.remove_text(image_data, remote=remove_text_simple.remove_text_bytes)
+    logger.info(f"Text removed from image ({removal['engine']}), proceeding with V-Tracer for element isolation...")
 
-        # Read the generated SVG
-        with open(output_svg_path, 'r', encoding='utf-8') as f:
-            svg_code = f.read()
-
-        return svg_code, os.path.basename(output_svg_path), final_edited_path
-    finally:
-        # Clean up temporary files
-        for temp_file in [temp_input_path]:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+    # Convert the edited PNG to SVG with vtracer, bytes in and SVG string out,
+    # with parameters searched (or cached) for this kind of image
+    svg_code, tuning = vtracer_tuning.image_to_svg(edited_bytes)
+    logger.info(f"Elements vectorized: {tuning}")
+    svg_filename = f"elements_{timestamp}_{uuid.uuid4().hex[:8]}.svg"
+    return svg_code, svg_filename, base64.b64encode(edited_bytes).decode('utf-8')
 
 
 
@@ -1841,208 +2146,604 @@ def simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_im
         # Return the elements SVG as the safest fallback
         return elements_svg_code if elements_svg_code else text_svg_code
 
-@app.route('/api/generate-parallel-svg', methods=['POST'])
-def generate_parallel_svg():
-    """Enhanced Pipeline: Stages 1-6 image gen, then triple parallel Stage 7: Text SVG, Background Extraction, and Elements SVG generation"""
+def save_artifact_or_fallback(label, save, fallback_path):
+    """Save a Stage 7 artifact to the session folder, falling back to its original path"""
     try:
-        if not PARALLEL_FEATURES_AVAILABLE:
-            return jsonify({
-                "error": "Parallel SVG features not available",
-                "message": "Missing required dependencies (vtracer, remove_text_simple, etc.)",
-                "fallback": "Please use /api/generate-svg endpoint instead"
-            }), 501
+        _, relative_path, _ = save()
+        return relative_path
+    except Exception as e:
+        logger.warning(f"Error saving {label} to unified storage: {e}")
+        return fallback_path
+
+def save_elements_png(edited_png_base64, session_id):
+    """Save the text-free PNG produced by process_clean_svg into the session folder"""
+    return save_image(edited_png_base64, prefix="elements_png", format="PNG", session_id=session_id)
+
+def inline_background_plate(svg_code, background_url, plate_layer):
+    """Swap the background <image> for the plate markup, or put the plate behind everything else"""
+    image_tag = re.compile(r'<image\b[^>]*href="' + re.escape(background_url) + r'"[^>]*?(?:/>|>\s*</image>)')
+    if image_tag.search(svg_code):
+        return image_tag.sub(lambda _: plate_layer, svg_code, count=1)
+    svg_open = re.search(r'<svg\b[^>]*>', svg_code)
+    if not svg_open:
+        return svg_code
+    return svg_code[:svg_open.end()] + f'<g id="background-plate-layer">{plate_layer}</g>' + svg_code[svg_open.end():]
+
+def combine_svg_layers(text_svg, elements, background):
+    """Stages 8 and 9: combine the three layers and strip the first elements path"""
+    text_svg_code = text_svg[0]
+    elements_svg_code = elements[0]
+    background_public_url = background[3]
+
+    logger.info('Stage 8: AI-Powered 3-Layer SVG Combination using PUBLIC background URL')
+    logger.info(f'Using public background URL for SVG combination: {background_public_url}')
+    combined_svg_code = ai_combine_svgs(text_svg_code, elements_svg_code, background_public_url)
+
+    # Validate the combined SVG
+    if not combined_svg_code or not combined_svg_code.strip():
+        logger.error("Combined SVG is empty, using fallback with public URL")
+        combined_svg_code = simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_public_url)
+
+    # Ensure the SVG is well-formed
+    if not combined_svg_code.strip().startswith('<svg'):
+        logger.warning("Combined SVG doesn't start with <svg, using fallback with public URL")
+        combined_svg_code = simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_public_url)
+
+    plate_layer = background_layer(background)
+    if plate_layer:
+        # A fitted plate is a few hundred bytes of gradient; inline it rather than referencing the preview PNG
+        combined_svg_code = inline_background_plate(combined_svg_code, background_public_url, plate_layer)
+
+    logger.info('Stage 9: Post-processing SVG to remove first path in elements-layer')
+    return post_process_svg_remove_first_path(combined_svg_code)
+
+def start_speculative_image(prompt, source):
+    """Start a gpt-image-1 generation from an early prompt without the extra enhancement call"""
+    return speculative_image.SpeculativeImage(
+        prompt,
+        lambda p: llm_client.submit(request_gpt_image(p)),
+        finish=store_generated_image,
+        source=source
+    )
 
-        data = request.json or {}
-        user_input = data.get('prompt', '')
+def add_image_generation_stages(graph, speculative_policy):
+    """Add Stage 6 to a graph, optionally speculating on an early prompt"""
+    if speculative_policy == 'off':
+        graph.add('generated_image',
+                  lambda image_prompt, design_context: generate_image_with_gpt(image_prompt, design_context),
+                  deps=['image_prompt', 'design_context'])
+        return
+
+    if speculative_image.SPECULATIVE_IMAGE_SOURCE == 'pre_enhanced':
+        graph.add('speculation',
+                  lambda pre_enhanced_prompt, design_context: start_speculative_image(
+                      build_local_image_prompt(pre_enhanced_prompt, design_context), pre_enhanced_prompt),
+                  deps=['pre_enhanced_prompt', 'design_context'])
+    else:
+        graph.add('speculation',
+                  lambda user_input: start_speculative_image(build_local_image_prompt(user_input), user_input),
+                  deps=['user_input'])
+
+    if speculative_policy == 'keep':
+        # The enhancement chain is no longer needed for the image at all
+        graph.add('generated_image',
+                  lambda speculation: speculative_image.resolve_speculation(speculation, None, None, 'keep'),
+                  deps=['speculation'])
+        return
+
+    # Both image prompts come from the same template, so only the text they
+    # were built from is compared
+    def resolve_similar(speculation, image_prompt, enhanced_prompt, design_context):
+        return speculative_image.resolve_speculation(
+            speculation, image_prompt,
+            lambda prompt: generate_image_with_gpt(prompt, design_context),
+            'similar',
+            final_source=enhanced_prompt
+        )
 
-        if not user_input:
-            return jsonify({'error': 'No prompt provided'}), 400
+    graph.add('generated_image', resolve_similar,
+              deps=['speculation', 'image_prompt', 'enhanced_prompt', 'design_context'])
+
+def build_parallel_svg_graph(speculative_policy='off', pipeline_mode='staged'):
+    """Stage graph for /api/generate-parallel-svg.
+
+    Stages 2-6 form a chain, but the three Stage 7 jobs start as soon as the
+    image is decoded and each artifact is saved while the others still run.
+    With a speculative policy, Stage 6 starts from an early prompt instead;
+    in brief mode Stages 2-5 are one design brief call.
+    """
+    graph = StageGraph('generate_parallel_svg')
+    graph.add('session_id', lambda: new_session_id('parallel'))
+    if pipeline_mode == 'brief':
+        add_design_brief_stages(graph)
+    else:
+        graph.add('design_plan', lambda user_input: plan_design(user_input), deps=['user_input'])
+        graph.add('design_knowledge',
+                  lambda design_plan, user_input: generate_design_knowledge(design_plan, user_input),
+                  deps=['design_plan', 'user_input'])
+        graph.add('design_context', build_design_context,
+                  deps=['design_plan', 'design_knowledge', 'user_input'])
+        graph.add('pre_enhanced_prompt',
+                  lambda design_context: pre_enhance_prompt(pre_enhancer_context(design_context)),
+                  deps=['design_context'])
+        graph.add('enhanced_prompt',
+                  lambda pre_enhanced_prompt: enhance_prompt_with_chat(pre_enhanced_prompt),
+                  deps=['pre_enhanced_prompt'])
+    graph.add('image_prompt',
+              lambda enhanced_prompt, design_context: build_advanced_image_prompt(enhanced_prompt, design_context),
+              deps=['enhanced_prompt', 'design_context'])
+    add_image_generation_stages(graph, speculative_policy)
+    graph.add('image_data', lambda generated_image: base64.b64decode(generated_image[0]),
+              deps=['generated_image'])
+    graph.add('initial_image',
+              lambda generated_image, session_id: save_image(generated_image[0], prefix="initial_generated", session_id=session_id),
+              deps=['generated_image', 'session_id'])
+
+    # Stage 7: text, background and elements layers
+    graph.add('text_svg', lambda image_data: process_ocr_svg(image_data), deps=['image_data'])
+    graph.add('background', lambda image_data: process_background_extraction(image_data), deps=['image_data'])
+    graph.add('elements', lambda image_data: process_clean_svg(image_data), deps=['image_data'])
+
+    graph.add('background_path',
+              lambda background, session_id: save_artifact_or_fallback(
+                  'background', lambda: save_image(background[0], prefix="background", session_id=session_id), background[1]),
+              deps=['background', 'session_id'])
+    graph.add('text_svg_path',
+              lambda text_svg, session_id: save_artifact_or_fallback(
+                  'text SVG', lambda: save_svg(text_svg[0], prefix="text_svg", session_id=session_id), text_svg[1]),
+              deps=['text_svg', 'session_id'])
+    graph.add('elements_svg_path',
+              lambda elements, session_id: save_artifact_or_fallback(
+                  'elements SVG', lambda: save_svg(elements[0], prefix="elements_svg", session_id=session_id), elements[1]),
+              deps=['elements', 'session_id'])
+    graph.add('elements_png_path',
+              lambda elements, session_id: save_artifact_or_fallback(
+                  'elements PNG', lambda: save_elements_png(elements[2], session_id),
+                  f"{os.path.splitext(elements[1])[0]}.png"),
+              deps=['elements', 'session_id'])
+
+    # Stages 8-9 overlap with saving the Stage 7 artifacts
+    graph.add('combined_svg', combine_svg_layers, deps=['text_svg', 'elements', 'background'])
+    graph.add('combined_svg_saved',
+              lambda combined_svg, session_id: save_svg(combined_svg, prefix="combined_svg", session_id=session_id),
+              deps=['combined_svg', 'session_id'])
+    return graph
+
+PARALLEL_SVG_GRAPHS = {
+    (policy, mode): build_parallel_svg_graph(policy, mode)
+    for policy in speculative_image.SPECULATIVE_POLICIES
+    for mode in design_brief.PIPELINE_MODES
+}
 
-        logger.info('=== PARALLEL SVG PIPELINE START ===')
+# Stages whose outputs make up the /api/generate-parallel-svg response
+PARALLEL_SVG_TARGETS = [
+    'initial_image', 'text_svg', 'background', 'elements', 'background_path',
+    'text_svg_path', 'elements_svg_path', 'elements_png_path', 'combined_svg', 'combined_svg_saved'
+]
+
+def build_parallel_svg_response(user_input, graph_run):
+    """Assemble the /api/generate-parallel-svg response from a finished graph run"""
+    parallel_session_id = graph_run['session_id']
+    initial_image_filename, initial_image_relative_path, _ = graph_run['initial_image']
+    text_svg_code = graph_run['text_svg'][0]
+    elements_svg_code = graph_run['elements'][0]
+    background_base64, _, _, background_public_url = graph_run['background'][:4]
+    background_relative_path = graph_run['background_path']
+    text_svg_relative_path = graph_run['text_svg_path']
+    elements_svg_relative_path = graph_run['elements_svg_path']
+    edited_png_relative_path = graph_run['elements_png_path']
+    combined_svg_code = graph_run['combined_svg']
+    combined_svg_filename, combined_svg_relative_path, _ = graph_run['combined_svg_saved']
+    logger.info(f"Combined SVG saved successfully: {combined_svg_filename}")
+
+    # Base URL for unified storage
+    base_url = '/static/images/sessions'
+
+    # Construct PUBLIC URLs for serving using unified storage paths  
+    initial_image_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{initial_image_filename}")
+    text_svg_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}")
+    # Use the background_public_url we already have from the background extraction
+    elements_svg_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}")
+    edited_png_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}")
+
+    # Log all public URLs for debugging
+    logger.info(f"Generated public URLs:")
+    logger.info(f"  Initial image: {initial_image_public_url}")
+    logger.info(f"  Background: {background_public_url}")
+    logger.info(f"  Text SVG: {text_svg_public_url}")
+    logger.info(f"  Elements SVG: {elements_svg_public_url}")
+    logger.info(f"  Elements PNG: {edited_png_public_url}")
+
+    # Also create relative URLs for backward compatibility in response
+    initial_image_url = f"{base_url}/{parallel_session_id}/{initial_image_filename}"
+    text_svg_url = f"{base_url}/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}"
+    background_url = f"{base_url}/{parallel_session_id}/{os.path.basename(background_relative_path)}"
+    elements_svg_url = f"{base_url}/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}"
+    edited_png_url = f"{base_url}/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}"
+
+    # Final combined SVG URL
+    combined_svg_url = f"{base_url}/{parallel_session_id}/{combined_svg_filename}"
 
-        # Stage 2: Design Planning
-        logger.info('Stage 2: Design Planning')
-        design_plan = plan_design(user_input)
-
-        # Stage 3: Design Knowledge Generation
-        logger.info('Stage 3: Design Knowledge Generation')
-        design_knowledge = generate_design_knowledge(design_plan, user_input)
-
-        # Prepare context for enhancements
-        design_context = f"""Design Plan:\n{design_plan}\n\nDesign Knowledge and Best Practices:\n{design_knowledge}\n\nOriginal Request:\n{user_input}"""
-
-        # Stage 4: Pre-Enhancement Phase
-        logger.info('Stage 4: Pre-Enhancement Phase')
-        logger.info('Pre-enhancing prompt with design context...')
-        logger.info(f'Using model: {PRE_ENHANCER_MODEL}')
-        pre_enhanced_prompt = pre_enhance_prompt(design_context)
-        logger.info('Pre-enhanced prompt generated')
-
-        # Stage 5: Final Enhancement Phase
-        logger.info('Stage 5: Final Enhancement Phase')
-        logger.info('Enhancing prompt with technical specifications...')
-        logger.info(f'Using model: {PROMPT_ENHANCER_MODEL}')
-        enhanced_prompt = enhance_prompt_with_chat(pre_enhanced_prompt)
-        logger.info('Enhanced prompt generated')
-
-        # Create unified session for parallel pipeline BEFORE image generation
-        parallel_session_id = f"parallel_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
-        logger.info(f'Created parallel session: {parallel_session_id}')
-        
-        # Build advanced image prompt optimized for parallel SVG processing
-        image_prompt = build_advanced_image_prompt(enhanced_prompt, design_context)
-
-        # Stage 6: Image Generation via GPT-Image using enhanced prompt
-        logger.info('Stage 6: Image Generation via GPT-Image with enhanced prompt')
-        logger.debug(f'Image prompt: {image_prompt[:200]}...')
-        image_base64, temp_image_filename, initial_public_url = generate_image_with_gpt(image_prompt, design_context)
-        image_data = base64.b64decode(image_base64)
-        
-        # Save the initial generated image to unified storage immediately
-        logger.info(f'Saving initial generated image to unified storage session: {parallel_session_id}')
-        initial_image_filename, initial_image_relative_path, _ = save_image(image_base64, prefix="initial_generated", session_id=parallel_session_id)
-
-        # Stage 7: Triple Parallel Processing
-        logger.info('Stage 7: Triple Parallel Processing - Text SVG, Background Extraction, and Elements SVG')
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit all three tasks
-            ocr_future = executor.submit(process_ocr_svg, image_data)
-            background_future = executor.submit(process_background_extraction, image_data)
-            elements_future = executor.submit(process_clean_svg, image_data)
-            
-            # Get results
-            text_svg_code, text_svg_path = ocr_future.result()
-            background_base64, background_filename, background_path, background_public_url = background_future.result()
-            elements_svg_code, elements_svg_path, edited_png_path = elements_future.result()
+    return {
+        'original_prompt': user_input,
+        'initial_image': {
+            'url': initial_image_url,
+            'public_url': initial_image_public_url,
+            'path': initial_image_relative_path,
+            'filename': initial_image_filename
+        },
+        'background': {
+            'base64': background_base64,
+            'path': f"sessions/{parallel_session_id}/{os.path.basename(background_relative_path)}",
+            'url': background_url,
+            'public_url': background_public_url,
+            'svg': background_layer(graph_run['background'])
+        },
+        'elements_png': {
+            'path': f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}",
+            'url': edited_png_url,
+            'public_url': edited_png_public_url
+        },
+        'text_svg': {
+            'code': text_svg_code,
+            'path': f"sessions/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}",
+            'url': text_svg_url,
+            'public_url': text_svg_public_url
+        },
+        'elements_svg': {
+            'code': elements_svg_code,
+            'path': f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}",
+            'url': elements_svg_url,
+            'public_url': elements_svg_public_url
+        },
+        'combined_svg': {
+            'code': combined_svg_code,
+            'path': combined_svg_relative_path,
+            'url': combined_svg_url,
+            'public_url': get_public_image_url(combined_svg_relative_path)
+        },
+        'session_id': parallel_session_id,
+        'stage': 8,
+        'timings': graph_run.summary(),
+        'speculative_image': graph_run['speculation'].summary() if 'speculation' in graph_run.results else None,
+        'note': 'SVG now uses public URLs for proper image embedding'
+    }
 
-        # Session already created above
+def session_checkpoints(session_id):
+    return checkpoints.StageCheckpoints(os.path.join(UNIFIED_STORAGE_DIR, session_id))
+
+def run_parallel_svg_pipeline(user_input, speculative_policy, reuse_similar=True, on_stage_complete=None,
+                              session_id=None, resume_from=None, pipeline_mode='staged', include=()):
+    """Run the parallel SVG graph for one request and return the response payload
+
+    Stage outputs are checkpointed in the session folder; a run with an existing
+    session_id skips every checkpointed stage except resume_from and what follows it.
+    """
+    graph = PARALLEL_SVG_GRAPHS[speculative_policy, pipeline_mode]
+    inputs, similar_match = similar_prompt_inputs('generate_parallel_svg', user_input, reuse_similar)
+    if similar_match and on_stage_complete:
+        for name, value in similar_match['artifacts'].items():
+            on_stage_complete(name, value)
+
+    session_id = session_id or new_session_id('parallel')
+    inputs['session_id'] = session_id
+    store = session_checkpoints(session_id) if checkpoints.CHECKPOINTS_ENABLED else None
+    resumed = {}
+    if store is not None:
+        if resume_from:
+            store.discard(graph.downstream([resume_from]))
+        resumed = store.load(exclude=('user_input', 'session_id'))
+        if resumed:
+            logger.info(f"Resuming session {session_id}, skipping {sorted(resumed)}")
+            inputs.update(resumed)
+            if on_stage_complete:
+                for name, value in resumed.items():
+                    on_stage_complete(name, value)
+        store.save_request({'user_input': user_input, 'speculative_policy': speculative_policy,
+                            'pipeline_mode': pipeline_mode})
+
+    speculations = []
+
+    def stage_complete(name, value):
+        if name == 'speculation':
+            speculations.append(value)
+        if store is not None:
+            store.save(name, value)
+        if on_stage_complete:
+            on_stage_complete(name, value)
 
-        # Base URL for unified storage
-        base_url = '/static/images/sessions'
+    try:
+        graph_run = graph.run(inputs, targets=PARALLEL_SVG_TARGETS + list(include), on_stage_complete=stage_complete)
+    except StageError as e:
+        # Lets the caller retry from the failed stage with the same session
+        e.session_id = session_id
+        raise
+    finally:
+        # A failed stage stops the graph before Stage 6 can resolve the speculation
+        for speculation in speculations:
+            speculation.abandon()
+    if not similar_match:
+        similar_prompts.remember_artifacts('generate_parallel_svg', user_input, graph_run.results)
+
+    response = build_parallel_svg_response(user_input, graph_run)
+    response['similar_prompt'] = similar_prompt_summary(similar_match)
+    response['resumed_stages'] = sorted(resumed)
+    response['pipeline_mode'] = pipeline_mode
+    response['included'] = {name: graph_run[name] for name in include}
+    return response
+
+def parse_parallel_svg_request(data):
+    """Validate a parallel SVG request body; returns (params, error_response)"""
+    if not PARALLEL_FEATURES_AVAILABLE:
+        return None, (jsonify({
+            "error": "Parallel SVG features not available",
+            "message": "Missing required dependencies (vtracer, remove_text_simple, etc.)",
+            "fallback": "Please use /api/generate-svg endpoint instead"
+        }), 501)
+
+    user_input = data.get('prompt', '')
+    session_id = data.get('session_id')
+    resume_from = data.get('resume_from')
+    saved_request = {}
+    if session_id is not None:
+        if not checkpoints.valid_session_id(session_id):
+            return None, (jsonify({'error': 'Invalid session_id'}), 400)
+        saved_request = session_checkpoints(session_id).load_request()
+        if saved_request is None:
+            return None, (jsonify({'error': f"No checkpoints for session {session_id}"}), 404)
+        if user_input and user_input != saved_request['user_input']:
+            return None, (jsonify({'error': 'prompt does not match the prompt of this session'}), 400)
+        user_input = saved_request['user_input']
+    if not user_input:
+        return None, (jsonify({'error': 'No prompt provided'}), 400)
 
-        # Save all files directly to unified session folder using session_id
-        try:
-            # Initial image already saved above as 'initial_generated'
-            
-            # Save background image to unified storage
-            _, background_relative_path, _ = save_image(background_base64, prefix="background", session_id=parallel_session_id)
-            
-            # Save text SVG to unified storage
-            _, text_svg_relative_path, _ = save_svg(text_svg_code, prefix="text_svg", session_id=parallel_session_id)
-            
-            # Save elements SVG to unified storage
-            _, elements_svg_relative_path, _ = save_svg(elements_svg_code, prefix="elements_svg", session_id=parallel_session_id)
-            
-            # Save elements PNG to unified storage
-            with open(edited_png_path, 'rb') as f:
-                edited_png_data = f.read()
-            edited_png_base64 = base64.b64encode(edited_png_data).decode('utf-8')
-            _, edited_png_relative_path, _ = save_image(edited_png_base64, prefix="elements_png", format="PNG", session_id=parallel_session_id)
-
-        except Exception as e:
-            logger.warning(f"Error saving files to unified storage: {e}")
-            # Fallback to using original paths
-            initial_image_relative_path = temp_image_filename
-            background_relative_path = background_filename
-            text_svg_relative_path = text_svg_path
-            elements_svg_relative_path = elements_svg_path
-            edited_png_relative_path = os.path.basename(edited_png_path)
-
-        # Construct PUBLIC URLs for serving using unified storage paths  
-        initial_image_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{initial_image_filename}")
-        text_svg_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}")
-        # Use the background_public_url we already have from the background extraction
-        elements_svg_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}")
-        edited_png_public_url = get_public_image_url(f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}")
-
-        # Log all public URLs for debugging
-        logger.info(f"Generated public URLs:")
-        logger.info(f"  Initial image: {initial_image_public_url}")
-        logger.info(f"  Background: {background_public_url}")
-        logger.info(f"  Text SVG: {text_svg_public_url}")
-        logger.info(f"  Elements SVG: {elements_svg_public_url}")
-        logger.info(f"  Elements PNG: {edited_png_public_url}")
-
-        # Also create relative URLs for backward compatibility in response
-        initial_image_url = f"{base_url}/{parallel_session_id}/{initial_image_filename}"
-        text_svg_url = f"{base_url}/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}"
-        background_url = f"{base_url}/{parallel_session_id}/{os.path.basename(background_relative_path)}"
-        elements_svg_url = f"{base_url}/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}"
-        edited_png_url = f"{base_url}/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}"
-
-        # Stage 8: AI-Powered 3-Layer SVG Combination using PUBLIC URLs for proper embedding
-        logger.info('Stage 8: AI-Powered 3-Layer SVG Combination using gpt-4o-mini with PUBLIC background URL')
-        logger.info(f'Using public background URL for SVG combination: {background_public_url}')
-        combined_svg_code = ai_combine_svgs(text_svg_code, elements_svg_code, background_public_url)
-        
-        # Validate the combined SVG
-        if not combined_svg_code or not combined_svg_code.strip():
-            logger.error("Combined SVG is empty, using fallback with public URL")
-            combined_svg_code = simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_public_url)
-        
-        # Ensure the SVG is well-formed
-        if not combined_svg_code.strip().startswith('<svg'):
-            logger.warning("Combined SVG doesn't start with <svg, using fallback with public URL")
-            combined_svg_code = simple_combine_svgs_fallback(text_svg_code, elements_svg_code, background_public_url)
-        
-        # Stage 9: Post-process SVG with OpenAI to remove first path in elements-layer
-        logger.info('Stage 9: Post-processing SVG to remove first path in elements-layer using gpt-4o-mini')
-        combined_svg_code = post_process_svg_remove_first_path(combined_svg_code)
-        
-        # Save combined SVG to unified storage
-        combined_svg_filename, combined_svg_relative_path, _ = save_svg(combined_svg_code, prefix="combined_svg", session_id=parallel_session_id)
-        
-        logger.info(f"Combined SVG saved successfully: {combined_svg_filename}")
-
-        # Final combined SVG URL
-        combined_svg_url = f"{base_url}/{parallel_session_id}/{combined_svg_filename}"
+    try:
+        speculative_policy = speculative_image.resolve_policy(
+            data.get('speculative_image', saved_request.get('speculative_policy')))
+        pipeline_mode = design_brief.resolve_mode(data.get('pipeline_mode', saved_request.get('pipeline_mode')))
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+    if resume_from is not None:
+        if session_id is None:
+            return None, (jsonify({'error': 'resume_from requires a session_id'}), 400)
+        if resume_from not in PARALLEL_SVG_GRAPHS[speculative_policy, pipeline_mode].stages:
+            return None, (jsonify({'error': f"Unknown stage '{resume_from}'"}), 400)
+
+    include, include_error = parse_include(data.get('include'), PARALLEL_SVG_GRAPHS[speculative_policy, pipeline_mode], OPTIONAL_STAGES)
+    if include_error:
+        return None, (jsonify({'error': include_error}), 400)
 
-        return jsonify({
-            'original_prompt': user_input,
-            'initial_image': {
-                'url': initial_image_url,
-                'public_url': initial_image_public_url,
-                'path': initial_image_relative_path,
-                'filename': initial_image_filename
-            },
-            'background': {
-                'base64': background_base64,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(background_relative_path)}",
-                'url': background_url,
-                'public_url': background_public_url
-            },
-            'elements_png': {
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(edited_png_relative_path)}",
-                'url': edited_png_url,
-                'public_url': edited_png_public_url
-            },
-            'text_svg': {
-                'code': text_svg_code,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(text_svg_relative_path)}",
-                'url': text_svg_url,
-                'public_url': text_svg_public_url
-            },
-            'elements_svg': {
-                'code': elements_svg_code,
-                'path': f"sessions/{parallel_session_id}/{os.path.basename(elements_svg_relative_path)}",
-                'url': elements_svg_url,
-                'public_url': elements_svg_public_url
-            },
-            'combined_svg': {
-                'code': combined_svg_code,
-                'path': combined_svg_relative_path,
-                'url': combined_svg_url,
-                'public_url': get_public_image_url(combined_svg_relative_path)
-            },
-            'session_id': parallel_session_id,
-            'stage': 8,
-            'note': 'SVG now uses public URLs for proper image embedding'
-        })
+    return {
+        'user_input': user_input,
+        'speculative_policy': speculative_policy,
+        'reuse_similar': data.get('reuse_similar', True),
+        'session_id': session_id,
+        'resume_from': resume_from,
+        'pipeline_mode': pipeline_mode,
+        'include': include
+    }, None
+
+def artifact_urls(relative_path):
+    return {
+        'path': relative_path,
+        'url': f"/static/images/{relative_path}",
+        'public_url': get_public_image_url(relative_path)
+    }
+
+def parallel_stage_event(name, value):
+    """SSE payload for a finished parallel SVG stage, or None if it is not streamed"""
+    if name in ('design_plan', 'design_knowledge', 'pre_enhanced_prompt', 'enhanced_prompt', 'image_prompt'):
+        return {'content': value}
+    if name == 'session_id':
+        return {'session_id': value}
+    if name in ('initial_image', 'combined_svg_saved'):
+        filename, relative_path, _ = value
+        return dict(artifact_urls(relative_path), filename=filename)
+    if name in ('text_svg', 'elements'):
+        return {'code': value[0]}
+    if name == 'background':
+        return {'public_url': value[3], 'svg': background_layer(value)}
+    if name == 'combined_svg':
+        return {'code': value}
+    if name in ('background_path', 'text_svg_path', 'elements_svg_path', 'elements_png_path'):
+        return artifact_urls(value)
+    return None
+
+def stream_parallel_svg_events(params):
+    """Run the pipeline on a background thread and yield SSE messages as stages finish"""
+    def work(emit):
+        def on_stage_complete(name, value):
+            payload = parallel_stage_event(name, value)
+            if payload is not None:
+                emit('stage', dict(payload, stage=name))
+
+        return run_parallel_svg_pipeline(on_stage_complete=on_stage_complete, **params)
+
+    return sse.stream_work(work, start=('start', {'original_prompt': params['user_input']}),
+                           name='parallel-svg-stream')
+
+@app.route('/api/generate-parallel-svg/stream', methods=['POST'])
+@admitted('generate_parallel_svg')
+def generate_parallel_svg_stream():
+    """Streaming variant of /api/generate-parallel-svg: one SSE event per finished stage"""
+    params, error_response = parse_parallel_svg_request(request_data())
+    if error_response:
+        return error_response
+
+    logger.info('=== PARALLEL SVG PIPELINE START (streaming) ===')
+    return Response(
+        stream_with_context(stream_parallel_svg_events(params)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate-parallel-svg', methods=['POST'])
+@admitted('generate_parallel_svg')
+def generate_parallel_svg():
+    """Enhanced Pipeline: Stages 1-6 image gen, then triple parallel Stage 7: Text SVG, Background Extraction, and Elements SVG generation"""
+    try:
+        params, error_response = parse_parallel_svg_request(request_data())
+        if error_response:
+            return error_response
+
+        logger.info('=== PARALLEL SVG PIPELINE START ===')
+        logger.info(f"Speculative image policy: {params['speculative_policy']}")
+        key = singleflight.request_key('generate_parallel_svg', params)
+        response, shared = REQUEST_FLIGHTS.do(key, lambda: run_parallel_svg_pipeline(**params))
+        return jsonify(dict(response, coalesced=shared))
 
     except Exception as e:
         logger.error(f"Error in generate_parallel_svg: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "failed_stage": getattr(e, 'stage', None),
+            "session_id": getattr(e, 'session_id', None)
+        }), 500
+
+def run_parallel_svg_job(params, progress):
+    """Job handler: the parallel SVG pipeline with per-stage progress recorded on the job"""
+    def on_stage_complete(name, value):
+        payload = parallel_stage_event(name, value)
+        if payload is not None:
+            progress(name, payload)
+
+    with admission.admit('generate_parallel_svg', timeout=None):
+        return run_parallel_svg_pipeline(on_stage_complete=on_stage_complete, **params)
+
+def run_chat_create_job(params, progress):
+    """Job handler: the chat assistant's design creation path"""
+    messages = params['messages']
+    with admission.admit('chat_create', timeout=None):
+        progress('design_creation', {'status': 'started'})
+        return run_chat_creation(messages, messages[-1]['content'].lower())
+
+# Batches share one pipeline slot pool so several batches cannot oversubscribe providers
+BATCH_MAX_PROMPTS = int(os.getenv('BATCH_MAX_PROMPTS', '50'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_SLOTS = threading.BoundedSemaphore(BATCH_CONCURRENCY)
+
+def parse_parallel_svg_batch(data):
+    """Validate a batch body; returns (params, error_response)"""
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts or not all(isinstance(p, str) and p.strip() for p in prompts):
+        return None, (jsonify({'error': 'prompts must be a non-empty list of non-empty strings'}), 400)
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        return None, (jsonify({'error': f'At most {BATCH_MAX_PROMPTS} prompts per batch'}), 400)
+
+    # Checkpoint resume is per session, so it does not apply to batches
+    item_data = {key: value for key, value in data.items() if key not in ('session_id', 'resume_from')}
+    params, error_response = parse_parallel_svg_request(dict(item_data, prompt=prompts[0]))
+    if error_response:
+        return None, error_response
+    for key in ('user_input', 'session_id', 'resume_from'):
+        del params[key]
+    params['prompts'] = prompts
+    return params, None
+
+def shared_work_counters():
+    """Stage calls saved so far by coalescing and the response cache"""
+    cache_stats = response_cache.stats if response_cache is not None else {}
+    return {
+        'stage_calls_coalesced': STAGE_FLIGHTS.summary()['followers'],
+        'stage_cache_hits': cache_stats.get('memory_hits', 0) + cache_stats.get('disk_hits', 0)
+    }
+
+def run_parallel_svg_batch(prompts, speculative_policy, reuse_similar=True, progress=None, pipeline_mode='staged',
+                           include=()):
+    """Run the parallel SVG pipeline for many prompts under the shared batch slots
+
+    Identical prompts run once. Different prompts run independent pipelines;
+    they share only stage calls with byte-identical inputs, through
+    STAGE_FLIGHTS and the response cache, and the summary counts those.
+    """
+    start = time.time()
+    counters_before = shared_work_counters()
+    logger.info(f"=== PARALLEL SVG BATCH: {len(prompts)} prompts ===")
+    items, unique_prompts, succeeded = batch_runner.run_batch(
+        prompts,
+        lambda prompt: run_parallel_svg_pipeline(prompt, speculative_policy, reuse_similar,
+                                                 pipeline_mode=pipeline_mode, include=include),
+        BATCH_SLOTS, BATCH_CONCURRENCY, progress=progress)
+
+    counters_after = shared_work_counters()
+    return {
+        'items': items,
+        'summary': dict(
+            {name: counters_after[name] - counters_before[name] for name in counters_after},
+            prompts=len(prompts),
+            unique_prompts=unique_prompts,
+            succeeded=succeeded,
+            failed=unique_prompts - succeeded,
+            concurrency=BATCH_CONCURRENCY,
+            elapsed_s=round(time.time() - start, 2)
+        )
+    }
+
+def run_parallel_svg_batch_job(params, progress):
+    """Job handler: a parallel SVG batch with one progress entry per finished item"""
+    with admission.admit('generate_parallel_svg_batch', timeout=None):
+        return run_parallel_svg_batch(progress=progress, **params)
+
+@app.route('/api/generate-parallel-svg/batch', methods=['POST'])
+@admitted('generate_parallel_svg_batch')
+def generate_parallel_svg_batch():
+    """Parallel SVG for a list of prompts; identical prompts and identical stage calls run once"""
+    try:
+        params, error_response = parse_parallel_svg_batch(request_data())
+        if error_response:
+            return error_response
+        return jsonify(run_parallel_svg_batch(**params))
+
+    except Exception as e:
+        logger.error(f"Error in generate_parallel_svg_batch: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+job_queue.register('parallel_svg', run_parallel_svg_job)
+job_queue.register('parallel_svg_batch', run_parallel_svg_batch_job)
+job_queue.register('chat_create', run_chat_create_job)
+job_queue.start()
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a parallel SVG, parallel SVG batch or chat-assistant creation job; poll GET /api/jobs/<job_id> for progress"""
+    data = request_data()
+    job_type = data.get('type', 'parallel_svg')
+
+    if job_type == 'parallel_svg':
+        params, error_response = parse_parallel_svg_request(data)
+        if error_response:
+            return error_response
+        # A fixed session lets a job rerun after a restart resume from its checkpoints
+        params['session_id'] = params['session_id'] or new_session_id('parallel')
+    elif job_type == 'parallel_svg_batch':
+        params, error_response = parse_parallel_svg_batch(data)
+        if error_response:
+            return error_response
+    elif job_type == 'chat_create':
+        messages = data.get('messages', [])
+        if not messages:
+            return jsonify({"error": "No messages provided"}), 400
+        params = {'messages': messages}
+    else:
+        return jsonify({'error': f"Unknown job type '{job_type}'", 'types': ['parallel_svg', 'parallel_svg_batch', 'chat_create']}), 400
+
+    job_id = job_queue.submit(job_type, params)
+    return jsonify({
+        'job_id': job_id,
+        'type': job_type,
+        'status': 'queued',
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, per-stage progress and, once finished, the result of a job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 def process_image_with_gpt_image(image_url, session_id):
     """Process main image through GPT Image-1 to remove text and background"""
     try:
@@ -2056,53 +2757,43 @@ def process_image_with_gpt_image(image_url, session_id):
         logger.info(f"Processing image with GPT Image-1: {image_url}")
         logger.info(f"Removal prompt: {removal_prompt}")
         
-        # Make request to GPT Image-1 API
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY_SVG}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": GPT_IMAGE_MODEL,
-            "prompt": removal_prompt,
-            "image": image_url,
-            "size": "1024x1024",
-            "quality": "standard",
-            "n": 1
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/images/edits",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"GPT Image-1 API error: {response.status_code} - {response.text}")
+        # The edits endpoint takes the source image as a file upload
+        source_response = requests.get(image_url, timeout=30)
+        if source_response.status_code != 200:
             return {
                 "success": False,
-                "error": f"GPT Image-1 API error: {response.status_code}"
+                "error": "Failed to download main image"
             }
         
-        result = response.json()
+        result = llm_client.edit_image(
+            GPT_IMAGE_MODEL,
+            source_response.content,
+            removal_prompt,
+            size="1024x1024",
+            api_key=OPENAI_API_KEY_SVG,
+            timeout=60,
+            n=1
+        )
         
-        if not result.get('data') or len(result['data']) == 0:
+        if not result.ok:
+            logger.error(f"GPT Image-1 API error: {result.status} - {result.error}")
             return {
                 "success": False,
-                "error": "No image generated by GPT Image-1"
+                "error": f"GPT Image-1 API error: {result.status}"
             }
         
-        # Download the generated clean image
-        clean_image_url = result['data'][0]['url']
-        
-        # Save the clean image locally
-        image_response = requests.get(clean_image_url, timeout=30)
-        if image_response.status_code != 200:
-            return {
-                "success": False,
-                "error": "Failed to download clean image"
-            }
+        clean_image_url = result.url
+        if result.b64_json:
+            clean_image_bytes = result.image_bytes
+        else:
+            # Download the generated clean image
+            image_response = requests.get(clean_image_url, timeout=30)
+            if image_response.status_code != 200:
+                return {
+                    "success": False,
+                    "error": "Failed to download clean image"
+                }
+            clean_image_bytes = image_response.content
         
         # Save to session directory
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -2111,7 +2802,7 @@ def process_image_with_gpt_image(image_url, session_id):
         image_path = os.path.join(session_dir, image_filename)
         
         with open(image_path, 'wb') as f:
-            f.write(image_response.content)
+            f.write(clean_image_bytes)
         
         logger.info(f"Clean image saved: {image_path}")
         
@@ -2139,34 +2830,11 @@ def convert_clean_image_to_svg(image_path, session_id):
         
         logger.info(f"Converting image to SVG: {image_path}")
         
-        # Use vtracer to convert PNG to SVG
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        svg_filename = f"meat_ratio_svg_{timestamp}_{uuid.uuid4().hex[:8]}.svg"
-        session_dir = os.path.join(UNIFIED_STORAGE_DIR, session_id)
-        svg_path = os.path.join(session_dir, svg_filename)
-        
-        # vtracer conversion
-        vtracer.convert_image_to_svg_py(
-            input_path=image_path,
-            output_path=svg_path,
-            colormode='color',
-            hierarchical='stacked',
-            mode='spline',
-            filter_speckle=4,
-            color_precision=6,
-            layer_difference=16,
-            corner_threshold=60,
-            length_threshold=4.0,
-            max_iterations=10,
-            splice_threshold=45,
-            path_precision=3
-        )
-        
-        if not os.path.exists(svg_path):
-            return {
-                "success": False,
-                "error": "SVG file was not created"
-            }
+        # Vectorize in memory; the SVG is persisted once, straight into the session
+        with open(image_path, 'rb') as f:
+            svg_code, _ = vtracer_tuning.image_to_svg(f.read())
+        _, svg_relative_path, _ = save_svg(svg_code, prefix="meat_ratio_svg", session_id=session_id)
+        svg_path = os.path.join(IMAGES_DIR, svg_relative_path)
         
         logger.info(f"SVG generated: {svg_path}")
         
@@ -2288,44 +2956,6 @@ def test_enhancement():
         logger.error(f"Error in test enhancement: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-# Add caching for OpenAI responses
-@lru_cache(maxsize=100)
-def get_cached_openai_response(prompt_hash, model, system_prompt_hash):
-    """Cache OpenAI responses to avoid repeated API calls for similar requests"""
-    return None
-
-def generate_prompt_hash(prompt):
-    """Generate a hash for prompt caching"""
-    return hashlib.md5(prompt.encode()).hexdigest()
-
-# Create a global session with connection pooling for OpenAI API calls
-def create_optimized_session():
-    """Create a requests session with connection pooling and retry strategy"""
-    session = requests.Session()
-    
-    # Configure retry strategy
-    retry_strategy = Retry(
-        total=2,  # Reduced retries for faster failure
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE", "POST"],
-        backoff_factor=0.3  # Reduced backoff for speed
-    )
-    
-    # Configure adapter with connection pooling
-    adapter = HTTPAdapter(
-        pool_connections=10,
-        pool_maxsize=20,
-        max_retries=retry_strategy
-    )
-    
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
-    return session
-
-# Global session for reuse
-openai_session = create_optimized_session()
-
 # Performance monitoring for OpenAI API calls
 api_performance_stats = {
     'total_calls': 0,
@@ -2362,18 +2992,7 @@ def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_t
     """Optimized OpenAI API call with connection pooling, caching, and reduced payload"""
     import time
     
-    # Generate cache keys
-    prompt_hash = generate_prompt_hash(user_prompt)
-    system_hash = generate_prompt_hash(system_prompt)
-    
     logger.info(f"Making OPTIMIZED OpenAI call: {model}, tokens: {max_tokens}, prompt_size: {len(user_prompt)}")
-    
-    url = OPENAI_CHAT_ENDPOINT
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY_SVG}",
-        "Connection": "keep-alive"  # Enable connection reuse
-    }
 
     # Reduce prompt sizes to speed up processing
     original_prompt_size = len(user_prompt)
@@ -2385,43 +3004,41 @@ def optimized_openai_call(system_prompt, user_prompt, model="gpt-4o-mini", max_t
         logger.info(f"Truncating system prompt from {len(system_prompt)} to 8000 chars for faster processing")
         system_prompt = system_prompt[:8000] + "..."
 
-    payload = {
-        "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user", 
-                "content": user_prompt
-            }
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-        "stream": False
-    }
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user", 
+            "content": user_prompt
+        }
+    ]
 
     start_time = time.time()
     try:
-        # Use the global session with connection pooling
-        response = openai_session.post(url, headers=headers, json=payload, timeout=80)
+        # Shared keep-alive connection pool in llm_client
+        result = llm_client.chat(
+            model,
+            messages,
+            api_key=OPENAI_API_KEY_SVG,
+            timeout=80,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
         api_response_time = time.time() - start_time
-        
-        # Log performance
-        log_api_performance(api_response_time, success=True)
-        
-        logger.info(f"✅ OPTIMIZED OpenAI API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
 
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+        if not result.ok:
+            logger.error(f"OpenAI API error: {result.status} - {result.error}")
             log_api_performance(api_response_time, success=False)
             return None
 
-        response_data = response.json()
-        ai_response = response_data["choices"][0]["message"]["content"]
+        # Log performance
+        log_api_performance(api_response_time, success=True)
+        
+        logger.info(f"✅ OPTIMIZED OpenAI API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
         
-        return ai_response.strip()
+        return result.content.strip()
             
     except Exception as e:
         api_response_time = time.time() - start_time
@@ -2435,6 +3052,24 @@ def get_performance_stats():
     """Get AI API performance statistics"""
     return jsonify({
         'ai_api_stats': api_performance_stats,
+        'speculative_image_stats': speculative_image.speculation_stats,
+        'response_cache_stats': response_cache.summary() if response_cache else None,
+        'rate_limits': rate_limiter.summary(),
+        'singleflight_stats': singleflight.summary(),
+        'hedging_stats': hedging.summary(),
+        'circuit_breakers': circuit_breaker.summary(),
+        'job_queue_stats': job_queue.summary(),
+        'admission': admission.summary(),
+        'fewshot_stats': fewshot.summary(),
+        'context_compression': context_compressor.summary(),
+        'design_brief': design_brief.summary(),
+        'vector_classifier': vector_classifier.summary(),
+        'text_layer': text_layer.summary() if PARALLEL_FEATURES_AVAILABLE else None,
+        'text_removal': text_removal.summary() if PARALLEL_FEATURES_AVAILABLE else None,
+        'background_plate': background_plate.summary() if PARALLEL_FEATURES_AVAILABLE else None,
+        'vectorize': vectorize.summary() if PARALLEL_FEATURES_AVAILABLE else None,
+        'vtracer_tuning': vtracer_tuning.summary() if PARALLEL_FEATURES_AVAILABLE else None,
+        'similar_prompt_stats': similar_prompts.similar_prompt_index.summary() if similar_prompts.similar_prompt_index else None,
         'optimization_status': 'ACTIVE - Using Google Gemini-2.5-flash via OpenRouter',
         'current_model': 'google/gemini-2.5-flash',
         'api_provider': 'OpenRouter',
@@ -2522,21 +3157,13 @@ if not OPENROUTER_API_KEY:
 else:
     logger.info("✅ OpenRouter API key found - Google Gemini-2.5-flash enabled for ultra-fast SVG processing!")
 
-# OpenRouter client for SVG operations
-openrouter_client = None
-if OPENROUTER_API_KEY:
-    from openai import OpenAI
-    openrouter_client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=OPENROUTER_API_KEY,
-    )
-
-def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2.5-flash", max_tokens=8000, temperature=0.3):
-    """Optimized OpenRouter API call using Google Gemini-2.5-flash"""
+def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2.5-flash", max_tokens=8000, temperature=0.3,
+                              stage=None, hedge_model="gpt-4o-mini", hedge_max_tokens=16000):
+    """Optimized OpenRouter API call using Google Gemini-2.5-flash, hedged to OpenAI when a stage is given"""
     import time
     
-    if not openrouter_client:
-        logger.error("OpenRouter client not initialized, falling back to OpenAI")
+    if not OPENROUTER_API_KEY:
+        logger.error("OpenRouter API key not set, falling back to OpenAI")
         return optimized_openai_call(system_prompt, user_prompt, "gpt-4o-mini", max_tokens, temperature)
     
     logger.info(f"Making OPTIMIZED OpenRouter call: {model}, tokens: {max_tokens}, prompt_size: {len(user_prompt)}")
@@ -2553,36 +3180,46 @@ def optimized_openrouter_call(system_prompt, user_prompt, model="google/gemini-2
 
     start_time = time.time()
     try:
-        completion = openrouter_client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "https://infoui.app",  # Your site URL
-                "X-Title": "InfoUI SVG Generator",     # Your site name
+        messages = [
+            {
+                "role": "system",
+                "content": system_prompt
             },
-            extra_body={},
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user", 
-                    "content": user_prompt
-                }
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+            {
+                "role": "user", 
+                "content": user_prompt
+            }
+        ]
+        # HTTP-Referer / X-Title headers are added by llm_client for OpenRouter
+        if stage:
+            # OpenRouter first unless STAGE_ROUTES says otherwise for this stage
+            routes = text_stage_routes(stage, hedge_model, OPENAI_API_KEY_SVG, openrouter_model=model,
+                                       default_order=['openrouter', 'openai'],
+                                       openai_params={'max_tokens': min(max_tokens, hedge_max_tokens)})
+            result = hedging.hedged_chat(stage, routes, messages, temperature=temperature, max_tokens=max_tokens)
+        else:
+            result = llm_client.chat(
+                model,
+                messages,
+                provider='openrouter',
+                api_key=OPENROUTER_API_KEY,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
         
         api_response_time = time.time() - start_time
+
+        if not result.ok:
+            logger.error(f"OpenRouter API error: {result.status} - {result.error}")
+            log_api_performance(api_response_time, success=False)
+            return None
         
         # Log performance
         log_api_performance(api_response_time, success=True)
         
         logger.info(f"✅ OPTIMIZED OpenRouter API response in {api_response_time:.2f}s (was {original_prompt_size} chars)")
 
-        ai_response = completion.choices[0].message.content
-        return ai_response.strip()
+        return result.content.strip()
             
     except Exception as e:
         api_response_time = time.time() - start_time
@@ -2634,7 +3271,8 @@ Return the combined SVG."""
         user_prompt=user_prompt,
         model="google/gemini-2.5-flash",  # Google Gemini model
         max_tokens=32000,                  # Reduced tokens
-        temperature=1                 # More deterministic
+        temperature=1,                # More deterministic
+        stage='ai_combine_svgs'
     )
     
     if ai_response:
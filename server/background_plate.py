@@ -0,0 +1,245 @@
+"""Local background-plate estimation for the parallel SVG pipeline.
+
+Poster backgrounds are nearly always a flat colour or a smooth gradient, so
+instead of describing the image to a vision model and regenerating the
+background with gpt-image-1, the plate is fitted directly. The image is
+sampled on a coarse grid, foreground (edges of text and elements, then
+robust outliers of each fit) is masked out, and candidate models are fitted
+by least squares in order of simplicity: solid colour, linear gradient,
+radial gradient, quadratic surface. The first whose inlier RMS is within
+BACKGROUND_PLATE_MAX_RMS wins. Gradients become an SVG <linearGradient> or
+<radialGradient> of a few hundred bytes; a quadratic surface, or a background
+no model fits, becomes a small inline PNG.
+
+Gradients use objectBoundingBox units, so a plate drops into any viewBox.
+"""
+import base64
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 'local' fits the plate here, 'remote' keeps the vision description plus gpt-image-1 regeneration
+BACKGROUND_PLATE_ENGINE = os.getenv('BACKGROUND_PLATE_ENGINE', 'local')
+BACKGROUND_PLATE_MAX_RMS = float(os.getenv('BACKGROUND_PLATE_MAX_RMS', '6'))
+# Side of the inline PNG used when no model fits
+BACKGROUND_PLATE_IMAGE_SIZE = int(os.getenv('BACKGROUND_PLATE_IMAGE_SIZE', '256'))
+
+GRID_SIZE = 96
+POLYNOMIAL_SIZE = 64
+PREVIEW_SIZE = 256
+# A model must explain at least this share of the samples to describe the background
+MIN_INLIER_FRACTION = 0.35
+# Floor on the outlier cut so JPEG-like noise on a flat plate is not rejected
+MIN_TOLERANCE = 12.0
+ROBUST_ITERATIONS = 3
+RADIAL_CENTERS = np.linspace(0.0, 1.0, 5)
+GRADIENT_ID = 'background-plate'
+
+_stats_lock = threading.Lock()
+stats = {'plates': 0, 'solid': 0, 'linear': 0, 'radial': 0, 'polynomial': 0, 'image': 0, 'layer_bytes': 0, 'total_s': 0.0}
+
+
+def _hex(rgb):
+    r, g, b = (int(c) for c in np.clip(np.rint(rgb), 0, 255))
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def _png(pixels):
+    buffer = BytesIO()
+    Image.fromarray(np.clip(np.rint(pixels), 0, 255).astype(np.uint8)).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _grid(size):
+    """Normalised (u, v) pixel-centre coordinates of a size x size grid"""
+    coords = (np.arange(size) + 0.5) / size
+    return np.meshgrid(coords, coords)
+
+
+def _edge_mask(pixels, size):
+    """Samples near strong edges, which belong to text and elements rather than the plate"""
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    magnitude = np.hypot(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+    edges = (magnitude > 60).astype(np.uint8)
+    edges = cv2.dilate(edges, np.ones((5, 5), np.uint8))
+    return cv2.resize(edges.astype(np.float32), (size, size), interpolation=cv2.INTER_AREA) > 0.05
+
+
+def _robust_fit(design, colors, usable):
+    """Least squares with iterative outlier rejection; returns (coefficients, rms, inliers)"""
+    inliers = usable.copy()
+    coefficients = None
+    for _ in range(ROBUST_ITERATIONS):
+        if inliers.sum() < design.shape[1] * 4:
+            return None, float('inf'), inliers
+        coefficients, _, _, _ = np.linalg.lstsq(design[inliers], colors[inliers], rcond=None)
+        residual = np.linalg.norm(design @ coefficients - colors, axis=1)
+        sigma = 1.4826 * float(np.median(residual[inliers]))
+        inliers = usable & (residual <= max(3.0 * sigma, MIN_TOLERANCE))
+    residual = np.linalg.norm(design @ coefficients - colors, axis=1)
+    rms = float(np.sqrt(np.mean(residual[inliers] ** 2))) / np.sqrt(3) if inliers.any() else float('inf')
+    return coefficients, rms, inliers
+
+
+def _linear_t(u, v, direction):
+    """Position along a linear gradient through the unit square, 0 at one corner and 1 at the other"""
+    dx, dy = direction
+    extent = abs(dx) + abs(dy)
+    return np.clip(((u - 0.5) * dx + (v - 0.5) * dy) / extent + 0.5, 0.0, 1.0)
+
+
+def _radial_t(u, v, center):
+    cx, cy = center
+    radius = max(np.hypot(cx - x, cy - y) for x in (0.0, 1.0) for y in (0.0, 1.0))
+    return np.clip(np.hypot(u - cx, v - cy) / radius, 0.0, 1.0), radius
+
+
+def _polynomial_design(u, v):
+    return np.column_stack([np.ones_like(u), u, v, u * u, u * v, v * v])
+
+
+def fit_models(pixels):
+    """Candidate fits in order of simplicity, each with its rms and what is needed to render it"""
+    u, v = (axis.ravel() for axis in _grid(GRID_SIZE))
+    small = cv2.resize(pixels, (GRID_SIZE, GRID_SIZE), interpolation=cv2.INTER_AREA).reshape(-1, 3).astype(np.float64)
+    usable = ~_edge_mask(pixels, GRID_SIZE).ravel()
+    if usable.mean() < MIN_INLIER_FRACTION:
+        # Busy everywhere: let the robust fit decide instead of the edge mask
+        usable = np.ones_like(usable)
+    ones = np.ones_like(u)
+
+    candidates = []
+    coefficients, rms, inliers = _robust_fit(ones[:, None], small, usable)
+    candidates.append({'kind': 'solid', 'rms': rms, 'inliers': inliers, 'color': coefficients[0] if coefficients is not None else None})
+
+    # Linear: the plane's dominant direction, then colour as a ramp along it
+    plane, _, plane_inliers = _robust_fit(np.column_stack([ones, u, v]), small, usable)
+    if plane is not None:
+        gu, gv = plane[1], plane[2]
+        structure = np.array([[gu @ gu, gu @ gv], [gu @ gv, gv @ gv]])
+        direction = np.linalg.eigh(structure)[1][:, -1]
+        if direction.sum() < 0:
+            direction = -direction
+        t = _linear_t(u, v, direction)
+        coefficients, rms, inliers = _robust_fit(np.column_stack([ones, t]), small, plane_inliers | usable)
+        if coefficients is not None:
+            candidates.append({'kind': 'linear', 'rms': rms, 'inliers': inliers, 'direction': direction,
+                               'stops': (coefficients[0], coefficients[0] + coefficients[1])})
+
+    best_radial = None
+    for cx in RADIAL_CENTERS:
+        for cy in RADIAL_CENTERS:
+            t, radius = _radial_t(u, v, (cx, cy))
+            coefficients, rms, inliers = _robust_fit(np.column_stack([ones, t]), small, usable)
+            if coefficients is not None and (best_radial is None or rms < best_radial['rms']):
+                best_radial = {'kind': 'radial', 'rms': rms, 'inliers': inliers, 'center': (cx, cy), 'radius': radius,
+                               'stops': (coefficients[0], coefficients[0] + coefficients[1])}
+    if best_radial:
+        candidates.append(best_radial)
+
+    coefficients, rms, inliers = _robust_fit(_polynomial_design(u, v), small, usable)
+    if coefficients is not None:
+        candidates.append({'kind': 'polynomial', 'rms': rms, 'inliers': inliers, 'coefficients': coefficients})
+    return candidates
+
+
+def render(model, size):
+    """The plate a model describes, as a size x size RGB array"""
+    u, v = _grid(size)
+    if model['kind'] == 'solid':
+        return np.broadcast_to(model['color'], (size, size, 3)).copy()
+    if model['kind'] in ('linear', 'radial'):
+        t = _linear_t(u, v, model['direction']) if model['kind'] == 'linear' else _radial_t(u, v, model['center'])[0]
+        start, end = (np.clip(stop, 0, 255) for stop in model['stops'])
+        return start + t[..., None] * (end - start)
+    return (_polynomial_design(u.ravel(), v.ravel()) @ model['coefficients']).reshape(size, size, 3)
+
+
+def svg_layer(model, image_png=None):
+    """Background-layer markup for a model; image_png is embedded for the image kinds"""
+    if model['kind'] == 'solid':
+        return f'<rect x="0" y="0" width="100%" height="100%" fill="{_hex(model["color"])}"/>'
+    if model['kind'] in ('linear', 'radial'):
+        start, end = (_hex(stop) for stop in model['stops'])
+        stops = f'<stop offset="0" stop-color="{start}"/><stop offset="1" stop-color="{end}"/>'
+        if model['kind'] == 'linear':
+            dx, dy = model['direction']
+            # direction is a unit vector, so this spans the same ramp as _linear_t:
+            # the gradient vector has length extent, corner to corner
+            extent = abs(dx) + abs(dy)
+            x1, y1 = 0.5 - dx * extent / 2, 0.5 - dy * extent / 2
+            x2, y2 = 0.5 + dx * extent / 2, 0.5 + dy * extent / 2
+            # Rounded before formatting so a tiny negative does not print as "-0.000"
+            x1, y1, x2, y2 = (round(value, 3) + 0.0 for value in (x1, y1, x2, y2))
+            gradient = (f'<linearGradient id="{GRADIENT_ID}" x1="{x1:.3f}" y1="{y1:.3f}" x2="{x2:.3f}" y2="{y2:.3f}">'
+                        f'{stops}</linearGradient>')
+        else:
+            cx, cy = model['center']
+            gradient = (f'<radialGradient id="{GRADIENT_ID}" cx="{cx:.3f}" cy="{cy:.3f}" r="{model["radius"]:.3f}">'
+                        f'{stops}</radialGradient>')
+        return (f'<defs>{gradient}</defs>'
+                f'<rect x="0" y="0" width="100%" height="100%" fill="url(#{GRADIENT_ID})"/>')
+    data = base64.b64encode(image_png).decode('utf-8')
+    return (f'<image x="0" y="0" width="100%" height="100%" preserveAspectRatio="none" '
+            f'href="data:image/png;base64,{data}"/>')
+
+
+def residual_plate(pixels, fallback, size=BACKGROUND_PLATE_IMAGE_SIZE):
+    """Downscaled background with foreground pixels replaced by the smooth fallback fit"""
+    small = cv2.resize(pixels, (size, size), interpolation=cv2.INTER_AREA).astype(np.float64)
+    smooth = render(fallback, size)
+    foreground = _edge_mask(pixels, size)
+    residual = np.linalg.norm(small - smooth, axis=2)
+    cut = max(3.0 * 1.4826 * float(np.median(residual[~foreground])) if (~foreground).any() else 0.0, MIN_TOLERANCE)
+    foreground |= residual > cut
+    small[foreground] = smooth[foreground]
+    return small
+
+
+def estimate_plate(image_data, max_rms=BACKGROUND_PLATE_MAX_RMS):
+    """Fit the background of a PNG; returns {'kind', 'layer', 'rms', 'inliers', 'preview_png'}"""
+    start = time.time()
+    pixels = np.asarray(Image.open(BytesIO(image_data)).convert('RGB'))
+    candidates = fit_models(pixels)
+    polynomial = next((c for c in candidates if c['kind'] == 'polynomial'), candidates[0])
+
+    chosen = next((c for c in candidates if c['rms'] <= max_rms and c['inliers'].mean() >= MIN_INLIER_FRACTION), None)
+    if chosen is None:
+        plate_pixels = residual_plate(pixels, polynomial)
+        chosen = {'kind': 'image', 'rms': polynomial['rms'], 'inliers': polynomial['inliers']}
+        image_png = _png(plate_pixels)
+        preview = plate_pixels
+    else:
+        image_png = _png(render(chosen, POLYNOMIAL_SIZE)) if chosen['kind'] == 'polynomial' else None
+        preview = render(chosen, PREVIEW_SIZE)
+
+    layer = svg_layer(chosen, image_png)
+    elapsed = time.time() - start
+    with _stats_lock:
+        stats['plates'] += 1
+        stats[chosen['kind']] += 1
+        stats['layer_bytes'] += len(layer)
+        stats['total_s'] += elapsed
+    logger.info(f"Background plate: {chosen['kind']} (rms {chosen['rms']:.1f}, {len(layer)} bytes) in {elapsed:.2f}s")
+    return {
+        'kind': chosen['kind'],
+        'layer': layer,
+        'rms': round(chosen['rms'], 2),
+        'inliers': round(float(chosen['inliers'].mean()), 3),
+        'preview_png': _png(cv2.resize(np.asarray(preview, dtype=np.float32), (PREVIEW_SIZE, PREVIEW_SIZE))),
+    }
+
+
+def summary():
+    with _stats_lock:
+        plates = stats['plates']
+        return dict(stats, total_s=round(stats['total_s'], 2), engine=BACKGROUND_PLATE_ENGINE,
+                    avg_layer_bytes=round(stats['layer_bytes'] / plates) if plates else None)
@@ -0,0 +1,55 @@
+"""Running a batch of prompts as independent pipeline runs on a shared slot pool.
+
+Identical prompts run once and share the result. Every other item runs its
+own pipeline; the only work different items share is stage calls whose
+inputs are byte-identical, which the pipeline already coalesces (singleflight)
+or serves from the response cache. Nothing merges separate calls into one
+provider request, so variants of a campaign with different wording pay for
+their own planning.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+
+def run_batch(prompts, run_one, slots, concurrency, progress=None):
+    """Run run_one(prompt) once per unique prompt; returns (items, unique_count, succeeded).
+
+    slots is a semaphore shared by every batch in the process; progress(name, data)
+    is called as each item finishes.
+    """
+    keys = [singleflight.request_key('batch', {'prompt': prompt}) for prompt in prompts]
+    unique = {}
+    for index, key in enumerate(keys):
+        unique.setdefault(key, index)
+
+    def run_item(index):
+        with slots:
+            item_start = time.time()
+            try:
+                item = {'status': 'succeeded', 'result': run_one(prompts[index])}
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {str(e)}")
+                item = {'status': 'failed', 'error': str(e), 'stage': getattr(e, 'stage', None)}
+        item['elapsed_s'] = round(time.time() - item_start, 2)
+        if progress:
+            progress(f'item_{index}', {'status': item['status'], 'elapsed_s': item['elapsed_s']})
+        return item
+
+    with ThreadPoolExecutor(max_workers=min(len(unique), concurrency)) as executor:
+        futures = {index: executor.submit(run_item, index) for index in unique.values()}
+        outcomes = {index: future.result() for index, future in futures.items()}
+
+    items = []
+    for index, (prompt, key) in enumerate(zip(prompts, keys)):
+        first = unique[key]
+        item = dict(outcomes[first], index=index, prompt=prompt)
+        if first != index:
+            item['duplicate_of'] = first
+        items.append(item)
+    succeeded = sum(1 for index in unique.values() if outcomes[index]['status'] == 'succeeded')
+    return items, len(unique), succeeded
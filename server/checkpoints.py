@@ -0,0 +1,107 @@
+"""Per-stage checkpoints stored in a pipeline's session folder.
+
+Each finished stage whose output is JSON-friendly (strings, numbers and
+tuples or lists of them) is written to <session>/checkpoints/<stage>.json as
+it completes. A retry with the same session id loads them back as graph
+inputs, so completed stages are skipped instead of paid for again.
+"""
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_ENABLED = os.getenv('CHECKPOINTS_ENABLED', 'true').lower() == 'true'
+CHECKPOINT_DIRNAME = 'checkpoints'
+# Request parameters a resumed run needs, stored next to the stage outputs
+MANIFEST_FILENAME = '_request.json'
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and bool(SESSION_ID_PATTERN.match(session_id))
+
+
+def _encodable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_encodable(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _encodable(item) for key, item in value.items())
+    return False
+
+
+def _write_json(path, data):
+    """Write via a temp file so a crash never leaves a truncated checkpoint"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class StageCheckpoints:
+    """Checkpoint files for one session folder"""
+
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        self.path = os.path.join(session_dir, CHECKPOINT_DIRNAME)
+
+    def exists(self):
+        return os.path.isfile(os.path.join(self.path, MANIFEST_FILENAME))
+
+    def save_request(self, params):
+        os.makedirs(self.path, exist_ok=True)
+        _write_json(os.path.join(self.path, MANIFEST_FILENAME), params)
+
+    def load_request(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILENAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage, value):
+        """Checkpoint a stage output; returns False for outputs that cannot be stored"""
+        if not _encodable(value):
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            _write_json(os.path.join(self.path, f"{stage}.json"), {
+                'value': value,
+                'tuple': isinstance(value, tuple),
+                'saved': time.time()
+            })
+        except OSError as e:
+            logger.warning(f"Could not checkpoint stage '{stage}': {str(e)}")
+            return False
+        return True
+
+    def load(self, exclude=()):
+        """Stage outputs saved so far, minus the excluded stages"""
+        outputs = {}
+        if not os.path.isdir(self.path):
+            return outputs
+        for filename in os.listdir(self.path):
+            stage, ext = os.path.splitext(filename)
+            if ext != '.json' or filename == MANIFEST_FILENAME or stage in exclude:
+                continue
+            try:
+                with open(os.path.join(self.path, filename)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Ignoring unreadable checkpoint {filename}")
+                continue
+            outputs[stage] = tuple(entry['value']) if entry.get('tuple') else entry['value']
+        return outputs
+
+    def discard(self, stages):
+        """Remove checkpoints so those stages run again"""
+        for stage in stages:
+            try:
+                os.remove(os.path.join(self.path, f"{stage}.json"))
+            except FileNotFoundError:
+                pass
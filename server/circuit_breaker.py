@@ -0,0 +1,138 @@
+"""Circuit breakers per provider and model.
+
+Every provider call reports its outcome here. When the recent error rate
+(timeouts, connection errors, 429s, 5xx and calls slower than
+CIRCUIT_SLOW_CALL_SECONDS) crosses the threshold, the breaker opens and calls
+to that provider/model fail immediately, so routed stages skip straight to
+their failover route. After CIRCUIT_OPEN_SECONDS the breaker lets a probe
+through (half-open); a successful probe closes it again.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', '20'))
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', '5'))
+CIRCUIT_ERROR_RATE = float(os.getenv('CIRCUIT_ERROR_RATE', '0.5'))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', '60'))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '1'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def is_failure(status, latency):
+    """Provider-health view of a call outcome; client errors are not the provider's fault"""
+    return status == 0 or status == 429 or status >= 500 or latency > CIRCUIT_SLOW_CALL_SECONDS
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a window of recent outcomes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=CIRCUIT_WINDOW)
+        self.opened_at = 0.0
+        self.probes = 0
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0, 'probes': 0}
+
+    def _refresh(self, now):
+        if self.state == OPEN and now - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+            self.state = HALF_OPEN
+            self.probes = 0
+            logger.info(f"Circuit {self.name} half-open, probing")
+
+    def available(self):
+        """Whether a call would currently be let through (does not reserve a probe)"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self.state == CLOSED or (self.state == HALF_OPEN and self.probes < CIRCUIT_HALF_OPEN_PROBES)
+
+    def allow(self):
+        """Admit a call, reserving a probe slot when half-open"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes < CIRCUIT_HALF_OPEN_PROBES:
+                self.probes += 1
+                self.stats['probes'] += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record(self, status, latency):
+        failed = is_failure(status, latency)
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(self.probes - 1, 0)
+                if failed:
+                    self._open(f"probe failed with status {status}")
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.info(f"Circuit {self.name} closed after a successful probe")
+                return
+            if self.state == OPEN:
+                return
+
+            self.outcomes.append(failed)
+            if len(self.outcomes) >= CIRCUIT_MIN_CALLS:
+                error_rate = sum(self.outcomes) / len(self.outcomes)
+                if error_rate >= CIRCUIT_ERROR_RATE:
+                    self._open(f"error rate {error_rate:.0%} over {len(self.outcomes)} calls")
+
+    def release(self):
+        """Give back a probe slot for a call that was cancelled before it finished"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(self.probes - 1, 0)
+
+    def _open(self, reason):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.stats['opened'] += 1
+        logger.warning(f"Circuit {self.name} opened: {reason}")
+
+    def summary(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            return dict(
+                self.stats,
+                state=self.state,
+                recent_calls=len(self.outcomes),
+                recent_error_rate=round(sum(self.outcomes) / len(self.outcomes), 3) if self.outcomes else 0.0
+            )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider, model):
+    name = f"{provider}:{model}"
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def available_routes(routes):
+    """Routes whose breakers currently admit calls, in their configured order"""
+    if not CIRCUIT_BREAKER_ENABLED:
+        return list(routes)
+    return [route for route in routes if get_breaker(route['provider'], route['model']).available()]
+
+
+def summary():
+    """State and recent error rate of every breaker"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.summary() for breaker in breakers}
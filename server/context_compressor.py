@@ -0,0 +1,198 @@
+"""Local extractive compression of long stage context.
+
+design_context carries the full design plan plus pages of design knowledge.
+Before a downstream stage sends it, the text is cut to that stage's token
+budget: repeated and near-duplicate sentences are dropped, the remaining ones
+are scored for relevance to the original request and for specificity (hex
+colours, sizes, font names, quoted copy) against generic best-practice advice,
+and the best are kept in their original order under their section headings.
+The same input always compresses to the same output, so cache keys stay stable.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_COMPRESSION_ENABLED = os.getenv('CONTEXT_COMPRESSION_ENABLED', 'true').lower() == 'true'
+# Token budgets per downstream stage, overridable with CONTEXT_BUDGETS='{"pre_enhance_prompt": 2000}'
+DEFAULT_BUDGETS = {
+    'pre_enhance_prompt': 1200,
+    'build_advanced_image_prompt': 125,
+    'enhance_prompt_for_gpt_image': 75,
+}
+CONTEXT_BUDGETS = dict(DEFAULT_BUDGETS, **json.loads(os.getenv('CONTEXT_BUDGETS', '{}')))
+CHARS_PER_TOKEN = 4
+# Sentences sharing this much of their vocabulary with a kept one are dropped
+NEAR_DUPLICATE_JACCARD = 0.8
+
+_WORD_RE = re.compile(r"[a-z0-9#']+")
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+_HEADING_RE = re.compile(r'^\s*(#{1,6}\s+.+|\*\*[^*]+\*\*:?|[A-Z][^.!?]{0,80}:)\s*$')
+_SPECIFIC_RE = re.compile(r"#[0-9a-fA-F]{3,8}\b|\b\d+(\.\d+)?\s*(px|pt|%|em|rem)?\b|\"[^\"]+\"|'[^']+'")
+_GENERIC_PHRASES = (
+    'best practice', 'make sure', 'ensure that', 'it is important', 'keep in mind', 'consider ',
+    'should always', 'always ensure', 'remember to', 'in general', 'generally', 'overall',
+    'user experience', 'visual hierarchy', 'consistency', 'accessibility', 'readability',
+)
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from in into is it its of on or the to with this that these those'
+    ' your you will can should use using'.split()
+)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _words(text):
+    return {word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def _split_sections(text):
+    """[(heading, [lines])] with a None heading for text before the first heading"""
+    sections = [(None, [])]
+    for line in text.split('\n'):
+        if _HEADING_RE.match(line):
+            sections.append((line.strip(), []))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, lines) for heading, lines in sections if heading or any(l.strip() for l in lines)]
+
+
+def _units(lines):
+    """(line, prefix, sentence) units, keeping list-item prefixes with their first sentence"""
+    units = []
+    for line_number, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        prefix_match = re.match(r'^([-*•]|\d+[.)])\s+', stripped)
+        prefix = prefix_match.group(0) if prefix_match else ''
+        for i, sentence in enumerate(_SENTENCE_SPLIT_RE.split(stripped[len(prefix):])):
+            if sentence.strip():
+                units.append((line_number, prefix if i == 0 else '', sentence.strip()))
+    return units
+
+
+def _score(sentence, words, query_words):
+    score = 2.0 * len(words & query_words)
+    score += 1.5 * len(_SPECIFIC_RE.findall(sentence))
+    # Capitalised words mid-sentence are mostly font, colour and brand names
+    score += 0.5 * len(re.findall(r'(?<=\s)[A-Z][a-z]+', sentence))
+    lowered = sentence.lower()
+    score -= 2.0 * sum(1 for phrase in _GENERIC_PHRASES if phrase in lowered)
+    # Favour information density over length
+    return score / (1 + len(sentence) / 200)
+
+
+class ContextCompressor:
+    """Budgeted sentence selection with per-stage savings counters"""
+
+    def __init__(self, budgets=None):
+        self.budgets = dict(budgets or CONTEXT_BUDGETS)
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def compress(self, text, stage, query=None, protect=()):
+        """Cut text to the stage's token budget; sections whose heading starts with a protect entry are kept whole"""
+        budget = self.budgets.get(stage)
+        tokens_in = estimate_tokens(text)
+        if not text or budget is None or tokens_in <= budget:
+            self._record(stage, tokens_in, tokens_in)
+            return text
+
+        sections = _split_sections(text)
+        protected = {i for i, (heading, _) in enumerate(sections)
+                     if heading and any(heading.startswith(name) for name in protect)}
+        if query is None:
+            query = ' '.join(' '.join(sections[i][1]) for i in sorted(protected))
+        query_words = _words(query or '')
+
+        candidates, seen = [], []
+        for index, (heading, lines) in enumerate(sections):
+            if index in protected:
+                continue
+            for line_number, prefix, sentence in _units(lines):
+                words = _words(sentence)
+                if not words or any(len(words & other) / len(words | other) >= NEAR_DUPLICATE_JACCARD for other in seen):
+                    continue
+                seen.append(words)
+                candidates.append({'score': _score(sentence, words, query_words), 'order': len(candidates),
+                                   'section': index, 'line': line_number, 'text': prefix + sentence})
+
+        # Greedy by score, then drop the weakest picks until the rendered text fits,
+        # since headings only cost once their section has a sentence
+        ranked = sorted(candidates, key=lambda c: (-c['score'], c['order']))
+        limit = budget * CHARS_PER_TOKEN
+        kept, used = [], len(self._render(sections, protected, []))
+        for candidate in ranked:
+            if used + len(candidate['text']) + 1 <= limit:
+                kept.append(candidate)
+                used += len(candidate['text']) + 1
+        compressed = self._render(sections, protected, kept)
+        while kept and len(compressed) > limit:
+            kept.pop()
+            compressed = self._render(sections, protected, kept)
+
+        tokens_out = estimate_tokens(compressed)
+        self._record(stage, tokens_in, tokens_out)
+        logger.info(f"Compressed context for {stage}: {tokens_in} -> {tokens_out} tokens")
+        return compressed
+
+    @staticmethod
+    def _render(sections, protected, kept):
+        """Protected sections whole, kept sentences in original order under their headings"""
+        by_section = {}
+        for candidate in sorted(kept, key=lambda c: c['order']):
+            lines = by_section.setdefault(candidate['section'], [])
+            if lines and lines[-1][0] == candidate['line']:
+                lines[-1] = (candidate['line'], f"{lines[-1][1]} {candidate['text']}")
+            else:
+                lines.append((candidate['line'], candidate['text']))
+
+        parts, pending_headings = [], []
+        for index, (heading, lines) in enumerate(sections):
+            if index in protected:
+                parts.append('\n'.join([heading] + lines).strip())
+                pending_headings = []
+            elif index in by_section:
+                parts.append('\n'.join(pending_headings + ([heading] if heading else [])
+                                       + [text for _, text in by_section[index]]))
+                pending_headings = []
+            elif heading and not any(line.strip() for line in lines):
+                # A heading with only sub-sections under it, e.g. "Design Plan:" above "## Layout"
+                pending_headings.append(heading)
+        return '\n\n'.join(parts)
+
+    def _record(self, stage, tokens_in, tokens_out):
+        with self._lock:
+            stats = self.stats.setdefault(stage, {'calls': 0, 'compressed': 0, 'tokens_in': 0, 'tokens_out': 0})
+            stats['calls'] += 1
+            stats['compressed'] += tokens_out < tokens_in
+            stats['tokens_in'] += tokens_in
+            stats['tokens_out'] += tokens_out
+
+    def summary(self):
+        """Per-stage token counts before and after compression"""
+        with self._lock:
+            return {
+                stage: dict(stats, budget=self.budgets.get(stage), tokens_saved=stats['tokens_in'] - stats['tokens_out'])
+                for stage, stats in self.stats.items()
+            }
+
+
+context_compressor = ContextCompressor()
+
+
+def compress(text, stage, query=None, protect=()):
+    """context_compressor.compress(), or text unchanged when compression is off"""
+    if not CONTEXT_COMPRESSION_ENABLED:
+        return text
+    return context_compressor.compress(text, stage, query, protect)
+
+
+def summary():
+    return context_compressor.summary() if CONTEXT_COMPRESSION_ENABLED else {'enabled': False}
@@ -0,0 +1,192 @@
+"""Single structured-output "design brief" replacing the four planning stages.
+
+The staged pipeline makes four dependent chat calls (plan, design knowledge,
+pre-enhancement, SVG enhancement) that each restate the same context. In brief
+mode one JSON-schema-constrained call returns all of it: plan, typography,
+palette, image prompt and SVG spec. The reply is validated locally and only the
+fields that fail are asked for again, so a single weak field never costs a
+full second brief.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MODES = ('staged', 'brief')
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'staged')
+DESIGN_BRIEF_MAX_REASKS = int(os.getenv('DESIGN_BRIEF_MAX_REASKS', '2'))
+
+_HEX_RE = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+# Minimum lengths keep one-line placeholders from passing as a plan or prompt
+FIELD_MIN_CHARS = {
+    'design_plan': 200,
+    'typography': 60,
+    'image_prompt': 200,
+    'svg_spec': 200,
+}
+PALETTE_MIN_COLORS = 3
+
+FIELD_SCHEMAS = {
+    'design_plan': {
+        'type': 'string',
+        'description': 'Layout structure, visual hierarchy, content elements and their placement'
+    },
+    'typography': {
+        'type': 'string',
+        'description': 'Font families (Google Fonts preferred), sizes, weights and alignment per text element'
+    },
+    'palette': {
+        'type': 'array',
+        'description': 'Background, text and accent colours',
+        'items': {
+            'type': 'object',
+            'properties': {
+                'role': {'type': 'string'},
+                'hex': {'type': 'string', 'description': 'Six-digit hex code such as #1A2B3C'}
+            },
+            'required': ['role', 'hex'],
+            'additionalProperties': False
+        }
+    },
+    'image_prompt': {
+        'type': 'string',
+        'description': 'Detailed prompt for the image model: exact copy, layout, fonts, colours and decoration'
+    },
+    'svg_spec': {
+        'type': 'string',
+        'description': 'SVG technical specification: viewBox, element structure, coordinates, fills and text styling'
+    },
+}
+BRIEF_FIELDS = tuple(FIELD_SCHEMAS)
+
+SYSTEM_PROMPT = """You are a senior graphic designer writing a complete design brief in one pass.
+
+For the user's request return:
+- design_plan: layout structure, composition, visual hierarchy, content elements and their placement, dimensions
+- typography: specific fonts (Google Fonts preferred), sizes and weights for each text element, alignment and spacing
+- palette: background, text and accent colours with six-digit hex codes and readable contrast
+- image_prompt: a detailed, self-contained prompt for an image model that states the exact text to render, layout, fonts, colours, containers and decorative elements
+- svg_spec: an SVG specification with viewBox, element hierarchy, coordinates, fills, gradients and text styling
+
+Keep every field specific and implementable, quote all copy exactly, and keep the fields consistent with each other."""
+
+_stats_lock = threading.Lock()
+stats = {'briefs': 0, 'reasks': 0, 'fields_reasked': 0, 'failures': 0}
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        stats[key] += amount
+
+
+def resolve_mode(requested=None):
+    """Return the pipeline mode for a request, falling back to the configured default"""
+    mode = requested if requested is not None else PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode '{mode}', expected one of {PIPELINE_MODES}")
+    return mode
+
+
+def response_format(fields=BRIEF_FIELDS):
+    """Strict JSON-schema response_format covering only the given fields"""
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': 'design_brief',
+            'strict': True,
+            'schema': {
+                'type': 'object',
+                'properties': {name: FIELD_SCHEMAS[name] for name in fields},
+                'required': list(fields),
+                'additionalProperties': False
+            }
+        }
+    }
+
+
+def validate(brief):
+    """{field: reason} for every field of brief that is missing or unusable"""
+    problems = {}
+    for name, min_chars in FIELD_MIN_CHARS.items():
+        value = brief.get(name)
+        if not isinstance(value, str) or not value.strip():
+            problems[name] = 'missing'
+        elif len(value.strip()) < min_chars:
+            problems[name] = f'too short, needs at least {min_chars} characters'
+
+    palette = brief.get('palette')
+    if not isinstance(palette, list) or not palette:
+        problems['palette'] = 'missing'
+    else:
+        bad = [entry for entry in palette
+               if not isinstance(entry, dict) or not _HEX_RE.match(str(entry.get('hex', '')))]
+        if bad:
+            problems['palette'] = 'every colour needs a role and a six-digit hex code like #1A2B3C'
+        elif len(palette) < PALETTE_MIN_COLORS:
+            problems['palette'] = f'needs at least {PALETTE_MIN_COLORS} colours'
+    return problems
+
+
+def _parse(content):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def request_brief(user_input, chat, max_reasks=DESIGN_BRIEF_MAX_REASKS):
+    """Ask for a full brief, then re-ask only for the fields that fail validation.
+
+    chat(messages, response_format) returns an llm_client.ChatResult. Raises
+    ValueError when fields are still invalid after max_reasks follow-ups.
+    """
+    messages = [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': user_input}
+    ]
+    _count('briefs')
+    result = chat(messages, response_format())
+    if not result.ok:
+        _count('failures')
+        raise Exception(f"Design brief error: {result.error}")
+    brief = _parse(result.content)
+    problems = validate(brief)
+
+    for _ in range(max_reasks):
+        if not problems:
+            break
+        fields = [name for name in BRIEF_FIELDS if name in problems]
+        logger.info(f"Design brief re-asking for {fields}: {problems}")
+        _count('reasks')
+        _count('fields_reasked', len(fields))
+        followup = messages + [
+            {'role': 'assistant', 'content': json.dumps(brief)},
+            {'role': 'user', 'content': "Some fields of the brief are not usable:\n"
+                + "\n".join(f"- {name}: {problems[name]}" for name in fields)
+                + "\nReturn only these fields, rewritten to fix the problems and consistent with the rest of the brief."}
+        ]
+        result = chat(followup, response_format(fields))
+        if result.ok:
+            brief.update({name: value for name, value in _parse(result.content).items() if name in fields})
+        problems = validate(brief)
+
+    if problems:
+        _count('failures')
+        raise ValueError(f"Design brief invalid after {max_reasks} re-asks: {problems}")
+    return brief
+
+
+def design_knowledge(design_brief):
+    """Typography and palette in the text form the staged design_knowledge stage produces"""
+    colors = "\n".join(f"- {entry['role']}: {entry['hex']}" for entry in design_brief['palette'])
+    return f"Typography:\n{design_brief['typography']}\n\nColor Palette:\n{colors}"
+
+
+def summary():
+    with _stats_lock:
+        return dict(stats, default_mode=PIPELINE_MODE)
@@ -0,0 +1,127 @@
+"""Retrieval of few-shot design examples for the enhancer prompts.
+
+Examples live in a JSONL corpus (one {"id", "category", "text"} object per
+line, with an optional one-line "summary") indexed with BM25, so each enhancer call carries only the few examples
+closest to the request instead of the whole library. Adding examples to the
+corpus grows the library without growing every prompt.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+FEWSHOT_ENABLED = os.getenv('FEWSHOT_ENABLED', 'true').lower() == 'true'
+FEWSHOT_CORPUS_PATH = os.getenv(
+    'FEWSHOT_CORPUS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'design_examples.jsonl')
+)
+FEWSHOT_TOP_K = int(os.getenv('FEWSHOT_TOP_K', '2'))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from in into is it its of on or the to with this that'.split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class ExampleIndex:
+    """BM25 index over example texts and their categories"""
+
+    def __init__(self, examples):
+        self.examples = examples
+        self.doc_terms = [Counter(tokenize(f"{ex['category'].replace('_', ' ')} {ex['text']}")) for ex in examples]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if examples else 0.0
+        doc_freq = Counter(term for terms in self.doc_terms for term in terms)
+        total = len(examples)
+        self.idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'examples_selected': 0, 'chars_selected': 0, 'chars_skipped': 0}
+
+    @classmethod
+    def load(cls, path):
+        examples = []
+        try:
+            with open(path) as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        example = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping malformed example on line {line_number} of {path}")
+                        continue
+                    if example.get('text'):
+                        example.setdefault('category', 'general')
+                        examples.append(example)
+        except OSError as e:
+            logger.warning(f"Few-shot corpus not loaded from {path}: {str(e)}")
+        logger.info(f"Loaded {len(examples)} few-shot examples from {path}")
+        return cls(examples)
+
+    def score(self, query_terms, index):
+        terms, length = self.doc_terms[index], self.doc_lengths[index]
+        score = 0.0
+        for term in query_terms:
+            tf = terms.get(term)
+            if tf:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+                score += self.idf[term] * tf * (BM25_K1 + 1) / norm
+        return score
+
+    def search(self, query, k=FEWSHOT_TOP_K, category=None):
+        """Top-k examples for query, optionally restricted to one category.
+
+        Examples sharing no terms with the query are never returned, so an
+        off-topic request gets no examples rather than the first k in the corpus.
+        """
+        candidates = [i for i, ex in enumerate(self.examples) if category is None or ex['category'] == category]
+        if not FEWSHOT_ENABLED:
+            # Retrieval off: every example goes in, as with a static prompt
+            return [self.examples[i] for i in candidates]
+        query_terms = set(tokenize(query))
+        scores = {i: self.score(query_terms, i) for i in candidates}
+        ranked = sorted((i for i in candidates if scores[i] > 0), key=lambda i: scores[i], reverse=True)
+        selected = [self.examples[i] for i in ranked[:k]]
+
+        selected_chars = sum(len(ex['text']) for ex in selected)
+        with self._lock:
+            self.stats['queries'] += 1
+            self.stats['examples_selected'] += len(selected)
+            self.stats['chars_selected'] += selected_chars
+            self.stats['chars_skipped'] += sum(len(self.examples[i]['text']) for i in candidates) - selected_chars
+        return selected
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, corpus_size=len(self.examples),
+                        approx_tokens_saved=self.stats['chars_skipped'] // 4)
+
+
+example_index = ExampleIndex.load(FEWSHOT_CORPUS_PATH)
+
+
+def select_examples(query, k=FEWSHOT_TOP_K, category=None):
+    """Most relevant examples for a request; all of them when retrieval is off"""
+    return example_index.search(query, k, category)
+
+
+def format_examples(examples, field='text'):
+    """Render examples as a bullet list; field='summary' uses the one-line form where an example has one"""
+    separator = "\n" if field == 'summary' else "\n\n"
+    return separator.join(f"- {example.get(field) or example['text']}" for example in examples)
+
+
+def summary():
+    return dict(example_index.summary(), enabled=FEWSHOT_ENABLED)
@@ -0,0 +1,222 @@
+"""Hedged chat completions across providers for tail-latency control.
+
+A hedged call goes to the stage's primary route first. If it has not answered
+within a delay derived from that route's recent p90 latency, a duplicate goes
+to the secondary route (another provider or model). The first successful
+answer wins and the other request is cancelled. Each stage has its own hedge
+budget, a fraction of its calls, so a provider-wide slowdown cannot double
+the traffic.
+
+Routes come from STAGE_ROUTES per stage. Routes whose circuit breaker is
+open are skipped, and a primary that fails with a timeout, connection error,
+429 or 5xx fails over to the next route.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import circuit_breaker
+import llm_client
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'true').lower() == 'true'
+# Fraction of a stage's calls that may be hedged, overridable per stage with
+# HEDGE_BUDGETS='{"ai_combine_svgs": 0.25}'
+HEDGE_BUDGET_RATIO = float(os.getenv('HEDGE_BUDGET_RATIO', '0.1'))
+HEDGE_BUDGETS = json.loads(os.getenv('HEDGE_BUDGETS', '{}'))
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.9'))
+# Delay used until a stage has enough latency samples, and the floor after that
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '20'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '2'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_WINDOW = int(os.getenv('HEDGE_WINDOW', '200'))
+# Unused budget accumulates up to this many hedges
+HEDGE_MAX_BURST = float(os.getenv('HEDGE_MAX_BURST', '3'))
+# Ordered providers per stage, e.g. STAGE_ROUTES='{"design_brief": ["openrouter", "openai"],
+# "ocr_region": ["openai:gpt-4o"]}'; "provider:model" pins a model for that route
+STAGE_ROUTES = json.loads(os.getenv('STAGE_ROUTES', '{}'))
+DEFAULT_STAGE_ROUTE = [entry.strip() for entry in os.getenv('DEFAULT_STAGE_ROUTE', 'openai,openrouter').split(',') if entry.strip()]
+
+
+class StageHedging:
+    """Latency window and hedge budget for one stage"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.ratio = float(HEDGE_BUDGETS.get(stage, HEDGE_BUDGET_RATIO))
+        self.latencies = deque(maxlen=HEDGE_WINDOW)
+        # Start with one hedge available so early stragglers can be cut
+        self.credit = 1.0
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'budget_denied': 0, 'failovers': 0}
+
+    def record(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def delay(self):
+        """Seconds to wait on the primary before hedging"""
+        with self._lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_DELAY
+            ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_DELAY, ordered[int(HEDGE_PERCENTILE * (len(ordered) - 1))])
+
+    def start_call(self):
+        with self._lock:
+            self.stats['calls'] += 1
+            self.credit = min(HEDGE_MAX_BURST, self.credit + self.ratio)
+
+    def spend(self):
+        """Take one hedge from the budget; False if none is left"""
+        with self._lock:
+            if self.credit >= 1.0:
+                self.credit -= 1.0
+                self.stats['hedged'] += 1
+                return True
+            self.stats['budget_denied'] += 1
+            return False
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def summary(self):
+        delay = self.delay()
+        with self._lock:
+            return dict(self.stats, budget_ratio=self.ratio, hedge_delay_s=round(delay, 2),
+                        samples=len(self.latencies))
+
+
+_stages = {}
+_stages_lock = threading.Lock()
+
+
+def stage_hedging(stage):
+    with _stages_lock:
+        if stage not in _stages:
+            _stages[stage] = StageHedging(stage)
+        return _stages[stage]
+
+
+def stage_route_order(stage, default=None):
+    """(provider, pinned model or None) pairs a stage tries, in order.
+
+    default is the caller's own order for the stage, used when STAGE_ROUTES
+    does not configure it, before DEFAULT_STAGE_ROUTE.
+    """
+    entries = STAGE_ROUTES.get(stage) or default or DEFAULT_STAGE_ROUTE
+    return [tuple(entry.split(':', 1)) if ':' in entry else (entry, None) for entry in entries]
+
+
+def should_fail_over(result):
+    """Whether a failed result is worth retrying elsewhere: timeouts, connection errors, 429 and 5xx.
+
+    A 4xx client error would fail the same way on every route.
+    """
+    return not result.ok and circuit_breaker.is_failure(result.status, 0)
+
+
+def measured(result):
+    """Whether result's latency says something about the provider.
+
+    Circuit-open and rate-limit rejections are decided locally in no time, and
+    a dropped connection never reached the model; only answers from upstream,
+    successful or not, carry response headers.
+    """
+    return result.ok or bool(result.headers)
+
+
+def route(provider, model, api_key=None, **overrides):
+    """A provider/model pair a hedged call can use; overrides replace call params"""
+    return {'provider': provider, 'model': model, 'api_key': api_key, 'params': overrides}
+
+
+def _start(chosen, messages, timeout, params):
+    return asyncio.ensure_future(llm_client.achat(
+        chosen['model'], messages, provider=chosen['provider'], api_key=chosen['api_key'],
+        timeout=timeout, **dict(params, **chosen['params'])))
+
+
+def _name(chosen):
+    return f"{chosen['provider']}:{chosen['model']}"
+
+
+async def ahedged_chat(stage, routes, messages, timeout=None, **params):
+    """Chat completion on the first available route, hedged to the next past the stage's p90 latency"""
+    hedging = stage_hedging(stage)
+    hedging.start_call()
+    available = circuit_breaker.available_routes(routes)
+    if available and available[0] is not routes[0]:
+        logger.warning(f"[{stage}] circuit open for {_name(routes[0])}, routing to {_name(available[0])}")
+        hedging.count('failovers')
+    # With every breaker open the call fails fast on the primary
+    routes = available or routes[:1]
+
+    primary_route = routes[0]
+    start = time.monotonic()
+    primary = _start(primary_route, messages, timeout, params)
+    tasks = {primary}
+    try:
+        if HEDGE_ENABLED and len(routes) > 1:
+            delay = hedging.delay()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            hedge = not done and hedging.spend()
+        else:
+            hedge = False
+
+        if not hedge:
+            result = await primary
+            if measured(result):
+                hedging.record(time.monotonic() - start)
+            if len(routes) < 2 or not should_fail_over(result):
+                return result
+            logger.warning(f"[{stage}] {_name(primary_route)} failed ({result.error}), failing over to {_name(routes[1])}")
+            hedging.count('failovers')
+            secondary = _start(routes[1], messages, timeout, params)
+            tasks.add(secondary)
+            return await secondary
+
+        secondary_route = routes[1]
+        logger.info(f"[{stage}] {_name(primary_route)} silent after {delay:.1f}s, hedging to {_name(secondary_route)}")
+        secondary = _start(secondary_route, messages, timeout, params)
+        tasks.add(secondary)
+
+        pending, result = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if task is primary and measured(result):
+                    hedging.record(time.monotonic() - start)
+                if result.ok:
+                    if task is secondary:
+                        hedging.count('hedge_wins')
+                    logger.info(f"[{stage}] {'hedge' if task is secondary else 'primary'} won after "
+                                f"{time.monotonic() - start:.2f}s")
+                    return result
+        return result
+    finally:
+        for task in tasks:
+            if not task.done():
+                if task is primary:
+                    # The primary's latency is at least this long; keeps p90 honest
+                    hedging.record(time.monotonic() - start)
+                task.cancel()
+
+
+def hedged_chat(stage, routes, messages, timeout=None, **params):
+    """Blocking wrapper around ahedged_chat()"""
+    return llm_client.run(ahedged_chat(stage, routes, messages, timeout=timeout, **params))
+
+
+def summary():
+    """Per-stage hedge counts, budgets and current delays"""
+    with _stages_lock:
+        stages = list(_stages.values())
+    return {hedging.stage: hedging.summary() for hedging in stages}
@@ -17,10 +17,7 @@ import pytesseract
 import os
 import uuid
 from datetime import datetime
-from openai import OpenAI
-
-# GPT client for text extraction
-chat_client = OpenAI()
+import llm_client
 
 @app.route('/api/generate-text-svg', methods=['POST'])
 def generate_image_text_svg():
@@ -99,12 +96,10 @@ def generate_image_text_svg():
             "Return only the complete SVG code."
         )}
     ]
-    response = chat_client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=messages,
-        temperature=1
-    )
-    svg_code = response.choices[0].message.content.strip()
+    result = llm_client.chat("gpt-4.1-mini", messages, api_key=os.getenv('OPENAI_API_KEY'), temperature=1)
+    if not result.ok:
+        return jsonify({'error': f"Text SVG generation failed: {result.error}", 'stage': 7}), 502
+    svg_code = result.content.strip()
     # Save and return
     svg_filename = save_svg(svg_code, prefix='text_svg')
     return jsonify({
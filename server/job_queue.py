@@ -0,0 +1,227 @@
+"""Durable job queue and worker pool for long-running pipelines.
+
+Jobs are rows in an SQLite database under the local cache directory, so HTTP
+workers only enqueue and poll while a separate pool of pipeline threads does
+the work. A running job holds a lease that its worker keeps renewing; when a
+process dies its leases expire and the jobs go back to the queue, which is how
+jobs resume after a restart. Several processes may share one database.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from response_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(CACHE_DIR, 'jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# A running job whose lease is not renewed within this window is requeued
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+# Finished jobs are deleted after this long
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+
+class JobQueue:
+    """SQLite-backed queue of pipeline jobs with leased execution"""
+
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.path = path
+        self.handlers = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._running = set()
+        self._workers = []
+        self.stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'requeued': 0}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL,"
+            " progress TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " owner TEXT, lease_expires REAL, created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._db.commit()
+
+    def register(self, kind, handler):
+        """handler(params, progress) runs a job; progress(stage, payload) records a finished stage"""
+        self.handlers[kind] = handler
+
+    def submit(self, kind, params):
+        """Enqueue a job and return its id"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), QUEUED, time.time())
+            )
+            self._db.commit()
+            self.stats['submitted'] += 1
+        with self._wakeup:
+            self._wakeup.notify()
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def get(self, job_id):
+        """Status, per-stage progress and result of a job, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, progress, result, error, attempts, created, started, finished"
+                " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            position = None
+            if row and row[2] == QUEUED:
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?", (QUEUED, row[7])
+                ).fetchone()[0]
+        if row is None:
+            return None
+        job_id, kind, status, progress, result, error, attempts, created, started, finished = row
+        return {
+            'job_id': job_id,
+            'kind': kind,
+            'status': status,
+            'queue_position': position,
+            'progress': json.loads(progress),
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'attempts': attempts,
+            'created': created,
+            'started': started,
+            'finished': finished
+        }
+
+    def start(self, workers=JOB_WORKERS):
+        """Start the worker threads and the lease keeper; safe to call more than once"""
+        if self._workers or workers <= 0:
+            return
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._workers.append(thread)
+        threading.Thread(target=self._keep_leases, name='job-leases', daemon=True).start()
+        logger.info(f"Job queue started with {workers} workers at {self.path}")
+
+    def _claim(self):
+        """Requeue expired leases, then take the oldest queued job"""
+        now = time.time()
+        with self._lock:
+            expired = self._db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND lease_expires < ? AND attempts < ?",
+                (QUEUED, RUNNING, now, JOB_MAX_ATTEMPTS)
+            ).rowcount
+            abandoned = self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status = ? AND lease_expires < ?",
+                (FAILED, 'Worker lost too many times', now, RUNNING, now)
+            ).rowcount
+            if expired > 0:
+                self.stats['requeued'] += expired
+                logger.warning(f"Requeued {expired} jobs with expired leases")
+            if abandoned > 0:
+                self.stats['failed'] += abandoned
+
+            row = self._db.execute(
+                "SELECT id, kind, params FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                    " started = ? WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, now + JOB_LEASE_SECONDS, now, row[0], QUEUED)
+                ).rowcount
+                if not claimed:
+                    row = None
+            self._db.commit()
+        if row is not None:
+            self._running.add(row[0])
+        return row
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Job queue error: {str(e)}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(JOB_POLL_SECONDS)
+                continue
+            self._run(*job)
+
+    def _run(self, job_id, kind, params):
+        logger.info(f"Running {kind} job {job_id}")
+        try:
+            result = self.handlers[kind](json.loads(params), lambda stage, payload: self._progress(job_id, stage, payload))
+            self._finish(job_id, SUCCEEDED, result=json.dumps(result, default=str))
+        except Exception as e:
+            logger.error(f"{kind} job {job_id} failed: {str(e)}")
+            self._finish(job_id, FAILED, error=str(e))
+
+    def _progress(self, job_id, stage, payload):
+        with self._lock:
+            row = self._db.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            progress = json.loads(row[0]) if row else {}
+            progress[stage] = dict(payload, completed_at=time.time())
+            self._db.execute(
+                "UPDATE jobs SET progress = ?, lease_expires = ? WHERE id = ? AND owner = ?",
+                (json.dumps(progress, default=str), time.time() + JOB_LEASE_SECONDS, job_id, self.owner)
+            )
+            self._db.commit()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self._running.discard(job_id)
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease_expires = NULL"
+                " WHERE id = ? AND owner = ?",
+                (status, result, error, time.time(), job_id, self.owner)
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?",
+                (SUCCEEDED, FAILED, time.time() - JOB_RETENTION_SECONDS)
+            )
+            self._db.commit()
+            self.stats[status] += 1
+
+    def _keep_leases(self):
+        """Renew leases of this process's running jobs so long stages are not requeued"""
+        while True:
+            time.sleep(JOB_LEASE_SECONDS / 3)
+            running = list(self._running)
+            if not running:
+                continue
+            try:
+                with self._lock:
+                    self._db.executemany(
+                        "UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                        [(time.time() + JOB_LEASE_SECONDS, job_id, self.owner, RUNNING) for job_id in running]
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to renew job leases: {str(e)}")
+
+    def summary(self):
+        """Job counts by status plus this process's counters"""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return dict(self.stats, workers=len(self._workers), running_here=len(self._running),
+                    **{f'{status}_jobs': counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)})
+
+
+job_queue = JobQueue()
@@ -0,0 +1,510 @@
+"""Shared asyncio client for the OpenAI and OpenRouter APIs.
+
+All provider traffic (chat, vision and image endpoints) goes through one
+event loop running on a background thread, with a keep-alive connection pool
+per provider and a deadline on every call. Coroutines can be awaited on that
+loop, scheduled with submit(), or called through the blocking wrappers from
+Flask request threads.
+"""
+import asyncio
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+import aiohttp
+
+import circuit_breaker
+import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    'openai': {
+        'base_url': os.getenv('OPENAI_API_BASE_URL', 'https://api.openai.com/v1'),
+        'api_key_env': ('OPENAI_API_KEY_SVG', 'OPENAI_API_KEY'),
+        'headers': {}
+    },
+    'openrouter': {
+        'base_url': os.getenv('OPENROUTER_API_BASE_URL', 'https://openrouter.ai/api/v1'),
+        'api_key_env': ('OPENROUTER_API_KEY',),
+        'headers': {
+            'HTTP-Referer': 'https://infoui.app',
+            'X-Title': 'InfoUI SVG Generator'
+        }
+    }
+}
+
+# Per-call deadlines in seconds, overridable per call
+LLM_CHAT_TIMEOUT = float(os.getenv('LLM_CHAT_TIMEOUT', '120'))
+LLM_IMAGE_TIMEOUT = float(os.getenv('LLM_IMAGE_TIMEOUT', '180'))
+
+# Connection pool sizing, shared by every request in the process
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '100'))
+LLM_POOL_SIZE_PER_HOST = int(os.getenv('LLM_POOL_SIZE_PER_HOST', '50'))
+LLM_KEEPALIVE_TIMEOUT = float(os.getenv('LLM_KEEPALIVE_TIMEOUT', '60'))
+
+
+@dataclass
+class ChatResult:
+    """Outcome of a chat or vision completion"""
+    provider: str
+    model: str
+    status: int
+    content: str = None
+    data: dict = None
+    error: str = None
+    latency: float = 0.0
+    usage: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+    cached: bool = False
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.content is not None
+
+    @property
+    def truncated(self):
+        """Whether the reply was cut off at max_tokens"""
+        try:
+            return self.data['choices'][0].get('finish_reason') == 'length'
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return False
+
+
+@dataclass
+class ImageResult:
+    """Outcome of an image generation or edit"""
+    provider: str
+    model: str
+    status: int
+    b64_json: str = None
+    url: str = None
+    data: dict = None
+    error: str = None
+    latency: float = 0.0
+    headers: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return self.status == 200 and (self.b64_json is not None or self.url is not None)
+
+    @property
+    def image_bytes(self):
+        return base64.b64decode(self.b64_json) if self.b64_json else None
+
+
+@dataclass
+class _RawResponse:
+    status: int
+    data: dict = None
+    error: str = None
+    latency: float = 0.0
+    headers: dict = field(default_factory=dict)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_sessions = {}
+
+
+def get_loop():
+    """Return the client event loop, starting its thread on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name='llm-client', daemon=True)
+            thread.start()
+            logger.info("LLM client event loop started")
+    return _loop
+
+
+def submit(coro):
+    """Schedule a coroutine on the client loop and return a concurrent Future.
+
+    Cancelling the returned future cancels the in-flight request.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro):
+    """Run a coroutine on the client loop and block until it finishes"""
+    return submit(coro).result()
+
+
+def default_api_key(provider):
+    """Look up the API key for a provider from the environment"""
+    for name in PROVIDERS[provider]['api_key_env']:
+        value = os.getenv(name)
+        if value:
+            return value
+    return None
+
+
+async def _get_session(provider):
+    # Only ever called on the client loop, so no locking is needed
+    session = _sessions.get(provider)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=LLM_POOL_SIZE,
+            limit_per_host=LLM_POOL_SIZE_PER_HOST,
+            keepalive_timeout=LLM_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[provider] = session
+    return session
+
+
+def _error_message(data, text):
+    if isinstance(data, dict) and isinstance(data.get('error'), dict):
+        return data['error'].get('message', 'Unknown error')
+    if isinstance(data, dict) and data.get('error'):
+        return str(data['error'])
+    return text[:500] if text else 'Unknown error'
+
+
+def _headers(provider, api_key):
+    headers = {'Authorization': f"Bearer {api_key or default_api_key(provider)}"}
+    headers.update(PROVIDERS[provider]['headers'])
+    return headers
+
+
+async def _send(provider, path, api_key, timeout, json_body=None, form=None, deadline=None):
+    config = PROVIDERS[provider]
+    headers = _headers(provider, api_key)
+
+    session = await _get_session(provider)
+    start = time.monotonic()
+    try:
+        async with session.post(
+            config['base_url'] + path,
+            json=json_body,
+            data=form,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            text = await response.text()
+            status = response.status
+            response_headers = dict(response.headers)
+    except asyncio.TimeoutError:
+        return _RawResponse(0, error=f"Deadline of {deadline or timeout:g}s exceeded", latency=time.monotonic() - start)
+    except aiohttp.ClientError as e:
+        return _RawResponse(0, error=f"Connection error: {str(e)}", latency=time.monotonic() - start)
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    error = None if status == 200 else _error_message(data, text)
+    return _RawResponse(status, data, error, time.monotonic() - start, response_headers)
+
+
+def _rate_limit(provider, model, api_key):
+    if not rate_limiter.RATE_LIMIT_ENABLED:
+        return None
+    return rate_limiter.get_limit(provider, model, api_key or default_api_key(provider))
+
+
+def _rate_limited(start, timeout):
+    return _RawResponse(429, error=f"Rate limit headroom not available within the {timeout:g}s deadline",
+                        latency=time.monotonic() - start)
+
+
+def _deadline_exceeded(start, timeout):
+    return _RawResponse(0, error=f"Deadline of {timeout:g}s exceeded", latency=time.monotonic() - start)
+
+
+def _breaker(provider, model):
+    if not circuit_breaker.CIRCUIT_BREAKER_ENABLED:
+        return None
+    return circuit_breaker.get_breaker(provider, model)
+
+
+def _circuit_open(provider, model):
+    return _RawResponse(503, error=f"Circuit open for {provider}:{model}")
+
+
+async def _post(provider, path, api_key, timeout, json_body=None, form=None, model=None, tokens=0):
+    """POST within the rate limit and circuit breaker, retrying 429s while the deadline allows.
+
+    The breaker sees one outcome per call, the last attempt's, however many
+    429 retries it took.
+    """
+    limit = _rate_limit(provider, model, api_key)
+    breaker = _breaker(provider, model)
+    if breaker and not breaker.allow():
+        return _circuit_open(provider, model)
+    start = time.monotonic()
+    attempt = 0
+    try:
+        while True:
+            if limit and not await limit.acquire(tokens, timeout - (time.monotonic() - start)):
+                if breaker:
+                    breaker.release()
+                return _rate_limited(start, timeout)
+            # aiohttp reads a total timeout <= 0 as no timeout at all
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                if breaker:
+                    breaker.release()
+                return _deadline_exceeded(start, timeout)
+            raw = await _send(provider, path, api_key, remaining, json_body, form, deadline=timeout)
+            if limit is None:
+                break
+            limit.update(raw.headers)
+            # Multipart bodies cannot be replayed, so only JSON calls are retried
+            if raw.status != 429 or form is not None or attempt >= rate_limiter.RATE_LIMIT_RETRIES:
+                break
+            limit.throttled(raw.headers)
+            attempt += 1
+    except asyncio.CancelledError:
+        if breaker:
+            breaker.release()
+        raise
+    if breaker:
+        breaker.record(raw.status, raw.latency)
+    return raw
+
+
+async def achat(model, messages, provider='openai', api_key=None, timeout=None, **params):
+    """Chat completion; extra params (temperature, max_tokens, ...) go into the payload"""
+    payload = {'model': model, 'messages': messages}
+    payload.update({key: value for key, value in params.items() if value is not None})
+
+    raw = await _post(provider, '/chat/completions', api_key, timeout or LLM_CHAT_TIMEOUT, json_body=payload,
+                      model=model, tokens=rate_limiter.estimate_tokens(messages, params.get('max_tokens')))
+    result = ChatResult(provider, model, raw.status, data=raw.data, error=raw.error,
+                        latency=raw.latency, headers=raw.headers)
+    if raw.status == 200:
+        try:
+            result.content = raw.data['choices'][0]['message']['content']
+            result.usage = raw.data.get('usage') or {}
+        except (KeyError, IndexError, TypeError):
+            result.error = 'Malformed chat completion response'
+    return result
+
+
+async def achat_stream(model, messages, on_delta, provider='openai', api_key=None, timeout=None, **params):
+    """Streamed chat completion: on_delta(text) is called for each content chunk.
+
+    Returns a ChatResult with the joined content once the stream ends.
+    """
+    payload = {'model': model, 'messages': messages, 'stream': True}
+    payload.update({key: value for key, value in params.items() if value is not None})
+    timeout = timeout or LLM_CHAT_TIMEOUT
+
+    limit = _rate_limit(provider, model, api_key)
+    breaker = _breaker(provider, model)
+    if breaker and not breaker.allow():
+        raw = _circuit_open(provider, model)
+        return ChatResult(provider, model, raw.status, error=raw.error)
+    start = time.monotonic()
+    try:
+        if limit and not await limit.acquire(rate_limiter.estimate_tokens(messages, params.get('max_tokens')), timeout):
+            if breaker:
+                breaker.release()
+            raw = _rate_limited(start, timeout)
+            return ChatResult(provider, model, raw.status, error=raw.error, latency=raw.latency)
+        if timeout - (time.monotonic() - start) <= 0:
+            # aiohttp reads a total timeout <= 0 as no timeout at all
+            if breaker:
+                breaker.release()
+            raw = _deadline_exceeded(start, timeout)
+            return ChatResult(provider, model, raw.status, error=raw.error, latency=raw.latency)
+        result = await _stream_chat(provider, model, payload, api_key, timeout, start, limit, on_delta)
+    except asyncio.CancelledError:
+        if breaker:
+            breaker.release()
+        raise
+    if breaker:
+        breaker.record(result.status, result.latency)
+    return result
+
+
+async def _stream_chat(provider, model, payload, api_key, timeout, start, limit, on_delta):
+    session = await _get_session(provider)
+    parts = []
+    try:
+        async with session.post(
+            PROVIDERS[provider]['base_url'] + '/chat/completions',
+            json=payload,
+            headers=_headers(provider, api_key),
+            timeout=aiohttp.ClientTimeout(total=timeout - (time.monotonic() - start))
+        ) as response:
+            response_headers = dict(response.headers)
+            if limit:
+                limit.update(response_headers)
+                if response.status == 429:
+                    limit.throttled(response_headers)
+            if response.status != 200:
+                text = await response.text()
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = None
+                return ChatResult(provider, model, response.status, data=data, error=_error_message(data, text),
+                                  latency=time.monotonic() - start, headers=response_headers)
+
+            # Server-sent events, one JSON chunk per "data:" line
+            async for line in response.content:
+                line = line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    delta = json.loads(data)['choices'][0]['delta'].get('content')
+                except (ValueError, KeyError, IndexError, TypeError):
+                    continue
+                if delta:
+                    if not parts:
+                        logger.info(f"First token from {model} after {time.monotonic() - start:.2f}s")
+                    parts.append(delta)
+                    on_delta(delta)
+    except asyncio.TimeoutError:
+        return ChatResult(provider, model, 0, content=''.join(parts) or None,
+                          error=f"Deadline of {timeout:g}s exceeded", latency=time.monotonic() - start)
+    except aiohttp.ClientError as e:
+        return ChatResult(provider, model, 0, content=''.join(parts) or None,
+                          error=f"Connection error: {str(e)}", latency=time.monotonic() - start)
+
+    return ChatResult(provider, model, 200, content=''.join(parts),
+                      latency=time.monotonic() - start, headers=response_headers)
+
+
+def vision_content(text, image_bytes, mime_type='image/png'):
+    """Build user message content with a text part and an inline image"""
+    image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    return [
+        {"type": "text", "text": text},
+        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_b64}"}}
+    ]
+
+
+async def avision(model, system_prompt, text, image_bytes, provider='openai', api_key=None, timeout=None, **params):
+    """Chat completion over a single image"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": vision_content(text, image_bytes)}
+    ]
+    return await achat(model, messages, provider=provider, api_key=api_key, timeout=timeout, **params)
+
+
+def _image_result(provider, model, raw):
+    result = ImageResult(provider, model, raw.status, data=raw.data, error=raw.error,
+                         latency=raw.latency, headers=raw.headers)
+    if raw.status == 200:
+        try:
+            first = raw.data['data'][0]
+            result.b64_json = first.get('b64_json')
+            result.url = first.get('url')
+        except (KeyError, IndexError, TypeError):
+            result.error = 'Malformed image response'
+    return result
+
+
+async def agenerate_image(model, prompt, size='1024x1024', quality=None, provider='openai',
+                          api_key=None, timeout=None, **params):
+    """Image generation"""
+    payload = {'model': model, 'prompt': prompt, 'size': size, 'quality': quality}
+    payload.update(params)
+    payload = {key: value for key, value in payload.items() if value is not None}
+    raw = await _post(provider, '/images/generations', api_key, timeout or LLM_IMAGE_TIMEOUT, json_body=payload,
+                      model=model)
+    return _image_result(provider, model, raw)
+
+
+async def aedit_image(model, image_bytes, prompt, mask_bytes=None, size='1024x1024', quality=None,
+                      provider='openai', api_key=None, timeout=None, **params):
+    """Image edit with an optional mask, sent as multipart form data"""
+    form = aiohttp.FormData()
+    fields = {'model': model, 'prompt': prompt, 'size': size, 'quality': quality}
+    fields.update(params)
+    for key, value in fields.items():
+        if value is not None:
+            form.add_field(key, str(value))
+    form.add_field('image', image_bytes, filename='image.png', content_type='image/png')
+    if mask_bytes is not None:
+        form.add_field('mask', mask_bytes, filename='mask.png', content_type='image/png')
+    raw = await _post(provider, '/images/edits', api_key, timeout or LLM_IMAGE_TIMEOUT, form=form, model=model)
+    return _image_result(provider, model, raw)
+
+
+def chat(model, messages, provider='openai', api_key=None, timeout=None, **params):
+    """Blocking wrapper around achat()"""
+    return run(achat(model, messages, provider=provider, api_key=api_key, timeout=timeout, **params))
+
+
+_STREAM_END = object()
+
+
+class ChatStream:
+    """Blocking iterator over the content chunks of a streamed chat completion.
+
+    Once iteration finishes, result holds the final ChatResult. Abandoning
+    the iteration early cancels the request.
+    """
+
+    def __init__(self, model, messages, provider='openai', api_key=None, timeout=None, **params):
+        self.result = None
+        self._chunks = queue.Queue()
+        self.future = submit(achat_stream(model, messages, self._chunks.put, provider=provider,
+                                          api_key=api_key, timeout=timeout, **params))
+        self.future.add_done_callback(lambda _: self._chunks.put(_STREAM_END))
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is _STREAM_END:
+                    break
+                yield chunk
+            self.result = self.future.result()
+        finally:
+            if not self.future.done():
+                logger.info("Chat stream abandoned, cancelling request")
+                self.future.cancel()
+
+
+def vision(model, system_prompt, text, image_bytes, provider='openai', api_key=None, timeout=None, **params):
+    """Blocking wrapper around avision()"""
+    return run(avision(model, system_prompt, text, image_bytes, provider=provider,
+                       api_key=api_key, timeout=timeout, **params))
+
+
+def generate_image(model, prompt, size='1024x1024', quality=None, provider='openai',
+                   api_key=None, timeout=None, **params):
+    """Blocking wrapper around agenerate_image()"""
+    return run(agenerate_image(model, prompt, size=size, quality=quality, provider=provider,
+                               api_key=api_key, timeout=timeout, **params))
+
+
+def edit_image(model, image_bytes, prompt, mask_bytes=None, size='1024x1024', quality=None,
+               provider='openai', api_key=None, timeout=None, **params):
+    """Blocking wrapper around aedit_image()"""
+    return run(aedit_image(model, image_bytes, prompt, mask_bytes=mask_bytes, size=size, quality=quality,
+                           provider=provider, api_key=api_key, timeout=timeout, **params))
+
+
+async def _close_sessions():
+    for session in list(_sessions.values()):
+        await session.close()
+    _sessions.clear()
+
+
+@atexit.register
+def close():
+    """Close pooled connections on interpreter shutdown"""
+    if _loop is not None and _loop.is_running():
+        try:
+            submit(_close_sessions()).result(timeout=5)
+        except Exception:
+            pass
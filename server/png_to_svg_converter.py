@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import os
 import uuid
-import vtracer
+import vtracer_tuning
 from datetime import datetime
 
 def convert_png_to_svg(input_image_path):
@@ -13,22 +13,12 @@ def convert_png_to_svg(input_image_path):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_svg = f"traced_{timestamp}_{uuid.uuid4()}.svg"
         
-        # Convert image to SVG using vtracer with optimized settings
-        vtracer.convert_image_to_svg_py(
-            input_image_path,
-            output_svg,
-            colormode='color',         # Use color mode for richer output
-            hierarchical='stacked',    # Use stacked mode for better layering
-            mode='spline',            # Use spline mode for smoother curves
-            filter_speckle=4,         # Remove small artifacts
-            color_precision=6,        # Good balance of color accuracy
-            layer_difference=16,      # Reasonable layer separation
-            corner_threshold=60,      # Balanced corner detection
-            length_threshold=4.0,     # Good detail preservation
-            max_iterations=10,        # Sufficient optimization
-            splice_threshold=45,      # Good path connection
-            path_precision=3          # Compact but accurate paths
-        )
+        # Convert image to SVG using vtracer with settings tuned to the image
+        with open(input_image_path, 'rb') as f:
+            svg_code, tuning = vtracer_tuning.image_to_svg(f.read())
+        print(f"✓ vtracer settings: {tuning}")
+        with open(output_svg, 'w', encoding='utf-8') as f:
+            f.write(svg_code)
         
         print(f"✓ Successfully converted image to SVG")
         print(f"✓ Saved as: {output_svg}")
@@ -0,0 +1,87 @@
+def build_local_image_prompt(user_input, design_context=None):
+    """Build an image prompt locally from keyword heuristics, without an LLM round-trip"""
+
+    # Analyze user input for design type and requirements
+    user_lower = user_input.lower()
+
+    # Design type detection with more specific categories
+    design_types = {
+        'poster': ['poster', 'flyer', 'announcement', 'event', 'coming soon', 'promotion'],
+        'logo': ['logo', 'brand', 'company', 'business', 'startup', 'identity'],
+        'card': ['card', 'testimonial', 'review', 'quote', 'recommendation'],
+        'banner': ['banner', 'header', 'cover', 'social media', 'facebook', 'instagram'],
+        'infographic': ['infographic', 'chart', 'data', 'statistics', 'info'],
+        'certificate': ['certificate', 'award', 'diploma', 'achievement'],
+        'invitation': ['invitation', 'invite', 'party', 'wedding', 'event'],
+        'menu': ['menu', 'restaurant', 'food', 'cafe', 'dining'],
+        'brochure': ['brochure', 'pamphlet', 'leaflet', 'booklet']
+    }
+
+    detected_type = 'general'
+    for design_type, keywords in design_types.items():
+        if any(keyword in user_lower for keyword in keywords):
+            detected_type = design_type
+            break
+
+    # Extract key elements from design context
+    context_elements = []
+    if design_context:
+        # Extract key phrases from design context
+        context_lines = design_context.split('\n')
+        for line in context_lines[:10]:  # First 10 lines usually contain key info
+            if any(keyword in line.lower() for keyword in ['color', 'font', 'style', 'layout', 'theme']):
+                context_elements.append(line.strip())
+
+    # Build prompt components
+    prompt_parts = []
+
+    # 1. Core request with design type optimization
+    if detected_type == 'poster':
+        prompt_parts.append(f"Create a professional poster design: {user_input}")
+        prompt_parts.append("Design requirements: Bold typography, clear hierarchy, eye-catching visuals, structured layout")
+        prompt_parts.append("Visual style: High-impact graphics, vibrant colors, professional composition, marketing-focused")
+    elif detected_type == 'logo':
+        prompt_parts.append(f"Create a distinctive logo design: {user_input}")
+        prompt_parts.append("Design requirements: Simple memorable shapes, scalable graphics, clean typography, brand identity")
+        prompt_parts.append("Visual style: Minimalist approach, strong contrast, vector-friendly elements, timeless design")
+    elif detected_type == 'card':
+        prompt_parts.append(f"Create an elegant card design: {user_input}")
+        prompt_parts.append("Design requirements: Professional layout, readable typography, trustworthy appearance, balanced composition")
+        prompt_parts.append("Visual style: Clean background, subtle elegance, credible aesthetics, testimonial-focused")
+    elif detected_type == 'banner':
+        prompt_parts.append(f"Create a dynamic banner design: {user_input}")
+        prompt_parts.append("Design requirements: Horizontal layout, social media optimized, engaging visuals, clear messaging")
+        prompt_parts.append("Visual style: Platform-appropriate, scroll-stopping appeal, brand consistency, modern aesthetics")
+    else:
+        prompt_parts.append(f"Create a professional graphic design: {user_input}")
+        prompt_parts.append("Design requirements: Versatile layout, clear visual hierarchy, professional appearance, multi-purpose design")
+        prompt_parts.append("Visual style: Modern aesthetics, balanced composition, adaptable elements, universal appeal")
+
+    # 2. Technical specifications for optimal SVG conversion
+    prompt_parts.append("Technical specs: 1024x1024 resolution, high contrast elements, clear edge definition, distinct boundaries")
+    prompt_parts.append("SVG optimization: Vector-friendly graphics, clean background separation, text-image distinction, sharp details")
+    prompt_parts.append("VTracer ready: Ensure elements have NO background remnants, crisp edges, solid colors, perfect element isolation")
+
+    # 3. Quality and aesthetic requirements
+    prompt_parts.append("Quality standards: Professional finish, polished appearance, commercial-grade design, publication-ready")
+    prompt_parts.append("Color approach: Vibrant yet balanced palette, good contrast ratios, harmonious color scheme, brand-appropriate")
+
+    # 4. Add context elements if available
+    if context_elements:
+        context_summary = " | ".join(context_elements[:3])  # Top 3 context elements
+        prompt_parts.append(f"Design context: {context_summary}")
+
+    # 5. Parallel processing optimization
+    prompt_parts.append("Processing optimization: Clear text-background separation, distinct graphic elements, OCR-friendly text placement")
+    prompt_parts.append("Element isolation: Graphics must be cleanly separable from background for perfect VTracer processing")
+
+    # Combine all parts with separators
+    final_prompt = " || ".join(prompt_parts)
+
+    # Ensure prompt length is manageable
+    if len(final_prompt) > 1200:
+        # Keep the most important parts
+        essential_parts = prompt_parts[:4]  # Core request + technical specs
+        final_prompt = " || ".join(essential_parts)
+
+    return final_prompt
@@ -0,0 +1,229 @@
+"""Client-side token-bucket rate limiting for provider calls.
+
+Each provider/model/API key gets a requests bucket and a tokens bucket sized
+from the provider's x-ratelimit-* response headers. Calls estimate their
+token cost up front and wait on the llm_client event loop until both buckets
+have room, instead of bursting into 429s. A 429 drains the buckets until the
+provider's reset time.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Used until the first response reports the real limits
+RATE_LIMIT_DEFAULT_RPM = float(os.getenv('RATE_LIMIT_DEFAULT_RPM', '500'))
+RATE_LIMIT_DEFAULT_TPM = float(os.getenv('RATE_LIMIT_DEFAULT_TPM', '200000'))
+# Retries after a 429, each waiting for the bucket to refill
+RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', '2'))
+
+# Rough cost of one image in a vision request
+IMAGE_TOKEN_ESTIMATE = 1000
+
+
+def estimate_tokens(messages=None, max_tokens=None):
+    """Estimate the tokens a chat request counts against the TPM limit"""
+    chars, images = 0, 0
+    for message in messages or []:
+        content = message.get('content')
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    chars += len(part.get('text', ''))
+                else:
+                    images += 1
+    # ~4 characters per token, and max_tokens is reserved by the provider
+    return chars // 4 + images * IMAGE_TOKEN_ESTIMATE + (max_tokens or 0)
+
+
+def parse_duration(value):
+    """Parse reset durations such as '1s', '6m0s', '20ms' or '1h2m3.5s' into seconds"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Capacity refilled continuously at capacity per minute"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def current(self, now):
+        return min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+
+    def _refill(self, now):
+        self.level = self.current(now)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        wait = max(self.blocked_until - now, 0.0)
+        if self.level < amount:
+            wait = max(wait, (amount - self.level) * 60.0 / self.capacity)
+        return wait
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, now):
+        """Adopt the provider's view of the limit and what remains of it"""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+    def block(self, seconds, now):
+        self._refill(now)
+        self.level = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimit:
+    """Request and token buckets for one provider/model/key"""
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = TokenBucket(RATE_LIMIT_DEFAULT_RPM)
+        self.tokens = TokenBucket(RATE_LIMIT_DEFAULT_TPM)
+        self.from_headers = False
+        # One event per queued acquire(), set when it reaches the head
+        self._waiters = deque()
+        self.stats = {'calls': 0, 'delayed': 0, 'wait_s': 0.0, 'throttled': 0, 'rejected': 0}
+
+    async def acquire(self, tokens, max_wait):
+        """Wait until the call fits both buckets; False unless it gets in with time to spare.
+
+        Waiters are served in arrival order: only the head of the queue takes
+        from the buckets, so a large call cannot be starved by a stream of small
+        ones. A caller gives up as soon as the buckets alone would keep it
+        waiting past max_wait, without queueing behind anyone.
+        """
+        start = time.monotonic()
+        turn = asyncio.Event()
+        self._waiters.append(turn)
+        if self._waiters[0] is turn:
+            turn.set()
+        delayed = False
+        try:
+            while True:
+                now = time.monotonic()
+                remaining = max_wait - (now - start)
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if wait >= remaining:
+                    # No budget would be left for the call itself
+                    self.stats['rejected'] += 1
+                    logger.warning(f"Rate limit {self.name}: {wait:.1f}s wait leaves nothing of the call deadline")
+                    return False
+                if turn.is_set() and wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    self.stats['calls'] += 1
+                    if delayed:
+                        self.stats['delayed'] += 1
+                        self.stats['wait_s'] += now - start
+                    return True
+                if not delayed:
+                    logger.info(f"Rate limit {self.name}: delaying call {wait:.2f}s")
+                    delayed = True
+                if turn.is_set():
+                    await asyncio.sleep(wait)
+                    continue
+                try:
+                    await asyncio.wait_for(turn.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            was_head = self._waiters[0] is turn
+            self._waiters.remove(turn)
+            if was_head and self._waiters:
+                self._waiters[0].set()
+
+    def update(self, headers):
+        """Sync buckets from x-ratelimit-* response headers"""
+        headers = {key.lower(): value for key, value in headers.items()}
+        now = time.monotonic()
+        for kind, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+            limit = _number(headers.get(f'x-ratelimit-limit-{kind}'))
+            remaining = _number(headers.get(f'x-ratelimit-remaining-{kind}'))
+            if limit or remaining is not None:
+                bucket.sync(limit, remaining, now)
+                self.from_headers = True
+
+    def throttled(self, headers):
+        """Handle a 429: block both buckets until the provider says to retry"""
+        headers = {key.lower(): value for key, value in headers.items()}
+        delay = parse_duration(headers.get('retry-after'))
+        if delay is None:
+            resets = [parse_duration(headers.get(f'x-ratelimit-reset-{kind}')) for kind in ('requests', 'tokens')]
+            delay = max([reset for reset in resets if reset is not None], default=1.0)
+        now = time.monotonic()
+        self.requests.block(delay, now)
+        self.tokens.block(delay, now)
+        self.stats['throttled'] += 1
+        logger.warning(f"Rate limit {self.name}: 429 received, pausing {delay:.2f}s")
+        return delay
+
+    def summary(self):
+        now = time.monotonic()
+        requests_left = max(self.requests.current(now), 0.0)
+        tokens_left = max(self.tokens.current(now), 0.0)
+        return dict(
+            self.stats,
+            wait_s=round(self.stats['wait_s'], 3),
+            source='headers' if self.from_headers else 'defaults',
+            requests_limit=self.requests.capacity,
+            requests_headroom=round(requests_left, 1),
+            tokens_limit=self.tokens.capacity,
+            tokens_headroom=round(tokens_left),
+            headroom_pct=round(100 * min(requests_left / self.requests.capacity,
+                                         tokens_left / self.tokens.capacity), 1)
+        )
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# Only touched from the llm_client event loop thread
+_limits = {}
+
+
+def get_limit(provider, model, api_key):
+    """The RateLimit for a provider/model/key, created on first use"""
+    key_id = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:8]
+    name = f"{provider}:{model}:{key_id}"
+    limit = _limits.get(name)
+    if limit is None:
+        limit = _limits[name] = RateLimit(name)
+    return limit
+
+
+def summary():
+    """Headroom and wait statistics per provider/model/key"""
+    return {name: limit.summary() for name, limit in list(_limits.items())}
@@ -1,43 +1,44 @@
 #!/usr/bin/env python3
 import os
-import base64
-from openai import OpenAI
 from dotenv import load_dotenv
+import llm_client
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client with API key from .env
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+def remove_text_bytes(input_bytes, mask_bytes=None):
+    """Remove text with a gpt-image-1 edit and return the PNG bytes; mask_bytes limits the edit to its transparent areas"""
+    prompt = (
+        "Remove all visible text from this image and seamlessly inpaint the background. "
+        "Do not add or modify any objects. Keep the overall layout intact."
+    )
+    result = llm_client.edit_image(
+        "gpt-image-1",
+        input_bytes,
+        prompt,
+        mask_bytes=mask_bytes,
+        size="1024x1024",
+        quality="low",
+        api_key=os.getenv('OPENAI_API_KEY')
+    )
+    if not result.ok:
+        raise Exception(f"Image edit failed: {result.error}")
+    return result.image_bytes
 
 def remove_text(input_image_path):
     """Use OpenAI to remove text directly from the image"""
     print("Processing image with OpenAI API...")
     
     try:
-        # Define a detailed prompt for text removal
-        prompt = (
-            "Remove all visible text from this image and seamlessly inpaint the background. "
-            "Do not add or modify any objects. Keep the overall layout intact."
-        )
-        
-        response = client.images.edit(
-            model="gpt-image-1",
-            prompt=prompt,
-            image=open(input_image_path, "rb"),
-            size="1024x1024",
-            quality="low"
-        )
-        
-        # Get the base64 image from response
-        image_base64 = response.data[0].b64_json
+        with open(input_image_path, "rb") as f:
+            input_bytes = f.read()
+
+        image_bytes = remove_text_bytes(input_bytes)
         
         # Save the result
         timestamp = os.path.splitext(os.path.basename(input_image_path))[0]
         output_path = f"edited_{timestamp}.png"
         
-        # Decode and save the image
-        image_bytes = base64.b64decode(image_base64)
         with open(output_path, "wb") as f:
             f.write(image_bytes)
             
@@ -0,0 +1,160 @@
+"""Content-addressed cache for LLM text-stage responses.
+
+Responses are keyed on model, system prompt, user prompt, temperature and the
+pipeline version. Lookups go through an in-memory LRU tier first and then an
+SQLite store on disk that survives restarts, with TTL and size-based eviction.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Local state (caches, queues, indexes) lives under one directory
+CACHE_DIR = os.getenv('SERVER_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+
+# Bump when prompts or stage semantics change to invalidate old entries
+PIPELINE_VERSION = os.getenv('PIPELINE_VERSION', '1')
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(CACHE_DIR, 'responses.sqlite3'))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv('RESPONSE_CACHE_MEMORY_ENTRIES', '256'))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+
+def make_key(model, system_prompt, user_prompt, temperature, version=None, response_format=None, max_tokens=None):
+    """Content hash identifying one text-stage request.
+
+    user_prompt may be the whole message list, so multi-turn calls that differ
+    only in assistant turns get different keys.
+    """
+    parts = [version or PIPELINE_VERSION, model, system_prompt, user_prompt, temperature]
+    options = {name: value for name, value in (('response_format', response_format), ('max_tokens', max_tokens))
+               if value is not None}
+    if options:
+        # Calls without them keep the plain key
+        parts.append(options)
+    material = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + SQLite) cache of response strings"""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, memory_entries=RESPONSE_CACHE_MEMORY_ENTRIES,
+                 ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL,"
+            " accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            value, created = row
+            if now - created > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, value, created)
+            self.stats['disk_hits'] += 1
+            return value
+
+    def set(self, key, value):
+        """Store value under key in both tiers"""
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._remember(key, value, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size)
+            )
+            self.stats['stores'] += 1
+            self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired rows, then least recently used rows until under the size budget"""
+        expired = self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        self.stats['expired'] += max(expired, 0)
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self.stats['evictions'] += 1
+
+    def summary(self):
+        """Counters plus current sizes, for the stats endpoint"""
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            return dict(
+                self.stats,
+                memory_entries=len(self._memory),
+                disk_entries=entries,
+                disk_bytes=size,
+                hit_rate=round(hits / lookups * 100, 1) if lookups else 0.0
+            )
+
+
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
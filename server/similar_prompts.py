@@ -0,0 +1,238 @@
+"""Near-duplicate prompt index for reusing upstream pipeline artifacts.
+
+Prompts are normalized to a set of content words and indexed with MinHash
+LSH, so "coming soon poster for my bakery" and "bakery coming-soon poster"
+land in the same buckets. A lookup returns the stored artifacts (for example
+design_plan and design_knowledge) of the closest earlier prompt whose exact
+Jaccard similarity clears the endpoint's threshold.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from response_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_PROMPTS_ENABLED = os.getenv('SIMILAR_PROMPTS_ENABLED', 'true').lower() == 'true'
+SIMILAR_PROMPTS_PATH = os.getenv('SIMILAR_PROMPTS_PATH', os.path.join(CACHE_DIR, 'similar_prompts.sqlite3'))
+SIMILAR_PROMPTS_TTL = float(os.getenv('SIMILAR_PROMPTS_TTL', str(7 * 24 * 3600)))
+SIMILAR_PROMPTS_MAX_ENTRIES = int(os.getenv('SIMILAR_PROMPTS_MAX_ENTRIES', '5000'))
+
+
+def _stage_list(value):
+    return tuple(name.strip() for name in value.split(',') if name.strip())
+
+
+# Per-endpoint similarity threshold and the stages whose outputs may be reused.
+# An empty stage list turns reuse off for that endpoint.
+SIMILAR_PROMPT_ENDPOINTS = {
+    'generate_parallel_svg': {
+        'threshold': float(os.getenv('SIMILAR_PROMPT_THRESHOLD_PARALLEL_SVG', '0.8')),
+        'stages': _stage_list(os.getenv('SIMILAR_PROMPT_STAGES_PARALLEL_SVG', 'design_plan,design_knowledge'))
+    },
+    'generate_svg': {
+        'threshold': float(os.getenv('SIMILAR_PROMPT_THRESHOLD_SVG', '0.8')),
+        'stages': _stage_list(os.getenv('SIMILAR_PROMPT_STAGES_SVG', 'design_plan,design_knowledge'))
+    }
+}
+
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard almost always share a bucket
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+_ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+STOPWORDS = {
+    'a', 'an', 'the', 'for', 'of', 'to', 'in', 'on', 'at', 'by', 'with', 'and', 'or', 'my', 'our',
+    'your', 'me', 'us', 'i', 'we', 'is', 'it', 'this', 'that', 'please', 'create', 'make', 'design',
+    'generate', 'some', 'can', 'you', 'want', 'need', 'would', 'like'
+}
+
+
+def normalize_prompt(prompt):
+    """Lowercased content words with punctuation, stopwords and plural 's' removed"""
+    tokens = set()
+    for word in re.findall(r'[a-z0-9#]+', prompt.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash(tokens):
+    """MinHash signature of a token set"""
+    hashes = [_token_hash(token) for token in tokens]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature):
+    for band in range(LSH_BANDS):
+        rows = signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND]
+        yield band, hash(tuple(rows))
+
+
+class SimilarPromptIndex:
+    """MinHash LSH index over prompts, persisted to SQLite"""
+
+    def __init__(self, path=SIMILAR_PROMPTS_PATH, ttl=SIMILAR_PROMPTS_TTL, max_entries=SIMILAR_PROMPTS_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._buckets = {}
+        self.stats = {'lookups': 0, 'matches': 0, 'misses': 0, 'stored': 0}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            " id INTEGER PRIMARY KEY, endpoint TEXT NOT NULL, token_key TEXT NOT NULL,"
+            " prompt TEXT NOT NULL, artifacts TEXT NOT NULL, created REAL NOT NULL,"
+            " UNIQUE (endpoint, token_key))"
+        )
+        self._db.commit()
+        for entry_id, endpoint, token_key, created in self._db.execute(
+                "SELECT id, endpoint, token_key, created FROM prompts"):
+            self._index(entry_id, endpoint, set(json.loads(token_key)), created)
+        logger.info(f"Similar prompt index loaded with {len(self._entries)} entries")
+
+    def _index(self, entry_id, endpoint, tokens, created):
+        self._entries[entry_id] = (endpoint, tokens, created)
+        for band in _bands(minhash(tokens)):
+            self._buckets.setdefault((endpoint, band), set()).add(entry_id)
+
+    def _unindex(self, entry_id):
+        endpoint, tokens, _ = self._entries.pop(entry_id)
+        for band in _bands(minhash(tokens)):
+            bucket = self._buckets.get((endpoint, band))
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[(endpoint, band)]
+
+    def lookup(self, endpoint, prompt, threshold):
+        """Return the best stored match at or above threshold, or None"""
+        tokens = normalize_prompt(prompt)
+        if not tokens:
+            return None
+        now = time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            candidates = set()
+            for band in _bands(minhash(tokens)):
+                candidates |= self._buckets.get((endpoint, band), set())
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                _, entry_tokens, created = self._entries[entry_id]
+                if now - created > self.ttl:
+                    continue
+                similarity = jaccard(tokens, entry_tokens)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < threshold:
+                self.stats['misses'] += 1
+                return None
+
+            matched_prompt, artifacts = self._db.execute(
+                "SELECT prompt, artifacts FROM prompts WHERE id = ?", (best_id,)).fetchone()
+            self.stats['matches'] += 1
+
+        logger.info(f"Similar prompt match ({best_similarity:.2f}) for '{prompt[:60]}': '{matched_prompt[:60]}'")
+        return {
+            'prompt': matched_prompt,
+            'similarity': round(best_similarity, 3),
+            'artifacts': json.loads(artifacts)
+        }
+
+    def remember(self, endpoint, prompt, artifacts):
+        """Store artifacts for prompt, replacing any entry with the same normalized words"""
+        tokens = normalize_prompt(prompt)
+        if not tokens:
+            return
+        token_key = json.dumps(sorted(tokens))
+        now = time.time()
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT id FROM prompts WHERE endpoint = ? AND token_key = ?", (endpoint, token_key)).fetchone()
+            if existing:
+                self._db.execute("DELETE FROM prompts WHERE id = ?", existing)
+                self._unindex(existing[0])
+
+            cursor = self._db.execute(
+                "INSERT INTO prompts (endpoint, token_key, prompt, artifacts, created) VALUES (?, ?, ?, ?, ?)",
+                (endpoint, token_key, prompt, json.dumps(artifacts), now)
+            )
+            self._index(cursor.lastrowid, endpoint, tokens, now)
+            self.stats['stored'] += 1
+            self._prune(endpoint, now)
+            self._db.commit()
+
+    def _prune(self, endpoint, now):
+        """Drop expired entries, then the oldest ones beyond max_entries"""
+        stale = [row[0] for row in self._db.execute(
+            "SELECT id FROM prompts WHERE endpoint = ? AND created < ?", (endpoint, now - self.ttl))]
+        stale += [row[0] for row in self._db.execute(
+            "SELECT id FROM prompts WHERE endpoint = ? AND created >= ? ORDER BY created DESC LIMIT -1 OFFSET ?",
+            (endpoint, now - self.ttl, self.max_entries))]
+        for entry_id in stale:
+            self._db.execute("DELETE FROM prompts WHERE id = ?", (entry_id,))
+            self._unindex(entry_id)
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+
+similar_prompt_index = SimilarPromptIndex() if SIMILAR_PROMPTS_ENABLED else None
+
+
+def find_reusable_artifacts(endpoint, prompt):
+    """Look up artifacts the endpoint may reuse for prompt, or None"""
+    config = SIMILAR_PROMPT_ENDPOINTS.get(endpoint)
+    if similar_prompt_index is None or not config or not config['stages']:
+        return None
+    match = similar_prompt_index.lookup(endpoint, prompt, config['threshold'])
+    if match is None:
+        return None
+    match['artifacts'] = {
+        name: value for name, value in match['artifacts'].items() if name in config['stages']
+    }
+    return match if match['artifacts'] else None
+
+
+def remember_artifacts(endpoint, prompt, results):
+    """Store the endpoint's reusable stage outputs from a finished run"""
+    config = SIMILAR_PROMPT_ENDPOINTS.get(endpoint)
+    if similar_prompt_index is None or not config or not config['stages']:
+        return
+    artifacts = {name: results[name] for name in config['stages'] if name in results}
+    # Only text outputs are stored, and never the stages' error placeholders
+    if not artifacts or any(not isinstance(value, str) or value.startswith('Error in') for value in artifacts.values()):
+        return
+    similar_prompt_index.remember(endpoint, prompt, artifacts)
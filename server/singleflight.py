@@ -0,0 +1,90 @@
+"""Single-flight coalescing of identical concurrent computations.
+
+The first caller for a key runs the computation; callers arriving with the
+same key while it is in flight wait for it and share its result or
+exception. Nothing is kept once the computation finishes, so this only
+removes concurrent duplicates; the response cache handles repeats.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'followers': 0, 'in_flight': 0}
+        _groups.append(self)
+
+    def do(self, key, fn):
+        """Run fn() once per in-flight key; returns (value, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+                self.stats['in_flight'] += 1
+                leader = True
+            else:
+                call.followers += 1
+                self.stats['followers'] += 1
+                leader = False
+
+        if not leader:
+            logger.info(f"[{self.name}] joining in-flight call {key[:12]}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.stats['in_flight'] -= 1
+            call.done.set()
+            if call.followers:
+                logger.info(f"[{self.name}] shared call {key[:12]} with {call.followers} waiting callers")
+        return call.value, False
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_groups = []
+
+
+def summary():
+    """Leader/follower counts for every coalescing group"""
+    return {group.name: group.summary() for group in _groups}
+
+
+def request_key(endpoint, body):
+    """Key for a request body, insensitive to prompt case, whitespace and field order"""
+    normalized = dict(body)
+    for field in ('prompt', 'user_input'):
+        if isinstance(normalized.get(field), str):
+            normalized[field] = re.sub(r'\s+', ' ', normalized[field]).strip().casefold()
+    material = json.dumps([endpoint, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
@@ -0,0 +1,149 @@
+"""Speculative gpt-image-1 generation started from an early, cheap prompt.
+
+The speculative image is generated while the prompt enhancement stages are
+still running. Once the final prompt is known a policy decides whether the
+speculative result is kept or cancelled in favour of a fresh generation.
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 'off' disables speculation, 'keep' always uses the speculative image and
+# 'similar' keeps it only when the final prompt stays close to the early one
+SPECULATIVE_POLICIES = ('off', 'keep', 'similar')
+SPECULATIVE_IMAGE_POLICY = os.getenv('SPECULATIVE_IMAGE_POLICY', 'off')
+# 'local' starts from the user input at t=0, 'pre_enhanced' waits for Stage 4
+SPECULATIVE_IMAGE_SOURCE = os.getenv('SPECULATIVE_IMAGE_SOURCE', 'local')
+# Share of the speculative request's content words the final request must keep
+SPECULATIVE_IMAGE_MIN_SIMILARITY = float(os.getenv('SPECULATIVE_IMAGE_MIN_SIMILARITY', '0.5'))
+
+speculation_stats = {
+    'started': 0,
+    'kept': 0,
+    'cancelled': 0,
+    'discarded': 0,
+    'failed': 0
+}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        speculation_stats[key] += 1
+
+
+def resolve_policy(requested=None):
+    """Return the policy to use for a request, falling back to the configured default"""
+    policy = requested if requested is not None else SPECULATIVE_IMAGE_POLICY
+    if policy is True:
+        policy = 'similar'
+    elif policy in (False, None):
+        policy = 'off'
+    if policy not in SPECULATIVE_POLICIES:
+        raise ValueError(f"Unknown speculative image policy '{policy}', expected one of {SPECULATIVE_POLICIES}")
+    return policy
+
+
+STOPWORDS = frozenset('''
+a an and are as at be but by for from has have in into is it its of on or that the this to with
+'''.split())
+
+
+def _tokens(text):
+    return {word for word in re.findall(r'[a-z0-9#]+', text.lower()) if word not in STOPWORDS and len(word) > 1}
+
+
+def prompt_similarity(source, final):
+    """Share of the content words of source that final still contains.
+
+    The enhancer elaborates on a request, so a final prompt that keeps what the
+    early one asked for scores high however much it adds.
+    """
+    a, b = _tokens(source), _tokens(final)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a)
+
+
+class SpeculativeImage:
+    """Handle on an image generation started before the final prompt is known.
+
+    start(prompt) must return a concurrent Future for the raw generation;
+    finish(result) turns that result into the value the pipeline uses.
+    source is the user-derived text the prompt was built from, the part the
+    'similar' policy compares; it defaults to the prompt itself.
+    """
+
+    def __init__(self, prompt, start, finish=None, source=None):
+        self.prompt = prompt
+        self.source = source if source is not None else prompt
+        self.started_at = time.monotonic()
+        self.decision = 'pending'
+        self.similarity = None
+        self.finish = finish
+        self.future = start(prompt)
+        _count('started')
+        logger.info(f"Speculative image generation started: {prompt[:100]}...")
+
+    def cancel(self):
+        """Cancel the in-flight generation, or discard its result if it already finished"""
+        if self.future.cancel():
+            self.decision = 'cancelled'
+        else:
+            logger.info("Speculative image already finished, its result will be discarded")
+            self.decision = 'discarded'
+        _count(self.decision)
+
+    def abandon(self):
+        """Cancel a speculation nothing resolved, e.g. because another stage failed first"""
+        if self.decision == 'pending':
+            logger.info("Pipeline ended before the speculative image was resolved")
+            self.cancel()
+
+    def result(self):
+        result = self.future.result()
+        return self.finish(result) if self.finish else result
+
+    def summary(self):
+        return {
+            'decision': self.decision,
+            'similarity': round(self.similarity, 3) if self.similarity is not None else None,
+            'prompt': self.prompt[:200]
+        }
+
+
+def resolve_speculation(speculation, final_prompt, generate_final, policy, final_source=None,
+                        min_similarity=SPECULATIVE_IMAGE_MIN_SIMILARITY):
+    """Apply the policy: return the speculative image or generate from final_prompt.
+
+    'similar' compares the speculation's source with final_source, the
+    user-derived text behind final_prompt (final_prompt itself by default),
+    so the fixed lines of the image prompt template do not count.
+    """
+    if policy == 'similar' and final_prompt is not None:
+        speculation.similarity = prompt_similarity(
+            speculation.source, final_source if final_source is not None else final_prompt)
+        logger.info(f"Speculative prompt similarity to final prompt: {speculation.similarity:.2f}")
+        if speculation.similarity < min_similarity:
+            speculation.cancel()
+            return generate_final(final_prompt)
+
+    try:
+        image = speculation.result()
+    except Exception as e:
+        logger.warning(f"Speculative image generation failed: {str(e)}")
+        speculation.decision = 'failed'
+        _count('failed')
+        if final_prompt is None:
+            raise
+        return generate_final(final_prompt)
+
+    speculation.decision = 'kept'
+    _count('kept')
+    waited = time.monotonic() - speculation.started_at
+    logger.info(f"Using speculative image ({waited:.2f}s after it was started)")
+    return image
@@ -0,0 +1,58 @@
+"""Server-Sent Events framing and streams fed from a background thread.
+
+A streamed endpoint runs its pipeline on a worker thread and the response
+generator relays whatever the worker emits. While a slow stage keeps the
+worker quiet, a comment line goes out every SSE_KEEPALIVE_SECONDS so proxies
+do not close the idle connection.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Interval between keep-alive comments while a stream waits on a slow stage
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+KEEPALIVE = ": keep-alive\n\n"
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def error_payload(e):
+    """'error' event data: the message, plus the failed stage and session when the error carries them"""
+    return {'error': str(e), 'stage': getattr(e, 'stage', None), 'session_id': getattr(e, 'session_id', None)}
+
+
+def stream_work(work, start=None, name='sse-stream'):
+    """Run work(emit) on a daemon thread and yield SSE messages as it emits them.
+
+    emit(event, data) sends one event. work's return value is sent as the
+    final 'complete' event and an exception as the final 'error' event; start,
+    an (event, data) pair, goes out before either.
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            events.put(('complete', work(lambda event, data: events.put((event, data)))))
+        except Exception as e:
+            logger.error(f"Error in {name}: {str(e)}")
+            events.put(('error', error_payload(e)))
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    if start is not None:
+        yield sse_event(*start)
+    while True:
+        try:
+            event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            yield KEEPALIVE
+            continue
+        yield sse_event(event, data)
+        if event in ('complete', 'error'):
+            return
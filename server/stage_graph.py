@@ -0,0 +1,269 @@
+"""Declarative stage graph runner for the multi-stage SVG pipelines.
+
+A pipeline is described as named stages with their dependencies. Every stage
+whose dependencies are satisfied is started immediately on a shared thread
+pool, so independent LLM round-trips overlap instead of running back to back.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for stage execution across all requests
+STAGE_GRAPH_WORKERS = int(os.getenv('STAGE_GRAPH_WORKERS', '16'))
+_stage_executor = ThreadPoolExecutor(max_workers=STAGE_GRAPH_WORKERS, thread_name_prefix='stage')
+
+
+class StopPipeline(Exception):
+    """Raised by a stage to end a run early and hand a payload back to the caller"""
+
+    def __init__(self, payload=None):
+        super().__init__('Pipeline stopped early')
+        self.payload = payload
+
+
+class StageError(Exception):
+    """Wraps an exception raised inside a stage, keeping the stage name"""
+
+    def __init__(self, stage, error):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """A single named step: fn is called with its deps as keyword arguments"""
+
+    def __init__(self, name, fn, deps=(), after=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        # Ordering-only dependencies: waited for but not passed to fn
+        self.after = tuple(after)
+
+    @property
+    def upstream(self):
+        return self.deps + self.after
+
+
+class GraphRun:
+    """Results and timings of one graph execution"""
+
+    def __init__(self, graph_name, results, timings, total_time):
+        self.graph_name = graph_name
+        self.results = results
+        self.timings = timings
+        self.total_time = total_time
+        self.critical_path = []
+        # Stages no target needed, so they never ran
+        self.skipped = []
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def get(self, name, default=None):
+        return self.results.get(name, default)
+
+    def summary(self):
+        """JSON-friendly timing summary"""
+        return {
+            'graph': self.graph_name,
+            'total_s': round(self.total_time, 3),
+            'critical_path': self.critical_path,
+            'skipped': self.skipped,
+            'stages': {
+                name: {key: round(value, 3) for key, value in timing.items()}
+                for name, timing in self.timings.items()
+            }
+        }
+
+
+class StageGraph:
+    """A DAG of stages that runs every ready stage concurrently"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+
+    def add(self, name, fn, deps=(), after=()):
+        """Register a stage; deps are passed to fn by name, after only orders it"""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already defined in graph '{self.name}'")
+        self.stages[name] = Stage(name, fn, deps, after)
+        return fn
+
+    def stage(self, name, deps=(), after=()):
+        """Decorator form of add()"""
+        def decorator(fn):
+            return self.add(name, fn, deps, after)
+        return decorator
+
+    def required_stages(self, targets, provided=()):
+        """Return the stages needed to produce targets, given already provided values"""
+        provided = set(provided)
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in needed or name in provided:
+                continue
+            if name not in self.stages:
+                raise ValueError(f"Graph '{self.name}' has no stage or input named '{name}'")
+            needed.add(name)
+            stack.extend(self.stages[name].upstream)
+        return needed
+
+    def downstream(self, names):
+        """Return names plus every stage that depends on them, directly or not"""
+        affected = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name not in affected and affected.intersection(stage.upstream):
+                    affected.add(stage.name)
+                    changed = True
+        return affected
+
+    def validate(self, input_names=()):
+        """Check that every dependency resolves and the graph has no cycles"""
+        known = set(self.stages) | set(input_names)
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.upstream if dep not in known]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown {missing}")
+
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle detected in graph '{self.name}' at stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].upstream:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self, inputs, targets=None, on_stage_complete=None):
+        """Execute the graph and return a GraphRun.
+
+        inputs seeds values by name (they also satisfy stages of the same name),
+        targets limits execution to the stages those outputs need, and
+        on_stage_complete(name, value) is called from the coordinating thread
+        as each stage finishes.
+        """
+        results = dict(inputs)
+        targets = list(targets) if targets is not None else list(self.stages)
+        needed = self.required_stages(targets, provided=results)
+        self.validate(input_names=results)
+
+        start = time.monotonic()
+        timings = {}
+        pending = [name for name in self.stages if name in needed]
+        running = {}
+
+        logger.info(f"[{self.name}] running {len(pending)} stages")
+        try:
+            while pending or running:
+                ready = [name for name in pending
+                         if all(dep in results for dep in self.stages[name].upstream)]
+                for name in ready:
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    kwargs = {dep: results[dep] for dep in stage.deps}
+                    submitted = time.monotonic() - start
+                    future = _stage_executor.submit(_timed_call, stage.fn, kwargs, start)
+                    running[future] = (name, submitted)
+
+                if not running:
+                    raise ValueError(f"Graph '{self.name}' cannot make progress on {pending}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, submitted = running.pop(future)
+                    try:
+                        value, began, ended = future.result()
+                    except StopPipeline:
+                        logger.info(f"[{self.name}] stage '{name}' stopped the pipeline")
+                        raise
+                    except Exception as e:
+                        logger.error(f"[{self.name}] stage '{name}' failed: {str(e)}")
+                        raise StageError(name, e) from e
+
+                    results[name] = value
+                    timings[name] = {
+                        'submitted_s': submitted,
+                        'start_s': began,
+                        'end_s': ended,
+                        'duration_s': ended - began,
+                        'queued_s': began - submitted,
+                        'critical_path_s': 0.0
+                    }
+                    logger.info(f"[{self.name}] stage '{name}' done in {ended - began:.2f}s")
+                    if on_stage_complete:
+                        on_stage_complete(name, value)
+        finally:
+            # Stages already running cannot be interrupted; drop the rest
+            for future in running:
+                future.cancel()
+
+        graph_run = GraphRun(self.name, results, timings, time.monotonic() - start)
+        graph_run.critical_path = self._critical_path(timings, targets)
+        graph_run.skipped = sorted(name for name in self.stages if name not in needed and name not in inputs)
+        for name in graph_run.critical_path:
+            timings[name]['critical_path_s'] = timings[name]['end_s'] - self._ready_at(name, timings)
+        logger.info(f"[{self.name}] finished in {graph_run.total_time:.2f}s, "
+                    f"critical path: {' -> '.join(graph_run.critical_path)}")
+        return graph_run
+
+    def _ready_at(self, name, timings):
+        """Time at which the last executed upstream stage of name finished"""
+        ends = [timings[dep]['end_s'] for dep in self.stages[name].upstream if dep in timings]
+        return max(ends, default=0.0)
+
+    def _critical_path(self, timings, targets):
+        """Walk back from the last finishing target through the latest finishing deps"""
+        candidates = [name for name in targets if name in timings]
+        if not candidates:
+            return []
+        name = max(candidates, key=lambda n: timings[n]['end_s'])
+        path = [name]
+        while True:
+            upstream = [dep for dep in self.stages[name].upstream if dep in timings]
+            if not upstream:
+                break
+            name = max(upstream, key=lambda n: timings[n]['end_s'])
+            path.append(name)
+        return list(reversed(path))
+
+
+def parse_include(value, graph, optional):
+    """Validate include= (a list or comma-separated string) against the optional stages of graph.
+
+    Returns (stage names, error message).
+    """
+    if value is None:
+        return [], None
+    names = value.split(',') if isinstance(value, str) else value
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return None, 'include must be a list or a comma-separated string of stage names'
+    names = sorted({name.strip() for name in names if name.strip()})
+    unknown = [name for name in names if name not in optional or name not in graph.stages]
+    if unknown:
+        available = [name for name in optional if name in graph.stages]
+        return None, f"Cannot include {unknown}, expected any of {available}"
+    return names, None
+
+
+def _timed_call(fn, kwargs, origin):
+    """Run fn and report start/end offsets relative to the run start"""
+    began = time.monotonic() - origin
+    value = fn(**kwargs)
+    return value, began, time.monotonic() - origin
@@ -0,0 +1,257 @@
+"""Local text-layer engine: OCR word boxes to a compact <text> SVG.
+
+Tesseract's word boxes are grouped into lines and paragraphs. For each line
+the local background is the median of a ring of pixels around the box, glyph
+pixels are the ones far from it, and the text colour is their median. The ink
+row profile gives the baseline (the last row of full-height ink, so
+descenders are ignored) and the font size (ascent over the cap-height ratio).
+Paragraph alignment comes from how the line edges and centres line up.
+
+Only lines whose OCR confidence is below TEXT_LAYER_MIN_CONFIDENCE are sent
+to the LLM, as small crops that are transcribed, not redrawn; geometry and
+colour stay local.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+# 'local' uses this engine with LLM help for weak regions, 'llm' keeps the full-image vision call
+TEXT_LAYER_ENGINE = os.getenv('TEXT_LAYER_ENGINE', 'local')
+TEXT_LAYER_MIN_CONFIDENCE = float(os.getenv('TEXT_LAYER_MIN_CONFIDENCE', '70'))
+TEXT_LAYER_MAX_LLM_REGIONS = int(os.getenv('TEXT_LAYER_MAX_LLM_REGIONS', '6'))
+TEXT_LAYER_FONT_FAMILY = os.getenv('TEXT_LAYER_FONT_FAMILY', 'Arial, Helvetica, sans-serif')
+
+# Words below this confidence that contain no letters or digits are graphics, not text
+NOISE_CONFIDENCE = 30
+# Cap height as a fraction of the em box for common sans fonts
+CAP_HEIGHT_RATIO = 0.72
+# Minimum RGB distance from the background for a pixel to count as ink
+INK_MIN_DISTANCE = 40
+# Share of the bounding box covered by ink above which a line is set bold
+BOLD_INK_RATIO = 0.33
+RING_PADDING = 4
+REGION_PADDING = 6
+
+# The text layer and text removal OCR the same image at the same time
+OCR_FLIGHTS = singleflight.SingleFlight('ocr')
+
+_stats_lock = threading.Lock()
+stats = {'images': 0, 'lines': 0, 'llm_regions': 0, 'llm_corrections': 0, 'total_s': 0.0}
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for key, amount in amounts.items():
+            stats[key] += amount
+
+
+def _hex(rgb):
+    r, g, b = (int(round(c)) for c in rgb[:3])
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def ocr_words(image):
+    """Word boxes from pytesseract.image_to_data as dicts"""
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    return words_from_ocr_data(data)
+
+
+def image_words(image_data, image=None):
+    """ocr_words() for PNG bytes, shared by concurrent callers on the same image"""
+    key = hashlib.sha256(image_data).hexdigest()
+    if image is None:
+        image = Image.open(BytesIO(image_data)).convert('RGB')
+    words, _ = OCR_FLIGHTS.do(key, lambda: ocr_words(image))
+    return words
+
+
+def words_from_ocr_data(data):
+    words = []
+    for i, raw in enumerate(data.get('text', [])):
+        text = (raw or '').strip()
+        conf = float(data['conf'][i])
+        if not text or conf < 0:
+            continue
+        if conf < NOISE_CONFIDENCE and not any(ch.isalnum() for ch in text):
+            continue
+        words.append({
+            'text': text, 'conf': conf,
+            'left': int(data['left'][i]), 'top': int(data['top'][i]),
+            'width': int(data['width'][i]), 'height': int(data['height'][i]),
+            'line_key': (data['block_num'][i], data['par_num'][i], data['line_num'][i]),
+            'par_key': (data['block_num'][i], data['par_num'][i]),
+        })
+    return words
+
+
+def group_lines(words):
+    """Lines of words in reading order, each with its bounding box and confidence"""
+    lines = {}
+    for word in words:
+        lines.setdefault(word['line_key'], []).append(word)
+    result = []
+    for line_words in lines.values():
+        line_words.sort(key=lambda w: w['left'])
+        left = min(w['left'] for w in line_words)
+        top = min(w['top'] for w in line_words)
+        right = max(w['left'] + w['width'] for w in line_words)
+        bottom = max(w['top'] + w['height'] for w in line_words)
+        chars = sum(len(w['text']) for w in line_words)
+        result.append({
+            'text': ' '.join(w['text'] for w in line_words),
+            'conf': sum(w['conf'] * len(w['text']) for w in line_words) / chars,
+            'box': (left, top, right, bottom),
+            'par_key': line_words[0]['par_key'],
+        })
+    result.sort(key=lambda line: (line['box'][1], line['box'][0]))
+    return result
+
+
+def measure_line(pixels, box):
+    """Colour, baseline, font size and weight of one line from the RGB array"""
+    height, width = pixels.shape[:2]
+    left, top, right, bottom = box
+    inner = pixels[top:bottom, left:right].astype(np.float32)
+
+    # Background: median of a thin ring around the box
+    pt, pb = max(0, top - RING_PADDING), min(height, bottom + RING_PADDING)
+    pl, pr = max(0, left - RING_PADDING), min(width, right + RING_PADDING)
+    padded = pixels[pt:pb, pl:pr].astype(np.float32)
+    ring = np.ones(padded.shape[:2], dtype=bool)
+    ring[top - pt:bottom - pt, left - pl:right - pl] = False
+    background = np.median(padded[ring] if ring.any() else inner.reshape(-1, 3), axis=0)
+
+    distance = np.linalg.norm(inner - background, axis=2)
+    ink = distance > max(INK_MIN_DISTANCE, 0.5 * float(distance.max(initial=0.0)))
+    box_height = bottom - top
+    if not ink.any():
+        # No separable glyphs: black or white, whichever contrasts with the background
+        color = (0, 0, 0) if background.mean() > 127 else (255, 255, 255)
+        return {'color': _hex(color), 'baseline': bottom, 'font_size': box_height, 'bold': False}
+
+    color = np.median(inner[ink], axis=0)
+    rows = ink.sum(axis=1)
+    ink_rows = np.flatnonzero(rows)
+    first_row = int(ink_rows[0])
+    # Descender rows carry much less ink than the body of the line
+    body_rows = np.flatnonzero(rows >= 0.35 * rows.max())
+    baseline_row = int(body_rows[-1]) + 1
+    ascent = baseline_row - first_row
+    font_size = max(ascent / CAP_HEIGHT_RATIO, 0.6 * box_height)
+
+    ink_ratio = ink[first_row:baseline_row].mean() if baseline_row > first_row else 0.0
+    return {
+        'color': _hex(color),
+        'baseline': top + baseline_row,
+        'font_size': font_size,
+        'bold': bool(ink_ratio > BOLD_INK_RATIO),
+    }
+
+
+def paragraph_alignment(lines, image_width):
+    """'start', 'middle' or 'end' per paragraph key from how its line edges line up"""
+    tolerance = max(4, 0.01 * image_width)
+    paragraphs = {}
+    for line in lines:
+        paragraphs.setdefault(line['par_key'], []).append(line['box'])
+    alignment = {}
+    for key, boxes in paragraphs.items():
+        if len(boxes) < 2:
+            alignment[key] = 'start'
+            continue
+        lefts = np.array([b[0] for b in boxes], dtype=float)
+        rights = np.array([b[2] for b in boxes], dtype=float)
+        centers = (lefts + rights) / 2
+        if np.ptp(lefts) <= tolerance:
+            alignment[key] = 'start'
+        elif np.ptp(centers) <= tolerance:
+            alignment[key] = 'middle'
+        elif np.ptp(rights) <= tolerance:
+            alignment[key] = 'end'
+        else:
+            alignment[key] = 'start'
+    return alignment
+
+
+def crop_png(image, box, padding=REGION_PADDING):
+    left, top, right, bottom = box
+    region = image.crop((max(0, left - padding), max(0, top - padding),
+                         min(image.width, right + padding), min(image.height, bottom + padding)))
+    buffer = BytesIO()
+    region.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(lines, width, height, font_family=TEXT_LAYER_FONT_FAMILY):
+    elements = []
+    for line in lines:
+        left, _, right, _ = line['box']
+        anchor = line['anchor']
+        x = {'start': left, 'middle': (left + right) / 2, 'end': right}[anchor]
+        attrs = [f'x="{x:.0f}"', f'y="{line["baseline"]}"', f'font-size="{line["font_size"]:.0f}"',
+                 f'fill="{line["color"]}"']
+        if anchor != 'start':
+            attrs.append(f'text-anchor="{anchor}"')
+        if line['bold']:
+            attrs.append('font-weight="bold"')
+        # Pins the OCR width so a substitute font cannot overflow the layout
+        attrs.append(f'textLength="{right - left}" lengthAdjust="spacingAndGlyphs"')
+        elements.append(f'<text {" ".join(attrs)}>{escape(line["text"])}</text>')
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<g font-family={quoteattr(font_family)}>{"".join(elements)}</g></svg>'
+    )
+
+
+def build_text_svg(image_data, transcribe=None, words=None, min_confidence=TEXT_LAYER_MIN_CONFIDENCE):
+    """Text-only SVG for a PNG; transcribe(png_bytes) -> text or None re-reads low-confidence lines.
+
+    words overrides OCR (as returned by words_from_ocr_data).
+    """
+    start = time.time()
+    image = Image.open(BytesIO(image_data)).convert('RGB')
+    pixels = np.asarray(image)
+    if words is None:
+        words = image_words(image_data, image)
+    lines = group_lines(words)
+    alignment = paragraph_alignment(lines, image.width)
+    for line in lines:
+        line.update(measure_line(pixels, line['box']))
+        line['anchor'] = alignment[line['par_key']]
+
+    weak = sorted((line for line in lines if line['conf'] < min_confidence), key=lambda line: line['conf'])
+    weak = weak[:TEXT_LAYER_MAX_LLM_REGIONS] if transcribe else []
+    corrections = 0
+    if weak:
+        with ThreadPoolExecutor(max_workers=len(weak)) as executor:
+            texts = list(executor.map(lambda line: transcribe(crop_png(image, line['box'])), weak))
+        for line, text in zip(weak, texts):
+            text = ' '.join((text or '').split())
+            if text and text != line['text']:
+                line['text'] = text
+                corrections += 1
+
+    svg_code = render_svg(lines, image.width, image.height)
+    elapsed = time.time() - start
+    _count(images=1, lines=len(lines), llm_regions=len(weak), llm_corrections=corrections, total_s=elapsed)
+    logger.info(f"Text layer: {len(lines)} lines, {len(weak)} sent to the LLM, {corrections} corrected, {elapsed:.2f}s")
+    return svg_code
+
+
+def summary():
+    with _stats_lock:
+        return dict(stats, total_s=round(stats['total_s'], 2), engine=TEXT_LAYER_ENGINE,
+                    min_confidence=TEXT_LAYER_MIN_CONFIDENCE)
@@ -0,0 +1,205 @@
+"""Local text removal: OCR and stroke mask, then plane fill or OpenCV inpainting.
+
+The mask starts from the OCR word boxes. Inside each box only the stroke
+pixels (far from the box's ring-sampled background) are kept, then dilated to
+cover anti-aliasing, so the fill never eats the background around the glyphs.
+Each masked region whose surroundings fit a plane (flat colour or linear
+gradient) is filled with that plane; the rest goes to cv2.inpaint.
+
+Large masks or busy surroundings are where inpainting smears, so the
+mask-complexity heuristic sends those to the remote gpt-image-1 edit instead,
+with the mask restricting what it may change.
+"""
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+
+import text_layer
+
+logger = logging.getLogger(__name__)
+
+# 'auto' picks per image with the complexity heuristic; 'local' and 'remote' force one path
+TEXT_REMOVAL_ENGINE = os.getenv('TEXT_REMOVAL_ENGINE', 'auto')
+TEXT_REMOVAL_INPAINT_METHOD = os.getenv('TEXT_REMOVAL_INPAINT_METHOD', 'telea')
+# Masks covering more of the image than this, or surrounded by more texture, go remote
+TEXT_REMOVAL_MAX_MASK_FRACTION = float(os.getenv('TEXT_REMOVAL_MAX_MASK_FRACTION', '0.2'))
+TEXT_REMOVAL_MAX_TEXTURE = float(os.getenv('TEXT_REMOVAL_MAX_TEXTURE', '25'))
+
+INPAINT_METHODS = {'telea': cv2.INPAINT_TELEA, 'ns': cv2.INPAINT_NS}
+# RMS error (0-255) under which a region's surroundings count as a flat or linear fill
+PLANE_FIT_MAX_RMS = 6.0
+RING_WIDTH = 6
+
+_stats_lock = threading.Lock()
+stats = {'images': 0, 'local': 0, 'remote': 0, 'no_text': 0, 'plane_fills': 0, 'inpainted_regions': 0,
+         'remote_failures': 0, 'local_s': 0.0}
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for key, amount in amounts.items():
+            stats[key] += amount
+
+
+def _encode_png(pixels):
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def text_mask(pixels, words):
+    """uint8 mask (255 = text) of the stroke pixels inside OCR word boxes, dilated"""
+    height, width = pixels.shape[:2]
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for word in words:
+        left, top = max(0, word['left']), max(0, word['top'])
+        right, bottom = min(width, word['left'] + word['width']), min(height, word['top'] + word['height'])
+        if right <= left or bottom <= top:
+            continue
+        box = pixels[top:bottom, left:right].astype(np.float32)
+        pt, pb = max(0, top - RING_WIDTH), min(height, bottom + RING_WIDTH)
+        pl, pr = max(0, left - RING_WIDTH), min(width, right + RING_WIDTH)
+        ring = np.ones((pb - pt, pr - pl), dtype=bool)
+        ring[top - pt:bottom - pt, left - pl:right - pl] = False
+        padded = pixels[pt:pb, pl:pr].astype(np.float32)
+        background = np.median(padded[ring] if ring.any() else box.reshape(-1, 3), axis=0)
+
+        distance = np.linalg.norm(box - background, axis=2)
+        strokes = distance > max(text_layer.INK_MIN_DISTANCE, 0.5 * float(distance.max(initial=0.0)))
+        # Without separable strokes the whole box goes
+        mask[top:bottom, left:right] |= np.where(strokes, 255, 0).astype(np.uint8) if strokes.any() else 255
+
+    # Grow the strokes over their anti-aliased edges, in proportion to the text size
+    heights = [word['height'] for word in words]
+    radius = max(2, int(0.12 * float(np.median(heights)))) if heights else 2
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+    return cv2.dilate(mask, kernel)
+
+
+def surroundings(mask):
+    """Ring of pixels just outside the mask"""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * RING_WIDTH + 1, 2 * RING_WIDTH + 1))
+    return (cv2.dilate(mask, kernel) > 0) & (mask == 0)
+
+
+def mask_complexity(pixels, mask):
+    """(mask fraction, texture) where texture is the mean Laplacian magnitude around the mask"""
+    fraction = float((mask > 0).mean())
+    ring = surroundings(mask)
+    if not ring.any():
+        return fraction, 0.0
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    laplacian = np.abs(cv2.Laplacian(gray, cv2.CV_32F))
+    return fraction, float(laplacian[ring].mean())
+
+
+def choose_engine(fraction, texture):
+    if TEXT_REMOVAL_ENGINE in ('local', 'remote'):
+        return TEXT_REMOVAL_ENGINE
+    if fraction > TEXT_REMOVAL_MAX_MASK_FRACTION or texture > TEXT_REMOVAL_MAX_TEXTURE:
+        return 'remote'
+    return 'local'
+
+
+def fill_local(pixels, mask):
+    """Plane-fill regions with flat or linear surroundings, cv2.inpaint the rest; returns (pixels, counts)"""
+    height, width = mask.shape
+    result = pixels.copy()
+    count, labels, boxes, _ = cv2.connectedComponentsWithStats(mask)
+    leftover = np.zeros_like(mask)
+    plane_fills = 0
+    for label in range(1, count):
+        # Work on the component's box plus the ring around it, not the whole image
+        x, y, w, h = boxes[label, :4]
+        x0, y0 = max(0, x - RING_WIDTH), max(0, y - RING_WIDTH)
+        x1, y1 = min(width, x + w + RING_WIDTH), min(height, y + h + RING_WIDTH)
+        region = (labels[y0:y1, x0:x1] == label).astype(np.uint8) * 255
+        ring = surroundings(region) & (mask[y0:y1, x0:x1] == 0)
+        ys, xs = np.nonzero(ring)
+        if len(ys) < 3:
+            leftover[y0:y1, x0:x1] |= region
+            continue
+        design = np.column_stack([np.ones(len(xs)), xs, ys]).astype(np.float64)
+        values = pixels[y0:y1, x0:x1][ys, xs].astype(np.float64)
+        coefficients, _, _, _ = np.linalg.lstsq(design, values, rcond=None)
+        rms = float(np.sqrt(np.mean((design @ coefficients - values) ** 2)))
+        if rms > PLANE_FIT_MAX_RMS:
+            leftover[y0:y1, x0:x1] |= region
+            continue
+        fy, fx = np.nonzero(region)
+        fitted = np.column_stack([np.ones(len(fx)), fx, fy]) @ coefficients
+        result[y0 + fy, x0 + fx] = np.clip(np.rint(fitted), 0, 255).astype(np.uint8)
+        plane_fills += 1
+
+    inpainted = 0
+    if leftover.any():
+        method = INPAINT_METHODS.get(TEXT_REMOVAL_INPAINT_METHOD, cv2.INPAINT_TELEA)
+        result = cv2.inpaint(result, leftover, 3, method)
+        inpainted = cv2.connectedComponents(leftover)[0] - 1
+    return result, {'plane_fills': plane_fills, 'inpainted_regions': inpainted}
+
+
+def edit_mask_png(mask):
+    """RGBA mask for the remote edit: transparent where text may be replaced"""
+    rgba = np.full(mask.shape + (4,), 255, dtype=np.uint8)
+    rgba[mask > 0, 3] = 0
+    return _encode_png(rgba)
+
+
+def remove_text(image_data, remote=None, words=None):
+    """PNG bytes with the text removed, plus a report of how.
+
+    remote(image_bytes, mask_bytes) -> PNG bytes is the gpt-image-1 fallback;
+    words overrides OCR (as returned by text_layer.words_from_ocr_data).
+    """
+    _count(images=1)
+    image = Image.open(BytesIO(image_data)).convert('RGB')
+    pixels = np.asarray(image)
+    if words is None:
+        try:
+            words = text_layer.image_words(image_data, image)
+        except (pytesseract.TesseractError, OSError) as e:
+            if remote is None:
+                raise
+            logger.warning(f"OCR unavailable for local text removal, using the remote edit: {str(e)}")
+            _count(remote=1)
+            return remote(image_data, None), {'engine': 'remote', 'reason': 'ocr unavailable'}
+
+    if not words:
+        _count(no_text=1)
+        return image_data, {'engine': 'none', 'reason': 'no text found'}
+
+    start = time.time()
+    mask = text_mask(pixels, words)
+    fraction, texture = mask_complexity(pixels, mask)
+    report = {'mask_fraction': round(fraction, 4), 'texture': round(texture, 2)}
+    engine = choose_engine(fraction, texture) if remote is not None else 'local'
+
+    if engine == 'remote':
+        try:
+            edited = remote(image_data, edit_mask_png(mask))
+            _count(remote=1)
+            logger.info(f"Text removal: remote edit (mask {fraction:.1%}, texture {texture:.1f})")
+            return edited, dict(report, engine='remote')
+        except Exception as e:
+            # The local result is worse on busy backgrounds but better than failing the stage
+            logger.warning(f"Remote text removal failed, inpainting locally: {str(e)}")
+            _count(remote_failures=1)
+
+    filled, counts = fill_local(pixels, mask)
+    elapsed = time.time() - start
+    _count(local=1, local_s=elapsed, **counts)
+    logger.info(f"Text removal: local in {elapsed:.2f}s (mask {fraction:.1%}, texture {texture:.1f}, {counts})")
+    return _encode_png(filled), dict(report, engine='local', **counts)
+
+
+def summary():
+    with _stats_lock:
+        return dict(stats, local_s=round(stats['local_s'], 2), engine=TEXT_REMOVAL_ENGINE)
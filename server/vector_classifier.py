@@ -0,0 +1,240 @@
+"""Local vector-suitability classifier with an LLM fallback.
+
+A request is turned into a handful of keyword and regex features (photo and
+3D-render vocabulary against poster, typography and flat-style vocabulary)
+and scored with a small logistic model. Confident scores are answered locally;
+only the uncertain band between the two thresholds is sent to the LLM. Every
+decision is appended to a JSONL log, and the LLM's answers are the labels the
+model is retrained on:
+
+    python vector_classifier.py
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from response_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+VECTOR_CLASSIFIER_ENABLED = os.getenv('VECTOR_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+VECTOR_CLASSIFIER_MODEL_PATH = os.getenv('VECTOR_CLASSIFIER_MODEL_PATH', os.path.join(CACHE_DIR, 'vector_classifier.json'))
+VECTOR_DECISIONS_PATH = os.getenv('VECTOR_DECISIONS_PATH', os.path.join(CACHE_DIR, 'vector_decisions.jsonl'))
+# P(suitable) at or above this is answered "suitable" locally, at or below the
+# other "not suitable"; anything in between goes to the LLM
+VECTOR_SUITABLE_ABOVE = float(os.getenv('VECTOR_SUITABLE_ABOVE', '0.8'))
+VECTOR_UNSUITABLE_BELOW = float(os.getenv('VECTOR_UNSUITABLE_BELOW', '0.15'))
+VECTOR_MIN_TRAINING_LABELS = int(os.getenv('VECTOR_MIN_TRAINING_LABELS', '50'))
+
+FEATURES = {
+    'photo': r'\b(photos?|photographs?|photo-?realistic|realistic|hyper-?realistic|lifelike|dslr|camera|lens|bokeh|8k|hdr)\b',
+    'render_3d': r'\b(3d|render|rendered|rendering|octane|unreal engine|blender|cgi|ray-?tracing)\b',
+    'painterly': r'\b(oil painting|watercolou?r|painting|brush ?strokes?|impasto|charcoal|textured?|grainy)\b',
+    'scene': r'\b(landscape|portrait|scene|crowd|selfie|close-?up|street|sunset|forest|cityscape)\b',
+    'detail': r'\b(intricate|highly detailed|ultra[- ]detailed|fine details?|hair|fur|skin)\b',
+    'graphic_format': r'\b(logo|icon|poster|flyer|banner|badge|sticker|infographic|card|label|emblem|certificate|menu|invitation|thumbnail)\b',
+    'typography': r'\b(text|typography|headline|heading|title|font|lettering|quote|testimonial|coming soon|announcement|sale|discount)\b',
+    'flat_style': r'\b(flat|minimal|minimalist|geometric|vector|svg|line art|outline|simple|clean|cartoon|illustration|mascot|shapes?)\b',
+    'hex_color': r'#[0-9a-fA-F]{3,6}\b',
+}
+_FEATURE_RES = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in FEATURES.items()}
+# Counts are capped so one long prompt cannot swamp the bias
+FEATURE_CAP = 2
+
+# Starting weights on the logit of P(suitable), used until a trained model exists
+DEFAULT_WEIGHTS = {
+    'bias': 1.0,
+    'photo': -2.5,
+    'render_3d': -2.0,
+    'painterly': -1.5,
+    'scene': -0.8,
+    'detail': -0.8,
+    'graphic_format': 1.8,
+    'typography': 1.2,
+    'flat_style': 1.5,
+    'hex_color': 0.8,
+}
+
+_GUIDANCE_REASONS = {
+    'photo': 'a photograph or photorealistic image',
+    'render_3d': 'a 3D render',
+    'painterly': 'a painted or textured artwork',
+    'scene': 'a detailed scene',
+    'detail': 'very fine detail',
+}
+
+
+def features(prompt):
+    return {name: min(len(pattern.findall(prompt)), FEATURE_CAP) for name, pattern in _FEATURE_RES.items()}
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+
+def guidance(feature_values):
+    """Local explanation for a request classified as not suitable"""
+    reasons = [text for name, text in _GUIDANCE_REASONS.items() if feature_values.get(name)]
+    looks_like = ' and '.join(reasons) if reasons else 'a complex raster image'
+    return (f"This request looks like {looks_like}, which SVG vector graphics cannot reproduce well. "
+            "Consider a flat, graphic version instead: a poster, illustration, icon or typographic design "
+            "with clear shapes and a limited colour palette.")
+
+
+class VectorClassifier:
+    """Logistic model over prompt features with a decision log for retraining"""
+
+    def __init__(self, weights=None, decisions_path=VECTOR_DECISIONS_PATH,
+                 suitable_above=VECTOR_SUITABLE_ABOVE, unsuitable_below=VECTOR_UNSUITABLE_BELOW):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.decisions_path = decisions_path
+        if decisions_path:
+            os.makedirs(os.path.dirname(decisions_path), exist_ok=True)
+        self.suitable_above = suitable_above
+        self.unsuitable_below = unsuitable_below
+        self._lock = threading.Lock()
+        self.stats = {'local_suitable': 0, 'local_unsuitable': 0, 'escalated': 0, 'llm_errors': 0}
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        weights = None
+        try:
+            with open(path) as f:
+                weights = json.load(f)['weights']
+            logger.info(f"Loaded vector classifier weights from {path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Vector classifier weights not loaded from {path}: {str(e)}")
+        return cls(weights, **kwargs)
+
+    def probability(self, prompt, feature_values=None):
+        """P(request is suitable for SVG)"""
+        feature_values = feature_values or features(prompt)
+        z = self.weights['bias'] + sum(self.weights.get(name, 0.0) * value for name, value in feature_values.items())
+        return _sigmoid(z)
+
+    def check(self, prompt, ask_llm):
+        """Suitability decision; ask_llm(prompt) -> {"not_suitable", "guidance"} or None runs only when uncertain"""
+        feature_values = features(prompt)
+        p = self.probability(prompt, feature_values)
+        if p >= self.suitable_above:
+            decision = {'not_suitable': False, 'guidance': None}
+            source = 'local'
+            self._count('local_suitable')
+        elif p <= self.unsuitable_below:
+            decision = {'not_suitable': True, 'guidance': guidance(feature_values)}
+            source = 'local'
+            self._count('local_unsuitable')
+        else:
+            self._count('escalated')
+            decision = ask_llm(prompt)
+            source = 'llm'
+            if decision is None:
+                self._count('llm_errors')
+                # Default to allowing if the check fails, and keep it out of the training labels
+                return {'not_suitable': False, 'guidance': None, 'source': 'default', 'confidence': round(p, 3)}
+
+        self.record(prompt, decision['not_suitable'], source, p)
+        logger.info(f"Vector suitability ({source}, p={p:.2f}): {'not suitable' if decision['not_suitable'] else 'suitable'}")
+        return dict(decision, source=source, confidence=round(p, 3))
+
+    def record(self, prompt, not_suitable, source, probability):
+        if not self.decisions_path:
+            return
+        entry = {'prompt': prompt, 'not_suitable': not_suitable, 'source': source,
+                 'probability': round(probability, 4), 'time': time.time()}
+        try:
+            with self._lock:
+                with open(self.decisions_path, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not log vector suitability decision: {str(e)}")
+
+    def train(self, examples, epochs=300, learning_rate=0.1, l2=0.01):
+        """Fit the weights to (prompt, not_suitable) pairs by gradient descent from the current weights"""
+        rows = [(features(prompt), 0.0 if not_suitable else 1.0) for prompt, not_suitable in examples]
+        if not rows:
+            return self.weights
+        weights = dict(self.weights)
+        for _ in range(epochs):
+            gradient = dict.fromkeys(weights, 0.0)
+            for feature_values, label in rows:
+                z = weights['bias'] + sum(weights.get(name, 0.0) * value for name, value in feature_values.items())
+                error = _sigmoid(z) - label
+                gradient['bias'] += error
+                for name, value in feature_values.items():
+                    gradient[name] = gradient.get(name, 0.0) + error * value
+            for name in gradient:
+                penalty = 0.0 if name == 'bias' else l2 * weights.get(name, 0.0)
+                weights[name] = weights.get(name, 0.0) - learning_rate * (gradient[name] / len(rows) + penalty)
+        self.weights = weights
+        return weights
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        decided = sum(stats.values()) - stats['llm_errors']
+        local = stats['local_suitable'] + stats['local_unsuitable']
+        return dict(stats, local_rate=round(local / decided, 3) if decided else None,
+                    suitable_above=self.suitable_above, unsuitable_below=self.unsuitable_below)
+
+
+def load_labels(path=VECTOR_DECISIONS_PATH):
+    """(prompt, not_suitable) pairs from the LLM decisions in the log, latest label per prompt"""
+    labels = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('source') == 'llm':
+                    labels[entry['prompt']] = entry['not_suitable']
+    except FileNotFoundError:
+        pass
+    return list(labels.items())
+
+
+def retrain(decisions_path=VECTOR_DECISIONS_PATH, model_path=VECTOR_CLASSIFIER_MODEL_PATH):
+    """Retrain from the logged LLM labels and save the weights; returns the number of labels used"""
+    labels = load_labels(decisions_path)
+    if len(labels) < VECTOR_MIN_TRAINING_LABELS:
+        logger.info(f"Only {len(labels)} labelled decisions, need {VECTOR_MIN_TRAINING_LABELS} to retrain")
+        return 0
+    model = VectorClassifier.load(model_path, decisions_path=None)
+    weights = model.train(labels)
+    tmp_path = f"{model_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'weights': weights, 'trained_on': len(labels), 'trained_at': time.time()}, f, indent=2)
+    os.replace(tmp_path, model_path)
+    logger.info(f"Retrained vector classifier on {len(labels)} decisions")
+    return len(labels)
+
+
+classifier = VectorClassifier.load(VECTOR_CLASSIFIER_MODEL_PATH)
+
+
+def check(prompt, ask_llm):
+    """classifier.check(), or the LLM alone when the classifier is off"""
+    if not VECTOR_CLASSIFIER_ENABLED:
+        return ask_llm(prompt) or {'not_suitable': False}
+    return classifier.check(prompt, ask_llm)
+
+
+def summary():
+    return classifier.summary() if VECTOR_CLASSIFIER_ENABLED else {'enabled': False}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Retrained on {retrain()} labelled decisions")
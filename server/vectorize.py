@@ -0,0 +1,81 @@
+"""In-memory vectorization with vtracer.
+
+vtracer's file entry point needs an input PNG and an output SVG on disk, so
+every conversion used to cost a temp file in the working directory, an SVG
+under IMAGES_DIR and a read back. Its raw entry point takes encoded bytes
+and returns the SVG as a string (PIL images and arrays are encoded to PNG in
+memory first); persisting it, if at all, is left to the caller (save_svg
+into the session folder).
+"""
+import logging
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import vtracer
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Settings tuned for generated poster artwork, shared by every vtracer caller
+VTRACER_OPTIONS = {
+    'colormode': 'color',         # Use color mode for richer output
+    'hierarchical': 'stacked',    # Use stacked mode for better layering
+    'mode': 'spline',             # Use spline mode for smoother curves
+    'filter_speckle': 4,          # Remove small artifacts
+    'color_precision': 6,         # Good balance of color accuracy
+    'layer_difference': 16,       # Reasonable layer separation
+    'corner_threshold': 60,       # Balanced corner detection
+    'length_threshold': 4.0,      # Good detail preservation
+    'max_iterations': 10,         # Sufficient optimization
+    'splice_threshold': 45,       # Good path connection
+    'path_precision': 3,          # Compact but accurate paths
+}
+
+_stats_lock = threading.Lock()
+stats = {'conversions': 0, 'from_bytes': 0, 'from_pixels': 0, 'svg_bytes': 0, 'total_s': 0.0}
+
+
+def _png_bytes(image):
+    """PNG bytes for a PIL image or an RGB/RGBA/grayscale array.
+
+    vtracer's pixel entry point wants a Python list with one tuple per pixel;
+    a fast in-memory PNG encode is far cheaper than building that list.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def image_to_svg(image, **options):
+    """SVG markup for encoded image bytes, a PIL image or a pixel array.
+
+    options override VTRACER_OPTIONS for this call.
+    """
+    start = time.time()
+    settings = dict(VTRACER_OPTIONS, **options)
+    if isinstance(image, (bytes, bytearray)):
+        data = bytes(image)
+        image_format = (Image.open(BytesIO(data)).format or 'png').lower()
+        source = 'from_bytes'
+    else:
+        data, image_format = _png_bytes(image), 'png'
+        source = 'from_pixels'
+    svg_code = vtracer.convert_raw_image_to_svg(data, img_format=image_format, **settings)
+
+    elapsed = time.time() - start
+    with _stats_lock:
+        stats['conversions'] += 1
+        stats[source] += 1
+        stats['svg_bytes'] += len(svg_code)
+        stats['total_s'] += elapsed
+    logger.info(f"Vectorized in memory: {len(svg_code)} bytes of SVG in {elapsed:.2f}s")
+    return svg_code
+
+
+def summary():
+    with _stats_lock:
+        return dict(stats, total_s=round(stats['total_s'], 2))
@@ -0,0 +1,243 @@
+"""Per-image vtracer parameter search scored by raster fidelity.
+
+The shared VTRACER_OPTIONS are tuned for detailed artwork and over-trace
+simple posters. In 'auto' mode a ladder of coarser candidate settings is
+vectorized in parallel, each SVG is rendered back with cairosvg and scored
+against the source (SSIM on luminance, mean CIE76 delta E on colour), and
+the smallest SVG that meets the fidelity target and the byte/path budget
+wins. The winner is cached per image class (colour count x edge density),
+so later images of the class need one conversion plus one check instead of
+a search.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import vectorize
+from response_cache import CACHE_DIR
+
+try:
+    import cairosvg
+except (ImportError, OSError):
+    # cairosvg raises OSError at import when the cairo library itself is missing
+    cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+# 'auto' searches per image class, 'off' always uses vectorize.VTRACER_OPTIONS
+VTRACER_TUNING = os.getenv('VTRACER_TUNING', 'auto')
+VTRACER_TUNING_MIN_SSIM = float(os.getenv('VTRACER_TUNING_MIN_SSIM', '0.9'))
+VTRACER_TUNING_MAX_DELTA_E = float(os.getenv('VTRACER_TUNING_MAX_DELTA_E', '6'))
+VTRACER_TUNING_MAX_BYTES = int(os.getenv('VTRACER_TUNING_MAX_BYTES', '300000'))
+VTRACER_TUNING_MAX_PATHS = int(os.getenv('VTRACER_TUNING_MAX_PATHS', '800'))
+VTRACER_TUNING_WORKERS = int(os.getenv('VTRACER_TUNING_WORKERS', '4'))
+VTRACER_PRESETS_PATH = os.getenv('VTRACER_PRESETS_PATH', os.path.join(CACHE_DIR, 'vtracer_presets.json'))
+
+# Overrides of vectorize.VTRACER_OPTIONS from coarsest to the shared settings themselves
+CANDIDATES = (
+    {'filter_speckle': 24, 'color_precision': 4, 'layer_difference': 64, 'length_threshold': 8.0, 'path_precision': 1},
+    {'filter_speckle': 16, 'color_precision': 5, 'layer_difference': 48, 'length_threshold': 6.0, 'path_precision': 2},
+    {'filter_speckle': 10, 'color_precision': 5, 'layer_difference': 32, 'path_precision': 2},
+    {'filter_speckle': 6, 'color_precision': 6, 'layer_difference': 24, 'path_precision': 2},
+    {},
+)
+# Sources are compared at this size; fidelity differences that matter survive the downscale
+SCORE_SIZE = 256
+# Colours covering less than this share of the image are anti-aliasing, not palette
+COLOR_MIN_SHARE = 0.001
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+_stats_lock = threading.Lock()
+stats = {'images': 0, 'searches': 0, 'cache_hits': 0, 'cache_rejections': 0, 'untuned': 0,
+         'default_bytes': 0, 'chosen_bytes': 0, 'total_s': 0.0}
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for key, amount in amounts.items():
+            stats[key] += amount
+
+
+def _score_pixels(pixels):
+    """RGB array downscaled so its longer side is SCORE_SIZE"""
+    height, width = pixels.shape[:2]
+    scale = SCORE_SIZE / max(height, width)
+    if scale >= 1:
+        return pixels
+    return cv2.resize(pixels, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def image_stats(pixels):
+    """Palette size (5 bits per channel, ignoring rare colours) and Canny edge density"""
+    quantized = (pixels >> 3).astype(np.int32)
+    codes = (quantized[..., 0] << 10) | (quantized[..., 1] << 5) | quantized[..., 2]
+    counts = np.bincount(codes.ravel(), minlength=1 << 15)
+    colors = int((counts >= COLOR_MIN_SHARE * codes.size).sum())
+    edges = cv2.Canny(cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY), 100, 200)
+    return {'colors': colors, 'edge_density': round(float((edges > 0).mean()), 4)}
+
+
+def image_class(measured):
+    palette = 'few' if measured['colors'] <= 16 else 'some' if measured['colors'] <= 64 else 'many'
+    density = measured['edge_density']
+    edges = 'low' if density < 0.02 else 'mid' if density < 0.06 else 'high'
+    return f'{palette}-{edges}'
+
+
+def _blur(image):
+    return cv2.GaussianBlur(image, (11, 11), 1.5)
+
+
+def ssim(a, b):
+    """Mean SSIM of two RGB arrays on luminance, with the usual 11x11 Gaussian window"""
+    x = cv2.cvtColor(a, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    y = cv2.cvtColor(b, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    mx, my = _blur(x), _blur(y)
+    vx, vy, cov = _blur(x * x) - mx * mx, _blur(y * y) - my * my, _blur(x * y) - mx * my
+    index = ((2 * mx * my + SSIM_C1) * (2 * cov + SSIM_C2)) / ((mx * mx + my * my + SSIM_C1) * (vx + vy + SSIM_C2))
+    return float(index.mean())
+
+
+def delta_e(a, b):
+    """Mean CIE76 colour difference of two RGB arrays"""
+    lab_a, lab_b = (cv2.cvtColor(image.astype(np.float32) / 255.0, cv2.COLOR_RGB2Lab) for image in (a, b))
+    return float(np.linalg.norm(lab_a - lab_b, axis=2).mean())
+
+
+def render_svg(svg_code, size):
+    """Rasterize with cairosvg to an RGB array of size (width, height), composited on white"""
+    png = cairosvg.svg2png(bytestring=svg_code.encode('utf-8'), output_width=size[0], output_height=size[1])
+    rendered = Image.open(BytesIO(png)).convert('RGBA')
+    background = Image.new('RGBA', rendered.size, (255, 255, 255, 255))
+    return np.asarray(Image.alpha_composite(background, rendered).convert('RGB'))
+
+
+def fidelity_ok(result):
+    return result['ssim'] >= VTRACER_TUNING_MIN_SSIM and result['delta_e'] <= VTRACER_TUNING_MAX_DELTA_E
+
+
+def within_budget(result):
+    return result['bytes'] <= VTRACER_TUNING_MAX_BYTES and result['paths'] <= VTRACER_TUNING_MAX_PATHS
+
+
+def choose(results):
+    """Smallest result meeting fidelity and budget, else smallest meeting fidelity, else the most faithful"""
+    for eligible in (lambda r: fidelity_ok(r) and within_budget(r), fidelity_ok):
+        passing = [r for r in results if eligible(r)]
+        if passing:
+            return min(passing, key=lambda r: r['bytes'])
+    return max(results, key=lambda r: (r['ssim'], -r['delta_e']))
+
+
+class PresetCache:
+    """Winning candidate index per image class, kept in a small JSON file"""
+
+    def __init__(self, path=VTRACER_PRESETS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._presets = {}
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with open(path) as f:
+                    self._presets = {key: int(value) for key, value in json.load(f).items()}
+            except (OSError, ValueError):
+                self._presets = {}
+
+    def get(self, key):
+        with self._lock:
+            index = self._presets.get(key)
+        return index if index is not None and 0 <= index < len(CANDIDATES) else None
+
+    def put(self, key, index):
+        with self._lock:
+            self._presets[key] = index
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._presets, f)
+            os.replace(tmp_path, self.path)
+
+    def summary(self):
+        with self._lock:
+            return dict(self._presets)
+
+
+preset_cache = PresetCache()
+
+
+def _trial(image_data, source, index, render):
+    """Vectorize with one candidate and score its rendering, made at the source's score size"""
+    svg_code = vectorize.image_to_svg(image_data, **CANDIDATES[index])
+    rendered = render(svg_code, (source.shape[1], source.shape[0]))
+    return {
+        'index': index,
+        'svg': svg_code,
+        'bytes': len(svg_code.encode('utf-8')),
+        'paths': svg_code.count('<path'),
+        'ssim': round(ssim(source, rendered), 4),
+        'delta_e': round(delta_e(source, rendered), 2),
+    }
+
+
+def image_to_svg(image_data, render=None, cache=None):
+    """SVG for encoded image bytes with parameters tuned to the image; returns (svg_code, report).
+
+    render(svg_code, (width, height)) -> RGB array rasterizes candidates (cairosvg by default);
+    they are rendered straight at the score size, never at the full source size.
+    """
+    render = render or (render_svg if cairosvg is not None else None)
+    if VTRACER_TUNING != 'auto' or render is None:
+        _count(images=1, untuned=1)
+        return vectorize.image_to_svg(image_data), {'tuned': False}
+
+    start = time.time()
+    cache = cache or preset_cache
+    pixels = np.asarray(Image.open(BytesIO(image_data)).convert('RGB'))
+    source = _score_pixels(pixels)
+    measured = image_stats(source)
+    key = image_class(measured)
+    report = dict(measured, image_class=key, tuned=True)
+
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            result = _trial(image_data, source, cached, render)
+            if fidelity_ok(result) and within_budget(result):
+                _count(images=1, cache_hits=1, total_s=time.time() - start)
+                return result['svg'], dict(report, preset=cached, cached=True,
+                                           **{k: result[k] for k in ('bytes', 'paths', 'ssim', 'delta_e')})
+            _count(cache_rejections=1)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(VTRACER_TUNING_WORKERS, len(CANDIDATES)))) as executor:
+            results = list(executor.map(lambda index: _trial(image_data, source, index, render), range(len(CANDIDATES))))
+    except Exception as e:
+        # A candidate that vtracer or the renderer chokes on must not cost the layer
+        logger.warning(f"vtracer tuning failed, using the shared settings: {str(e)}")
+        _count(images=1, untuned=1)
+        return vectorize.image_to_svg(image_data), {'tuned': False}
+
+    best = choose(results)
+    cache.put(key, best['index'])
+    elapsed = time.time() - start
+    _count(images=1, searches=1, default_bytes=results[-1]['bytes'], chosen_bytes=best['bytes'], total_s=elapsed)
+    logger.info(f"vtracer tuning ({key}): preset {best['index']}, {best['bytes']} bytes / {best['paths']} paths "
+                f"vs {results[-1]['bytes']} / {results[-1]['paths']} untuned, SSIM {best['ssim']}, dE {best['delta_e']}, {elapsed:.2f}s")
+    return best['svg'], dict(report, preset=best['index'], cached=False,
+                             **{k: best[k] for k in ('bytes', 'paths', 'ssim', 'delta_e')})
+
+
+def summary():
+    with _stats_lock:
+        return dict(stats, total_s=round(stats['total_s'], 2), mode=VTRACER_TUNING,
+                    renderer_available=cairosvg is not None, presets=preset_cache.summary())
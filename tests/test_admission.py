@@ -0,0 +1,39 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from admission import AdmissionController, Rejected
+
+
+def test_rejects_when_slots_and_queue_are_full():
+    controller = AdmissionController(limits={'e': {'max_in_flight': 1, 'max_queued': 1, 'memory_mb': 10}})
+    started = controller.acquire('e')
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.acquire('e', timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire('e')
+    assert rejected.value.reason == 'queue full' and rejected.value.retry_after >= 1
+
+    controller.release('e', started)
+    waiter.join()
+    assert admitted and controller.summary()['endpoints']['e']['in_flight'] == 1
+
+
+def test_memory_budget_is_shared_across_endpoints():
+    controller = AdmissionController(memory_budget_mb=100, limits={
+        'a': {'max_in_flight': 5, 'memory_mb': 60},
+        'b': {'max_in_flight': 5, 'memory_mb': 60}
+    })
+    controller.acquire('a')
+    with pytest.raises(Rejected) as rejected:
+        controller.acquire('b', timeout=0.1)
+    assert rejected.value.reason == 'queue timeout'
+    assert controller.summary()['memory_in_use_mb'] == 60
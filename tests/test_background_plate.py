@@ -0,0 +1,79 @@
+import os
+import re
+import sys
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from background_plate import estimate_plate
+
+SIZE = 256
+
+
+def poster_png(pixels):
+    """Background with a white headline bar and a green disc on top"""
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((50, 50, 150, 80), fill=(255, 255, 255))
+    draw.ellipse((150, 150, 210, 210), fill=(0, 200, 0))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def stop_colors(layer):
+    return [tuple(int(h[i:i + 2], 16) for i in (0, 2, 4)) for h in re.findall(r'stop-color="#(\w{6})"', layer)]
+
+
+def coordinates():
+    return np.meshgrid((np.arange(SIZE) + 0.5) / SIZE, (np.arange(SIZE) + 0.5) / SIZE)
+
+
+def test_flat_background_is_a_solid_rect():
+    plate = estimate_plate(poster_png(np.full((SIZE, SIZE, 3), (20, 40, 90))))
+    assert plate['kind'] == 'solid'
+    assert plate['layer'] == '<rect x="0" y="0" width="100%" height="100%" fill="#14285a"/>'
+
+
+def test_vertical_gradient_becomes_a_linear_gradient():
+    _, v = coordinates()
+    pixels = np.array([10, 20, 200]) + v[..., None] * np.array([240, 100, -170])
+    plate = estimate_plate(poster_png(pixels))
+    assert plate['kind'] == 'linear' and plate['rms'] < 2
+    assert 'x1="0.500" y1="0.000" x2="0.500" y2="1.000"' in plate['layer']
+    start, end = stop_colors(plate['layer'])
+    assert np.abs(np.subtract(start, (10, 20, 200))).max() <= 2
+    assert np.abs(np.subtract(end, (250, 120, 30))).max() <= 2
+
+
+def test_diagonal_gradient_spans_corner_to_corner():
+    u, v = coordinates()
+    t = (u + v) / 2
+    pixels = np.array([10, 20, 200]) + t[..., None] * np.array([240, 100, -170])
+    plate = estimate_plate(poster_png(pixels))
+    assert plate['kind'] == 'linear' and plate['rms'] < 2
+    x1, y1, x2, y2 = (float(value) for value in
+                      re.search(r'x1="([\d.-]+)" y1="([\d.-]+)" x2="([\d.-]+)" y2="([\d.-]+)"', plate['layer']).groups())
+    assert np.allclose((x1, y1, x2, y2), (0, 0, 1, 1), atol=0.01)
+    # SVG's position along the gradient vector at (0.75, 0.75) matches the fitted ramp there
+    svg_t = ((0.75 - x1) * (x2 - x1) + (0.75 - y1) * (y2 - y1)) / ((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    assert abs(svg_t - 0.75) < 0.01
+
+
+def test_vignette_becomes_a_radial_gradient():
+    u, v = coordinates()
+    t = np.hypot(u - 0.5, v - 0.5) / np.hypot(0.5, 0.5)
+    pixels = np.array([240, 200, 60]) + t[..., None] * np.array([-210, -190, 20])
+    plate = estimate_plate(poster_png(pixels))
+    assert plate['kind'] == 'radial'
+    assert 'cx="0.500" cy="0.500"' in plate['layer']
+
+
+def test_unfittable_background_is_a_small_inline_png():
+    rng = np.random.default_rng(0)
+    plate = estimate_plate(poster_png(rng.integers(0, 255, (SIZE, SIZE, 3))))
+    assert plate['kind'] == 'image'
+    assert plate['layer'].startswith('<image ') and 'data:image/png;base64,' in plate['layer']
@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+import time
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from batch_runner import run_batch
+from singleflight import SingleFlight
+
+
+def test_identical_prompts_run_once():
+    runs = []
+
+    def run_one(prompt):
+        runs.append(prompt)
+        return prompt.upper()
+
+    items, unique, succeeded = run_batch(['a', 'b', 'a'], run_one, threading.Semaphore(2), 2)
+    assert sorted(runs) == ['a', 'b'] and (unique, succeeded) == (2, 2)
+    assert items[2]['duplicate_of'] == 0 and items[2]['result'] == 'A' and items[2]['index'] == 2
+
+
+def test_overlapping_prompts_share_identical_stage_calls():
+    # Two variants of one campaign whose first stage sees the same input
+    flights, stage_calls = SingleFlight('test-batch'), []
+
+    def shared_stage(brief):
+        stage_calls.append(brief)
+        # Hold the call open until the other variant has joined it
+        deadline = time.time() + 2
+        while flights.summary()['followers'] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        return f'plan for {brief}'
+
+    def run_one(prompt):
+        brief, variant = prompt.split(' / ')
+        plan, _ = flights.do(brief, lambda: shared_stage(brief))
+        return f'{plan}, {variant}'
+
+    items, unique, _ = run_batch(['Summer sale / red', 'Summer sale / blue'], run_one, threading.Semaphore(2), 2)
+    assert unique == 2 and stage_calls == ['Summer sale']
+    assert [item['result'] for item in items] == ['plan for Summer sale, red', 'plan for Summer sale, blue']
+
+
+def test_failed_item_is_reported_not_raised():
+    def run_one(prompt):
+        raise RuntimeError('boom')
+
+    items, _, succeeded = run_batch(['x'], run_one, threading.Semaphore(1), 1)
+    assert succeeded == 0 and items[0]['status'] == 'failed' and items[0]['error'] == 'boom'
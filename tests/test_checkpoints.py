@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from checkpoints import StageCheckpoints, valid_session_id
+
+
+def test_round_trip_keeps_tuples_and_skips_binary_outputs():
+    store = StageCheckpoints(tempfile.mkdtemp())
+    store.save_request({'user_input': 'poster'})
+    assert store.save('initial_image', ('a.png', 'sessions/x/a.png', '/abs/a.png'))
+    assert store.save('design_plan', 'plan')
+    assert not store.save('image_data', b'\x89PNG')
+
+    assert store.exists() and store.load_request() == {'user_input': 'poster'}
+    assert store.load() == {'initial_image': ('a.png', 'sessions/x/a.png', '/abs/a.png'), 'design_plan': 'plan'}
+    store.discard(['design_plan'])
+    assert store.load(exclude=('initial_image',)) == {}
+
+
+def test_session_ids_cannot_escape_the_storage_dir():
+    assert valid_session_id('parallel_20250101_120000_abcd1234')
+    assert not valid_session_id('../etc') and not valid_session_id('a/b') and not valid_session_id(None)
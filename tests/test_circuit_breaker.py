@@ -0,0 +1,30 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, is_failure
+
+
+def test_failures_are_provider_side_only():
+    assert is_failure(0, 1) and is_failure(429, 1) and is_failure(503, 1)
+    assert not is_failure(400, 1) and not is_failure(200, 1)
+    assert is_failure(200, circuit_breaker.CIRCUIT_SLOW_CALL_SECONDS + 1)
+
+
+def test_opens_on_error_rate_and_recovers_through_probe():
+    breaker = CircuitBreaker('test:model')
+    for _ in range(circuit_breaker.CIRCUIT_MIN_CALLS):
+        assert breaker.allow()
+        breaker.record(503, 1)
+    assert breaker.state == circuit_breaker.OPEN
+    assert not breaker.allow()
+
+    # Pretend the open period has elapsed
+    breaker.opened_at -= circuit_breaker.CIRCUIT_OPEN_SECONDS
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(200, 1)
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.summary()['opened'] == 1
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from context_compressor import ContextCompressor, estimate_tokens
+
+CONTEXT = """Design Plan:
+- Headline "FRESH BREAD" in Playfair Display, 96px, color #3B2F2F.
+- A croissant illustration in the center.
+
+Design Knowledge and Best Practices:
+""" + "\n".join([
+    "1. It is important to keep visual hierarchy clear. Always ensure readability for the user experience.",
+    "2. Bakery brands often use warm tones like #C68B59 with script fonts such as Pacifico.",
+] * 20) + """
+
+Original Request:
+bakery poster with a croissant"""
+
+
+def test_keeps_specific_sentences_and_protected_sections_within_budget():
+    compressor = ContextCompressor({'stage': 80})
+    compressed = compressor.compress(CONTEXT, 'stage', protect=('Original Request',))
+
+    assert estimate_tokens(compressed) <= 80
+    assert compressed.endswith("Original Request:\nbakery poster with a croissant")
+    assert 'FRESH BREAD' in compressed and 'croissant illustration' in compressed
+    assert compressed.count('#C68B59') <= 1
+    assert 'readability' not in compressed
+    assert compressor.summary()['stage']['tokens_saved'] > 0
+    # Deterministic, so response-cache keys stay stable
+    assert compressor.compress(CONTEXT, 'stage', protect=('Original Request',)) == compressed
+
+
+def test_text_within_budget_is_unchanged():
+    compressor = ContextCompressor({'stage': 10000})
+    assert compressor.compress(CONTEXT, 'stage') == CONTEXT
+    assert compressor.compress(CONTEXT, 'unbudgeted_stage') == CONTEXT
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from design_brief import design_knowledge, request_brief, validate
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.ok = True
+        self.error = None
+        self.content = json.dumps(data)
+
+
+BRIEF = {
+    'design_plan': 'Centered layout. ' * 20,
+    'typography': 'Montserrat 700 for the heading, Open Sans 400 for the body text, centered.',
+    'palette': [{'role': 'background', 'hex': '#0B3D2E'}, {'role': 'text', 'hex': '#FFFFFF'},
+                {'role': 'accent', 'hex': '#F2A541'}],
+    'image_prompt': 'A dark green coming soon poster. ' * 10,
+    'svg_spec': 'viewBox 0 0 1024 1024 with a rect background. ' * 6,
+}
+
+
+def scripted_chat(replies):
+    calls = []
+
+    def chat(messages, response_format):
+        calls.append((messages, response_format))
+        return FakeResult(replies[len(calls) - 1])
+    return chat, calls
+
+
+def test_valid_brief_takes_one_call():
+    chat, calls = scripted_chat([BRIEF])
+    assert request_brief('coming soon poster', chat) == BRIEF
+    assert len(calls) == 1
+    assert 'Typography:\nMontserrat' in design_knowledge(BRIEF)
+    assert '- accent: #F2A541' in design_knowledge(BRIEF)
+
+
+def test_reask_covers_only_failing_fields():
+    broken = dict(BRIEF, typography='Sans', palette=[{'role': 'background', 'hex': 'green'}])
+    chat, calls = scripted_chat([broken, {'typography': BRIEF['typography'], 'palette': BRIEF['palette']}])
+    assert request_brief('coming soon poster', chat) == BRIEF
+
+    followup_schema = calls[1][1]['json_schema']['schema']
+    assert followup_schema['required'] == ['typography', 'palette']
+    assert 'typography' in calls[1][0][-1]['content'] and 'svg_spec' not in calls[1][0][-1]['content']
+
+
+def test_brief_still_invalid_after_reasks_raises():
+    chat, calls = scripted_chat([{}, {}, {}])
+    with pytest.raises(ValueError):
+        request_brief('coming soon poster', chat, max_reasks=2)
+    assert len(calls) == 3
+    assert set(validate({})) == {'design_plan', 'typography', 'palette', 'image_prompt', 'svg_spec'}
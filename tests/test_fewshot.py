@@ -0,0 +1,32 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from fewshot import ExampleIndex, format_examples
+
+EXAMPLES = [
+    {'id': 't1', 'category': 'testimonial', 'text': 'Teal background, beige container, orange circles'},
+    {'id': 't2', 'category': 'testimonial', 'text': 'Mint background, five blue stars for ratings', 'summary': 'Mint, stars'},
+    {'id': 'c1', 'category': 'coming_soon', 'text': 'Dark green theme with countdown sections'},
+]
+
+
+def test_bm25_ranks_matching_examples_first():
+    index = ExampleIndex(EXAMPLES)
+    assert [ex['id'] for ex in index.search('customer review with star ratings', k=1)] == ['t2']
+    assert [ex['id'] for ex in index.search('launch countdown', k=1)] == ['c1']
+    assert [ex['id'] for ex in index.search('blue stars', k=2, category='testimonial')] == ['t2']
+    assert index.summary()['examples_selected'] == 3
+
+
+def test_off_topic_query_gets_no_examples():
+    index = ExampleIndex(EXAMPLES)
+    assert index.search('logo for a tech startup') == []
+    assert index.search('bakery poster with bread images') == []
+    assert index.search('countdown', category='testimonial') == []
+
+
+def test_format_prefers_summaries_when_asked():
+    assert format_examples(EXAMPLES[1:2], field='summary') == '- Mint, stars'
+    assert format_examples(EXAMPLES[:1], field='summary') == '- Teal background, beige container, orange circles'
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+import time
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import hedging
+from llm_client import ChatResult
+
+
+def test_routes_are_configured_per_stage(monkeypatch):
+    monkeypatch.setattr(hedging, 'STAGE_ROUTES', {'design_brief': ['openrouter', 'openai:gpt-4o']})
+    assert hedging.stage_route_order('design_brief') == [('openrouter', None), ('openai', 'gpt-4o')]
+    assert hedging.stage_route_order('plan_design') == [('openai', None), ('openrouter', None)]
+
+
+def test_only_provider_side_failures_fail_over():
+    for status in (0, 429, 500, 503):
+        assert hedging.should_fail_over(ChatResult('openai', 'm', status, error='x'))
+    for status in (400, 401, 404):
+        assert not hedging.should_fail_over(ChatResult('openai', 'm', status, error='x'))
+    assert not hedging.should_fail_over(ChatResult('openai', 'm', 200, content='ok'))
+
+
+class FakeProviders:
+    """Stands in for llm_client.achat: each provider answers after a fixed latency"""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.started = []
+        self.cancelled = []
+
+    async def achat(self, model, messages, provider='openai', api_key=None, timeout=None, **params):
+        self.started.append(provider)
+        try:
+            await asyncio.sleep(self.latencies[provider])
+        except asyncio.CancelledError:
+            self.cancelled.append(provider)
+            raise
+        return ChatResult(provider, model, 200, content=provider)
+
+
+def _routes():
+    return [hedging.route('primary', 'hedge-test'), hedging.route('secondary', 'hedge-test')]
+
+
+def test_delay_is_p90_of_recent_latencies(monkeypatch):
+    monkeypatch.setattr(hedging, 'HEDGE_MIN_DELAY', 0.5)
+    stage = hedging.StageHedging('test-delay')
+    assert stage.delay() == hedging.HEDGE_DEFAULT_DELAY
+    for latency in range(1, hedging.HEDGE_MIN_SAMPLES + 1):
+        stage.record(float(latency))
+    assert stage.delay() == float(int(0.9 * (hedging.HEDGE_MIN_SAMPLES - 1)) + 1)
+
+    fast = hedging.StageHedging('test-delay-floor')
+    for _ in range(hedging.HEDGE_MIN_SAMPLES):
+        fast.record(0.1)
+    assert fast.delay() == 0.5
+
+
+def test_first_success_wins_and_loser_is_cancelled(monkeypatch):
+    providers = FakeProviders({'primary': 5.0, 'secondary': 0.05})
+    monkeypatch.setattr(hedging.llm_client, 'achat', providers.achat)
+    monkeypatch.setattr(hedging, 'HEDGE_DEFAULT_DELAY', 0.05)
+
+    async def call():
+        start = time.monotonic()
+        result = await hedging.ahedged_chat('test-hedge-win', _routes(), [])
+        elapsed = time.monotonic() - start
+        # Let the cancelled primary unwind
+        await asyncio.sleep(0)
+        return result, elapsed
+
+    result, elapsed = asyncio.run(call())
+    assert result.content == 'secondary' and elapsed < 1
+    assert providers.started == ['primary', 'secondary']
+    assert providers.cancelled == ['primary']
+    stats = hedging.stage_hedging('test-hedge-win').summary()
+    assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
+
+
+def test_primary_inside_the_delay_is_not_hedged(monkeypatch):
+    providers = FakeProviders({'primary': 0.01, 'secondary': 0.01})
+    monkeypatch.setattr(hedging.llm_client, 'achat', providers.achat)
+    monkeypatch.setattr(hedging, 'HEDGE_DEFAULT_DELAY', 1.0)
+
+    result = asyncio.run(hedging.ahedged_chat('test-hedge-fast', _routes(), []))
+    assert result.content == 'primary'
+    assert providers.started == ['primary']
+
+
+def test_hedges_stop_when_the_budget_is_spent(monkeypatch):
+    providers = FakeProviders({'primary': 0.2, 'secondary': 0.01})
+    monkeypatch.setattr(hedging.llm_client, 'achat', providers.achat)
+    monkeypatch.setattr(hedging, 'HEDGE_DEFAULT_DELAY', 0.02)
+    monkeypatch.setattr(hedging, 'HEDGE_BUDGETS', {'test-hedge-budget': 0})
+
+    async def calls():
+        return [await hedging.ahedged_chat('test-hedge-budget', _routes(), []) for _ in range(2)]
+
+    first, second = asyncio.run(calls())
+    # The starting credit pays for one hedge; with no budget the next call waits out the primary
+    assert first.content == 'secondary' and second.content == 'primary'
+    assert providers.started == ['primary', 'secondary', 'primary']
+    stats = hedging.stage_hedging('test-hedge-budget').summary()
+    assert stats['hedged'] == 1 and stats['budget_denied'] == 1
+
+
+def test_caller_default_order_applies_until_the_stage_is_configured(monkeypatch):
+    assert hedging.stage_route_order('ai_combine_svgs', ['openrouter', 'openai']) == [('openrouter', None), ('openai', None)]
+    monkeypatch.setattr(hedging, 'STAGE_ROUTES', {'ai_combine_svgs': ['openai:gpt-4o']})
+    assert hedging.stage_route_order('ai_combine_svgs', ['openrouter', 'openai']) == [('openai', 'gpt-4o')]
+
+
+def test_local_rejections_do_not_feed_the_hedge_delay(monkeypatch):
+    async def achat(model, messages, provider='openai', api_key=None, timeout=None, **params):
+        if model == 'rejected':
+            return ChatResult(provider, model, 503, error='Circuit open')
+        return ChatResult(provider, model, 500, error='upstream', headers={'x-request-id': '1'}, latency=0.01)
+
+    monkeypatch.setattr(hedging.llm_client, 'achat', achat)
+    for model in ('rejected', 'answered'):
+        asyncio.run(hedging.ahedged_chat(f'test-measured-{model}', [hedging.route('openai', model)], []))
+    assert hedging.stage_hedging('test-measured-rejected').summary()['samples'] == 0
+    assert hedging.stage_hedging('test-measured-answered').summary()['samples'] == 1
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+try:
+    import app
+except (ImportError, OSError, ValueError) as e:
+    # app needs its API keys and the cairo library at import
+    pytest.skip(f"app is not importable here: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def stage(name, value):
+        def fn(*args, **kwargs):
+            calls.append(name)
+            return value
+        return fn
+
+    monkeypatch.setattr(app, 'check_vector_suitability', stage('vector_suitability', {'not_suitable': False}))
+    monkeypatch.setattr(app, 'plan_design', stage('design_plan', 'plan'))
+    monkeypatch.setattr(app, 'generate_design_knowledge', stage('design_knowledge', 'knowledge'))
+    monkeypatch.setattr(app, 'pre_enhance_prompt', stage('pre_enhanced_prompt', 'pre-enhanced'))
+    monkeypatch.setattr(app, 'enhance_prompt_with_chat', stage('enhanced_prompt', 'enhanced'))
+    monkeypatch.setattr(app, 'generate_image_with_gpt', stage('generated_image', ('b64', 'image.png', None)))
+    monkeypatch.setattr(app, 'generate_svg_from_image', stage('svg_code', '<svg/>'))
+    monkeypatch.setattr(app, 'save_svg', stage('svg_saved', ('design.svg', 'sessions/design.svg', None)))
+    monkeypatch.setattr(app.similar_prompts, 'remember_artifacts', lambda *args: None)
+    test_client = app.app.test_client()
+    test_client.calls = calls
+    return test_client
+
+
+def generate(client, prompt, **body):
+    return client.post('/api/generate-svg', json=dict(body, prompt=prompt, reuse_similar=False))
+
+
+def test_enhanced_prompt_is_skipped_by_default(client):
+    response = generate(client, 'a poster with blue stars')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['enhanced_prompt'] is None and data['included'] == {}
+    assert data['stages']['prompt_enhancement']['skipped']
+    assert 'enhanced_prompt' not in client.calls
+
+
+def test_included_optional_stage_is_computed_and_returned(client):
+    response = generate(client, 'a poster with red stars', include='enhanced_prompt,design_context')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['enhanced_prompt'] == 'enhanced'
+    assert data['included']['enhanced_prompt'] == 'enhanced'
+    assert 'Design Plan:\nplan' in data['included']['design_context']
+    assert client.calls.count('enhanced_prompt') == 1
+
+
+def test_unknown_include_is_rejected(client):
+    response = generate(client, 'a poster with green stars', include=['svg_code'])
+    assert response.status_code == 400
+    assert "['svg_code']" in response.get_json()['error']
+    assert client.calls == []
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import time
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from job_queue import JobQueue
+
+
+def wait_for(queue, job_id, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job stayed {queue.get(job_id)['status']}")
+
+
+def test_job_runs_with_progress_and_result():
+    queue = JobQueue(os.path.join(tempfile.mkdtemp(), 'jobs.sqlite3'))
+
+    def handler(params, progress):
+        progress('plan', {'content': 'a plan'})
+        if params.get('fail'):
+            raise ValueError('boom')
+        return {'echo': params['prompt']}
+
+    queue.register('echo', handler)
+    ok = queue.submit('echo', {'prompt': 'poster'})
+    bad = queue.submit('echo', {'prompt': 'poster', 'fail': True})
+    assert queue.get(ok)['status'] == 'queued'
+    queue.start(workers=2)
+
+    job = wait_for(queue, ok, 'succeeded')
+    assert job['result'] == {'echo': 'poster'}
+    assert job['progress']['plan']['content'] == 'a plan'
+    assert wait_for(queue, bad, 'failed')['error'] == 'boom'
+
+
+def test_expired_lease_is_requeued_after_restart():
+    path = os.path.join(tempfile.mkdtemp(), 'jobs.sqlite3')
+    crashed = JobQueue(path)
+    crashed.register('echo', lambda params, progress: params)
+    job_id = crashed.submit('echo', {'prompt': 'x'})
+    assert crashed._claim()[0] == job_id
+    # Simulate the process dying mid-job
+    crashed._db.execute("UPDATE jobs SET lease_expires = ?", (time.time() - 1,))
+    crashed._db.commit()
+
+    restarted = JobQueue(path)
+    restarted.register('echo', lambda params, progress: params)
+    restarted.start(workers=1)
+    job = wait_for(restarted, job_id, 'succeeded')
+    assert job['attempts'] == 2
+    assert restarted.stats['requeued'] == 1
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import circuit_breaker
+import llm_client
+import rate_limiter
+
+
+def test_429_retries_count_as_one_breaker_outcome(monkeypatch):
+    statuses = [429, 429, 503]
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_RETRIES', 2)
+
+    async def send(provider, path, api_key, timeout, json_body=None, form=None, deadline=None):
+        return llm_client._RawResponse(statuses.pop(0), headers={'retry-after': '0.01'}, latency=0.01)
+
+    monkeypatch.setattr(llm_client, '_send', send)
+    raw = asyncio.run(llm_client._post('openai', '/chat/completions', 'key', 5, json_body={}, model='breaker-test'))
+    assert raw.status == 503 and statuses == []
+    assert list(circuit_breaker.get_breaker('openai', 'breaker-test').outcomes) == [True]
+
+
+def test_rate_limit_wait_that_uses_up_the_deadline_is_not_sent(monkeypatch):
+    timeouts = []
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_RETRIES', 2)
+
+    async def send(provider, path, api_key, timeout, json_body=None, form=None, deadline=None):
+        timeouts.append(timeout)
+        # The provider asks for a pause longer than what is left of the 0.2s deadline
+        return llm_client._RawResponse(429, headers={'retry-after': '0.5'}, latency=0.01)
+
+    monkeypatch.setattr(llm_client, '_send', send)
+    raw = asyncio.run(llm_client._post('openai', '/chat/completions', 'key', 0.2, json_body={}, model='deadline-test'))
+    assert raw.status == 429 and 'deadline' in raw.error
+    assert len(timeouts) == 1 and timeouts[0] > 0
+
+
+def test_reply_cut_off_at_max_tokens_is_truncated():
+    def result(finish_reason):
+        data = {'choices': [{'message': {'content': 'partial'}, 'finish_reason': finish_reason}]}
+        return llm_client.ChatResult('openai', 'm', 200, content='partial', data=data)
+
+    assert result('length').truncated
+    assert not result('stop').truncated
+    assert not llm_client.ChatResult('openai', 'm', 200, content='cached', cached=True).truncated
+
+
+def test_chat_stream_yields_chunks_then_holds_the_result(monkeypatch):
+    async def achat_stream(model, messages, on_delta, provider='openai', api_key=None, timeout=None, **params):
+        for chunk in ('Hel', 'lo'):
+            on_delta(chunk)
+            await asyncio.sleep(0.01)
+        return llm_client.ChatResult(provider, model, 200, content='Hello')
+
+    monkeypatch.setattr(llm_client, 'achat_stream', achat_stream)
+    stream = llm_client.ChatStream('m', [])
+    assert list(stream) == ['Hel', 'lo']
+    assert stream.result.ok and stream.result.content == 'Hello'
+
+
+def test_abandoned_chat_stream_cancels_the_request(monkeypatch):
+    async def achat_stream(model, messages, on_delta, provider='openai', api_key=None, timeout=None, **params):
+        on_delta('first')
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(llm_client, 'achat_stream', achat_stream)
+    stream = llm_client.ChatStream('m', [])
+    chunks = iter(stream)
+    assert next(chunks) == 'first'
+    chunks.close()
+    assert stream.future.cancelled()
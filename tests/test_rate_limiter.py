@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from rate_limiter import RateLimit, estimate_tokens, parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration('1s') == 1
+    assert parse_duration('6m0s') == 360
+    assert parse_duration('20ms') == 0.02
+    assert parse_duration('2') == 2
+    assert parse_duration(None) is None
+
+
+def test_estimate_counts_text_images_and_max_tokens():
+    messages = [
+        {'role': 'system', 'content': 'x' * 400},
+        {'role': 'user', 'content': [{'type': 'text', 'text': 'y' * 40}, {'type': 'image_url'}]}
+    ]
+    assert estimate_tokens(messages, max_tokens=100) == 110 + 1000 + 100
+
+
+def test_headers_drive_delay_and_deadline():
+    limit = RateLimit('test')
+    limit.update({'X-RateLimit-Limit-Requests': '600', 'X-RateLimit-Remaining-Requests': '1'})
+    assert limit.requests.capacity == 600
+
+    async def scenario():
+        assert await limit.acquire(1, max_wait=1)
+        # The bucket refills at 10 requests/s, so the next call waits ~0.1s
+        assert await limit.acquire(1, max_wait=1)
+        limit.throttled({'retry-after': '5'})
+        assert not await limit.acquire(1, max_wait=1)
+
+    asyncio.run(scenario())
+    assert limit.stats['delayed'] == 1
+    assert limit.stats['rejected'] == 1
+
+
+def test_queued_caller_keeps_its_own_deadline():
+    limit = RateLimit('test-deadline')
+    # One request per second, and the last one is about to be taken
+    limit.update({'X-RateLimit-Limit-Requests': '60', 'X-RateLimit-Remaining-Requests': '1'})
+
+    async def scenario():
+        assert await limit.acquire(1, max_wait=5)
+        patient = asyncio.ensure_future(limit.acquire(1, max_wait=5))
+        await asyncio.sleep(0.01)
+        start = asyncio.get_running_loop().time()
+        # Needs ~1s of refill, so it must give up now rather than queue behind the patient caller
+        assert not await limit.acquire(1, max_wait=0.2)
+        assert asyncio.get_running_loop().time() - start < 0.1
+        assert await patient
+
+    asyncio.run(scenario())
+
+
+def test_no_budget_left_is_refused():
+    limit = RateLimit('test-no-budget')
+    assert not asyncio.run(limit.acquire(1, max_wait=0))
+    assert asyncio.run(limit.acquire(1, max_wait=1))
+
+
+def test_waiters_are_served_in_arrival_order():
+    limit = RateLimit('test-fifo')
+    # 600 tokens a minute: the large call needs ~0.5s of refill, each small one ~0.1s
+    limit.update({'X-RateLimit-Limit-Tokens': '600', 'X-RateLimit-Remaining-Tokens': '0'})
+    served = []
+
+    async def call(name, tokens):
+        assert await limit.acquire(tokens, max_wait=5)
+        served.append(name)
+
+    async def scenario():
+        large = asyncio.ensure_future(call('large', 5))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(large, *(call(f'small{i}', 1) for i in range(3)))
+
+    asyncio.run(scenario())
+    assert served == ['large', 'small0', 'small1', 'small2']
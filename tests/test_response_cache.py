@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from response_cache import ResponseCache, make_key
+
+
+def test_key_covers_every_field():
+    base = make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1')
+    assert base == make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1')
+    assert base != make_key('gpt-4o-mini', 'system', 'user', 1, version='1')
+    assert base != make_key('gpt-4o-mini', 'system', 'user', 0.8, version='2')
+    assert base != make_key('gpt-4o', 'system', 'user', 0.8, version='1')
+    schema = {'type': 'json_schema', 'json_schema': {'name': 'brief'}}
+    assert base != make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1', response_format=schema)
+    assert make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1', response_format=schema) != make_key(
+        'gpt-4o-mini', 'system', 'user', 0.8, version='1', response_format={'type': 'json_object'})
+    assert base != make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1', max_tokens=200)
+    assert make_key('gpt-4o-mini', 'system', 'user', 0.8, version='1', max_tokens=200) != make_key(
+        'gpt-4o-mini', 'system', 'user', 0.8, version='1', max_tokens=4000)
+
+
+def test_key_covers_the_whole_conversation():
+    def conversation(answer):
+        return [{'role': 'user', 'content': 'Make a poster'}, {'role': 'assistant', 'content': answer},
+                {'role': 'user', 'content': 'Make it blue'}]
+
+    assert make_key('gpt-4o-mini', None, conversation('Red poster'), 0.7, version='1') != make_key(
+        'gpt-4o-mini', None, conversation('Green poster'), 0.7, version='1')
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / 'responses.sqlite3')
+    cache = ResponseCache(path)
+    assert cache.get('k') is None
+    cache.set('k', 'value')
+    assert cache.get('k') == 'value'
+    assert cache.stats['memory_hits'] == 1
+
+    restarted = ResponseCache(path)
+    assert restarted.get('k') == 'value'
+    assert restarted.stats['disk_hits'] == 1
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    expired = ResponseCache(str(tmp_path / 'ttl.sqlite3'), ttl=-1)
+    expired.set('k', 'value')
+    assert expired.get('k') is None
+
+    small = ResponseCache(str(tmp_path / 'size.sqlite3'), max_bytes=10)
+    small.set('old', 'x' * 8)
+    small.set('new', 'y' * 8)
+    assert small.get('old') is None
+    assert small.get('new') == 'y' * 8
+    assert small.stats['evictions'] == 1
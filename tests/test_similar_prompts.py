@@ -0,0 +1,33 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from similar_prompts import SimilarPromptIndex, normalize_prompt
+
+
+def test_reworded_prompts_normalize_alike():
+    assert normalize_prompt("coming soon poster for my bakery") == normalize_prompt("Bakery coming-soon posters")
+
+
+def test_lookup_respects_threshold_and_survives_restart(tmp_path):
+    path = str(tmp_path / 'similar.sqlite3')
+    index = SimilarPromptIndex(path)
+    index.remember('generate_parallel_svg', "coming soon poster for my bakery", {'design_plan': 'PLAN'})
+
+    match = index.lookup('generate_parallel_svg', "bakery coming-soon poster", threshold=0.8)
+    assert match['artifacts'] == {'design_plan': 'PLAN'}
+    assert match['similarity'] == 1.0
+    assert index.lookup('generate_parallel_svg', "testimonial card for a dentist", threshold=0.8) is None
+    assert index.lookup('generate_svg', "bakery coming-soon poster", threshold=0.8) is None
+
+    restarted = SimilarPromptIndex(path)
+    assert restarted.lookup('generate_parallel_svg', "poster: bakery coming soon", threshold=0.8) is not None
+
+
+def test_oldest_entries_are_pruned(tmp_path):
+    index = SimilarPromptIndex(str(tmp_path / 'similar.sqlite3'), max_entries=1)
+    index.remember('generate_svg', "red sale banner", {'design_plan': 'OLD'})
+    index.remember('generate_svg', "blue wedding invitation", {'design_plan': 'NEW'})
+    assert index.lookup('generate_svg', "red sale banner", threshold=0.8) is None
+    assert index.summary()['entries'] == 1
@@ -0,0 +1,33 @@
+import os
+import sys
+import threading
+import time
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from singleflight import SingleFlight, request_key
+
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight('test')
+    calls, results = [], []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    threads = [threading.Thread(target=lambda: results.append(group.do('k', slow))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert group.do('k', lambda: 'again') == ('again', False)
+
+
+def test_request_key_normalizes_prompt():
+    assert request_key('e', {'prompt': ' Bakery  poster', 'a': 1}) == request_key('e', {'a': 1, 'prompt': 'bakery poster'})
+    assert request_key('e', {'prompt': 'bakery poster'}) != request_key('other', {'prompt': 'bakery poster'})
@@ -0,0 +1,83 @@
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import speculative_image
+from speculative_image import SpeculativeImage, prompt_similarity, resolve_speculation
+
+USER_INPUT = "Coming soon poster for Luna Cafe with a crescent moon, navy background and gold text"
+ENHANCED = ("Create a coming soon poster with a deep navy background, featuring a glowing gold crescent moon "
+            "at the top center. The title 'Luna Cafe' is styled in an elegant gold serif font, centered below "
+            "the moon, with 'Coming Soon' in smaller gold uppercase letters.")
+UNRELATED = ("Create a dynamic banner with a warm gradient from bright orange to sunny yellow. The headline "
+             "'SUMMER SALE' is set in a chunky rounded display font, with palm trees along the bottom edge.")
+
+
+def speculation(done=None, error=None):
+    """SpeculativeImage over a fake generation future, finished with done or error if given"""
+    future = Future()
+    if done is not None:
+        future.set_result(done)
+    elif error is not None:
+        future.set_exception(error)
+    return SpeculativeImage(f"Create a professional poster design: {USER_INPUT}", lambda prompt: future,
+                            source=USER_INPUT)
+
+
+def generate_final(prompt):
+    return f'fresh:{prompt}'
+
+
+def test_similarity_looks_at_what_the_request_asked_for():
+    assert prompt_similarity(USER_INPUT, ENHANCED) >= speculative_image.SPECULATIVE_IMAGE_MIN_SIMILARITY
+    assert prompt_similarity(USER_INPUT, UNRELATED) < speculative_image.SPECULATIVE_IMAGE_MIN_SIMILARITY
+
+
+def test_keep_uses_the_speculative_image():
+    image = resolve_speculation(speculation(done='early'), None, None, 'keep')
+    assert image == 'early'
+
+
+def test_similar_final_prompt_keeps_the_speculative_image():
+    spec = speculation(done='early')
+    assert resolve_speculation(spec, 'image prompt', generate_final, 'similar', final_source=ENHANCED) == 'early'
+    assert spec.decision == 'kept'
+
+
+def test_diverging_final_prompt_cancels_the_generation():
+    spec = speculation()
+    image = resolve_speculation(spec, 'image prompt', generate_final, 'similar', final_source=UNRELATED)
+    assert image == 'fresh:image prompt'
+    assert spec.decision == 'cancelled' and spec.future.cancelled()
+
+
+def test_finished_speculation_is_discarded_not_cancelled():
+    before = dict(speculative_image.speculation_stats)
+    spec = speculation(done='early')
+    resolve_speculation(spec, 'image prompt', generate_final, 'similar', final_source=UNRELATED)
+    assert spec.decision == 'discarded'
+    assert speculative_image.speculation_stats['discarded'] == before['discarded'] + 1
+    assert speculative_image.speculation_stats['cancelled'] == before['cancelled']
+
+
+def test_failed_speculation_falls_back_to_the_final_prompt():
+    spec = speculation(error=RuntimeError('boom'))
+    assert resolve_speculation(spec, 'image prompt', generate_final, 'similar', final_source=ENHANCED) == 'fresh:image prompt'
+    assert spec.decision == 'failed'
+    with pytest.raises(RuntimeError):
+        resolve_speculation(speculation(error=RuntimeError('boom')), None, None, 'keep')
+
+
+def test_abandon_cancels_only_unresolved_speculations():
+    pending = speculation()
+    pending.abandon()
+    assert pending.decision == 'cancelled' and pending.future.cancelled()
+
+    kept = speculation(done='early')
+    resolve_speculation(kept, None, None, 'keep')
+    kept.abandon()
+    assert kept.decision == 'kept'
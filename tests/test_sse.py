@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import threading
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import sse
+from sse import sse_event, stream_work
+
+
+def parse(message):
+    """(event, data) of one SSE message"""
+    lines = message.rstrip('\n').split('\n')
+    assert lines[0].startswith('event: ') and lines[1].startswith('data: ') and len(lines) == 2
+    return lines[0][len('event: '):], json.loads(lines[1][len('data: '):])
+
+
+def test_event_framing():
+    message = sse_event('stage', {'stage': 'design_plan', 'content': 'line one\nline two'})
+    assert message.endswith('\n\n')
+    assert parse(message) == ('stage', {'stage': 'design_plan', 'content': 'line one\nline two'})
+
+
+def test_events_in_order_and_complete_carries_the_full_result():
+    def work(emit):
+        emit('stage', {'stage': 'a'})
+        emit('stage', {'stage': 'b'})
+        return {'svg_code': '<svg/>', 'stages': ['a', 'b']}
+
+    events = [parse(message) for message in stream_work(work, start=('start', {'original_prompt': 'p'}))]
+    assert events == [('start', {'original_prompt': 'p'}), ('stage', {'stage': 'a'}), ('stage', {'stage': 'b'}),
+                      ('complete', {'svg_code': '<svg/>', 'stages': ['a', 'b']})]
+
+
+def test_keep_alive_while_the_work_is_quiet(monkeypatch):
+    monkeypatch.setattr(sse, 'SSE_KEEPALIVE_SECONDS', 0.01)
+    release = threading.Event()
+
+    def work(emit):
+        release.wait(5)
+        return {'done': True}
+
+    stream = stream_work(work)
+    assert next(stream) == sse.KEEPALIVE
+    release.set()
+    messages = list(stream)
+    assert parse(messages[-1]) == ('complete', {'done': True})
+    assert set(messages[:-1]) <= {sse.KEEPALIVE}
+
+
+def test_failure_ends_the_stream_with_an_error_event():
+    class StageFailed(Exception):
+        stage = 'combined_svg'
+
+    def work(emit):
+        emit('stage', {'stage': 'text_svg'})
+        raise StageFailed('combine failed')
+
+    events = [parse(message) for message in stream_work(work)]
+    assert events[-1] == ('error', {'error': 'combine failed', 'stage': 'combined_svg', 'session_id': None})
+    assert [event for event, _ in events] == ['stage', 'error']
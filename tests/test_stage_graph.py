@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from stage_graph import StageGraph, StageError, StopPipeline, parse_include
+
+
+def sleepy(value, delay=0.2):
+    time.sleep(delay)
+    return value
+
+
+def build_graph():
+    graph = StageGraph('test')
+    graph.add('a', lambda x: sleepy(x + 1), deps=['x'])
+    graph.add('b', lambda x: sleepy(x * 10), deps=['x'])
+    graph.add('c', lambda a, b: a + b, deps=['a', 'b'])
+    return graph
+
+
+def test_independent_stages_overlap():
+    graph_run = build_graph().run({'x': 1})
+    assert graph_run['c'] == 12
+    # a and b sleep 0.2s each; run sequentially this would take 0.4s
+    assert graph_run.total_time < 0.35
+    assert graph_run.critical_path[-1] == 'c'
+    assert graph_run.timings['c']['critical_path_s'] >= 0
+
+
+def test_targets_only_run_required_stages():
+    graph_run = build_graph().run({'x': 1}, targets=['a'])
+    assert graph_run['a'] == 2
+    assert 'b' not in graph_run.results
+    assert graph_run.skipped == ['b', 'c']
+    assert graph_run.summary()['skipped'] == ['b', 'c']
+
+
+def test_seeded_values_skip_stages():
+    calls = []
+    graph = StageGraph('seeded')
+    graph.add('a', lambda x: calls.append('a') or x, deps=['x'])
+    graph.add('b', lambda a: a * 2, deps=['a'])
+    assert graph.run({'x': 1, 'a': 5})['b'] == 10
+    assert calls == []
+
+
+def test_stage_failure_is_wrapped():
+    graph = StageGraph('failing')
+    graph.add('a', lambda: 1 / 0)
+    with pytest.raises(StageError) as excinfo:
+        graph.run({})
+    assert excinfo.value.stage == 'a'
+
+
+def test_stop_pipeline_carries_payload():
+    graph = StageGraph('gate')
+
+    def gate():
+        raise StopPipeline({'not_suitable': True})
+
+    graph.add('gate', gate)
+    graph.add('after_gate', lambda: 1, after=['gate'])
+    with pytest.raises(StopPipeline) as excinfo:
+        graph.run({})
+    assert excinfo.value.payload == {'not_suitable': True}
+
+
+def test_cycles_are_rejected():
+    graph = StageGraph('cyclic')
+    graph.add('a', lambda b: b, deps=['b'])
+    graph.add('b', lambda a: a, deps=['a'])
+    with pytest.raises(ValueError):
+        graph.run({})
+
+
+def test_checkpointed_inputs_skip_stages_except_downstream():
+    calls = []
+    graph = StageGraph('resume')
+    graph.add('a', lambda: calls.append('a') or 1)
+    graph.add('b', lambda a: calls.append('b') or a + 1, deps=['a'])
+    graph.add('c', lambda b: calls.append('c') or b + 1, deps=['b'])
+    assert graph.downstream(['b']) == {'b', 'c'}
+
+    saved = {'a': 1, 'b': 2, 'c': 3}
+    inputs = {name: value for name, value in saved.items() if name not in graph.downstream(['b'])}
+    assert graph.run(inputs, targets=['c'])['c'] == 3
+    assert calls == ['b', 'c']
+
+
+def test_parse_include_accepts_only_optional_stages_of_the_graph():
+    graph = build_graph()
+    assert parse_include(None, graph, ('a', 'b')) == ([], None)
+    assert parse_include('b, a,a', graph, ('a', 'b')) == (['a', 'b'], None)
+    assert parse_include(['a'], graph, ('a', 'b')) == (['a'], None)
+
+    names, error = parse_include('c', graph, ('a', 'b'))
+    assert names is None and "['c']" in error
+    names, error = parse_include('missing', graph, ('missing',))
+    assert names is None and 'missing' in error
+    assert parse_include({'a': True}, graph, ('a',))[0] is None
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+try:
+    import app
+except (ImportError, OSError, ValueError) as e:
+    # app needs its API keys and the cairo library at import
+    pytest.skip(f"app is not importable here: {e}", allow_module_level=True)
+import llm_client
+
+
+def parse(body):
+    """(event, data) for each SSE message in a response body, keep-alive comments as ('keep-alive', None)"""
+    events = []
+    for message in body.split('\n\n'):
+        if not message:
+            continue
+        if message.startswith(':'):
+            events.append(('keep-alive', None))
+            continue
+        event_line, data_line = message.split('\n')
+        events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+    return events
+
+
+class FakeStream:
+    """Stands in for llm_client.ChatStream with fixed deltas"""
+
+    def __init__(self, chunks, ok=True):
+        self.chunks = chunks
+        self.result = None
+        self.ok = ok
+
+    def __iter__(self):
+        yield from self.chunks
+        self.result = llm_client.ChatResult('openai', 'm', 200 if self.ok else 500,
+                                            content=''.join(self.chunks) if self.ok else None,
+                                            error=None if self.ok else 'upstream')
+
+
+def chat(client, content):
+    response = client.post('/api/chat-assistant', json={'messages': [{'role': 'user', 'content': content}],
+                                                         'stream': True})
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    return parse(response.get_data(as_text=True))
+
+
+def test_chat_tokens_stream_and_done_carries_the_full_reply(monkeypatch):
+    monkeypatch.setattr(app, 'stream_chat_about_design', lambda messages, svg=None: FakeStream(['Hi ', 'there']))
+    events = chat(app.app.test_client(), 'hello, what can you do?')
+    assert events[:2] == [('token', {'phase': 'explanation', 'text': 'Hi '}),
+                          ('token', {'phase': 'explanation', 'text': 'there'})]
+    event, data = events[-1]
+    assert event == 'done' and data['response'] == 'Hi there'
+    assert data['messages'][-1] == {'role': 'assistant', 'content': 'Hi there'}
+
+
+def test_chat_creation_streams_the_svg_before_the_explanation(monkeypatch):
+    monkeypatch.setattr(app, 'create_chat_design', lambda message: ('<svg/>', 'sessions/a.svg', 'a.svg', 'a.png'))
+    monkeypatch.setattr(app, 'stream_chat_about_design', lambda messages, svg=None: FakeStream(['A poster']))
+    events = chat(app.app.test_client(), 'create a poster for a bake sale')
+    assert [event for event, _ in events] == ['status', 'svg', 'token', 'done']
+    assert events[1][1] == {'svg_code': '<svg/>', 'svg_path': 'sessions/a.svg'}
+    assert events[-1][1]['response'] == app.creation_response('A poster', '<svg/>')
+
+
+def test_chat_failure_ends_with_an_error_event(monkeypatch):
+    def fail(message):
+        raise RuntimeError('image generation failed')
+
+    monkeypatch.setattr(app, 'create_chat_design', fail)
+    events = chat(app.app.test_client(), 'create a poster for a bake sale')
+    assert events[-1] == ('error', {'error': 'image generation failed'})
+
+
+def test_parallel_stream_sends_stages_then_the_full_response(monkeypatch):
+    response = {'svg_code': '<svg/>', 'stages': {'combined': True}}
+
+    def pipeline(on_stage_complete=None, **params):
+        on_stage_complete('design_plan', 'plan')
+        on_stage_complete('speculation', object())
+        on_stage_complete('combined_svg', '<svg/>')
+        return response
+
+    monkeypatch.setattr(app, 'run_parallel_svg_pipeline', pipeline)
+    events = parse(''.join(app.stream_parallel_svg_events({'user_input': 'a poster'})))
+    assert events == [('start', {'original_prompt': 'a poster'}),
+                      ('stage', {'stage': 'design_plan', 'content': 'plan'}),
+                      ('stage', {'stage': 'combined_svg', 'code': '<svg/>'}),
+                      ('complete', response)]
+
+
+def test_parallel_stream_reports_the_failed_stage(monkeypatch):
+    def pipeline(on_stage_complete=None, **params):
+        error = app.StageError('combined_svg', RuntimeError('combine failed'))
+        error.session_id = 'parallel_1'
+        raise error
+
+    monkeypatch.setattr(app, 'run_parallel_svg_pipeline', pipeline)
+    event, data = parse(''.join(app.stream_parallel_svg_events({'user_input': 'a poster'})))[-1]
+    assert event == 'error' and data['stage'] == 'combined_svg' and data['session_id'] == 'parallel_1'
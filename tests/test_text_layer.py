@@ -0,0 +1,55 @@
+import os
+import sys
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from text_layer import build_text_svg, words_from_ocr_data
+
+
+def poster_png():
+    """Dark teal background with two orange bars standing in for rendered lines of text"""
+    image = Image.new('RGB', (400, 200), (10, 60, 70))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 40, 299, 69), fill=(240, 140, 30))
+    draw.rectangle((150, 110, 249, 129), fill=(240, 140, 30))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def ocr_data(second_conf):
+    return {
+        'text': ['COMING', 'SOON', 'launch', '~'],
+        'conf': [95, 93, second_conf, 10],
+        'left': [100, 210, 150, 5], 'top': [40, 40, 110, 5],
+        'width': [100, 90, 100, 4], 'height': [30, 30, 20, 4],
+        'block_num': [1, 1, 1, 2], 'par_num': [1, 1, 1, 1], 'line_num': [1, 1, 2, 1],
+    }
+
+
+def test_lines_get_local_colour_baseline_and_alignment():
+    words = words_from_ocr_data(ocr_data(91))
+    assert [w['text'] for w in words] == ['COMING', 'SOON', 'launch']
+
+    svg = build_text_svg(poster_png(), words=words)
+    assert svg.count('<text ') == 2
+    assert '>COMING SOON</text>' in svg
+    assert 'fill="#f08c1e"' in svg
+    # Both lines are centred on x=200 and sit on the bottom edge of their ink
+    assert 'x="200" y="70"' in svg and 'x="200" y="130"' in svg
+    assert 'text-anchor="middle"' in svg
+
+
+def test_only_low_confidence_lines_go_to_the_llm():
+    crops = []
+
+    def transcribe(png_bytes):
+        crops.append(Image.open(BytesIO(png_bytes)).size)
+        return 'Launching June 1'
+
+    svg = build_text_svg(poster_png(), transcribe=transcribe, words=words_from_ocr_data(ocr_data(40)))
+    assert crops == [(112, 32)]
+    assert '>Launching June 1</text>' in svg and '>COMING SOON</text>' in svg
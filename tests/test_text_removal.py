@@ -0,0 +1,58 @@
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from text_removal import remove_text
+
+WORDS = [{'text': 'SALE', 'conf': 95, 'left': 60, 'top': 40, 'width': 120, 'height': 40}]
+
+
+def png(image):
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def gradient_poster():
+    """Horizontal blue gradient with white strokes standing in for a word"""
+    ramp = np.linspace(40, 200, 240).astype(np.uint8)
+    pixels = np.zeros((120, 240, 3), dtype=np.uint8)
+    pixels[..., 2] = ramp
+    pixels[..., 1] = 30
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    for x in range(70, 170, 25):
+        draw.rectangle((x, 45, x + 8, 74), fill=(255, 255, 255))
+    return image, pixels
+
+
+def test_flat_or_gradient_background_is_filled_locally():
+    image, background = gradient_poster()
+    edited, report = remove_text(png(image), remote=lambda *args: b'remote', words=WORDS)
+    assert report['engine'] == 'local' and report['plane_fills'] == 4
+    restored = np.asarray(Image.open(BytesIO(edited)).convert('RGB')).astype(int)
+    assert np.abs(restored - background).max() <= 3
+
+
+def test_busy_background_uses_the_remote_edit_with_a_mask():
+    rng = np.random.default_rng(0)
+    noisy = Image.fromarray(rng.integers(0, 255, (120, 240, 3), dtype=np.uint8))
+    calls = []
+
+    def remote(image_bytes, mask_bytes):
+        calls.append(Image.open(BytesIO(mask_bytes)).mode)
+        return b'remote'
+
+    edited, report = remove_text(png(noisy), remote=remote, words=WORDS)
+    assert edited == b'remote' and report['engine'] == 'remote' and calls == ['RGBA']
+
+
+def test_no_text_returns_the_image_unchanged():
+    image, _ = gradient_poster()
+    data = png(image)
+    assert remove_text(data, words=[]) == (data, {'engine': 'none', 'reason': 'no text found'})
@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from vector_classifier import VectorClassifier, load_labels
+
+
+def test_confident_prompts_are_answered_locally(tmp_path):
+    classifier = VectorClassifier(decisions_path=str(tmp_path / 'decisions.jsonl'))
+    llm_calls = []
+
+    def ask_llm(prompt):
+        llm_calls.append(prompt)
+        return {'not_suitable': False, 'guidance': None}
+
+    suitable = classifier.check('Coming soon poster with bold typography for a bakery', ask_llm)
+    unsuitable = classifier.check('Photorealistic portrait photo of an old man, 8k', ask_llm)
+    assert suitable['not_suitable'] is False and suitable['source'] == 'local'
+    assert unsuitable['not_suitable'] is True and 'photograph' in unsuitable['guidance']
+    assert llm_calls == []
+
+    uncertain = classifier.check('A dog', ask_llm)
+    assert uncertain['source'] == 'llm' and llm_calls == ['A dog']
+    assert classifier.summary()['escalated'] == 1
+
+
+def test_failed_llm_call_allows_and_is_not_a_label(tmp_path):
+    path = tmp_path / 'decisions.jsonl'
+    classifier = VectorClassifier(decisions_path=str(path))
+    decision = classifier.check('A dog', lambda prompt: None)
+    assert decision['not_suitable'] is False and decision['source'] == 'default'
+    classifier.check('A cat', lambda prompt: {'not_suitable': True, 'guidance': 'no'})
+    assert load_labels(str(path)) == [('A cat', True)]
+    assert [json.loads(line)['source'] for line in path.read_text().splitlines()] == ['llm']
+
+
+def test_training_moves_uncertain_prompts_out_of_the_band():
+    classifier = VectorClassifier(decisions_path=None)
+    before = classifier.probability('dog mascot')
+    classifier.train([('dog mascot', False), ('cat mascot', False), ('fox mascot', False)])
+    assert classifier.probability('dog mascot') > before
+    assert classifier.probability('dog mascot') >= classifier.suitable_above
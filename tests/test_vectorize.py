@@ -0,0 +1,36 @@
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip('vtracer')
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from vectorize import image_to_svg
+
+
+def poster():
+    image = Image.new('RGB', (128, 128), (20, 40, 90))
+    ImageDraw.Draw(image).ellipse((30, 30, 98, 98), fill=(250, 120, 30))
+    return image
+
+
+def test_bytes_and_pixels_vectorize_without_touching_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    buffer = BytesIO()
+    poster().save(buffer, format='PNG')
+
+    from_bytes = image_to_svg(buffer.getvalue())
+    from_pixels = image_to_svg(np.asarray(poster()))
+    for svg_code in (from_bytes, from_pixels):
+        assert '<svg' in svg_code and '#fa781e' in svg_code.lower()
+    assert os.listdir(tmp_path) == []
+
+
+def test_options_override_the_shared_settings():
+    svg_code = image_to_svg(poster(), mode='polygon')
+    assert ' C' not in svg_code
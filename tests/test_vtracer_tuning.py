@@ -0,0 +1,55 @@
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip('vtracer')
+
+# Add server directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import vtracer_tuning
+from vtracer_tuning import PresetCache, choose, delta_e, image_to_svg, ssim
+
+
+def poster():
+    image = Image.new('RGB', (128, 128), (20, 40, 90))
+    ImageDraw.Draw(image).ellipse((30, 30, 98, 98), fill=(250, 120, 30))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue(), np.asarray(image)
+
+
+def test_fidelity_scores():
+    _, pixels = poster()
+    assert ssim(pixels, pixels) == pytest.approx(1.0)
+    assert delta_e(pixels, pixels) == 0
+    shifted = np.clip(pixels.astype(int) + 30, 0, 255).astype(np.uint8)
+    assert delta_e(pixels, shifted) > 5
+
+
+def test_smallest_faithful_candidate_wins_and_is_cached_per_class(monkeypatch):
+    monkeypatch.setattr(vtracer_tuning, 'SCORE_SIZE', 64)
+    data, pixels = poster()
+    renders = []
+
+    def render(svg_code, size):
+        renders.append(size)
+        return vtracer_tuning._score_pixels(pixels)
+
+    cache = PresetCache(None)
+    svg_code, report = image_to_svg(data, render=render, cache=cache)
+    assert report['preset'] == 0 and not report['cached'] and report['image_class'].startswith('few-')
+    assert len(renders) == len(vtracer_tuning.CANDIDATES) and renders[0] == (64, 64)
+
+    _, report = image_to_svg(data, render=render, cache=cache)
+    assert report['cached'] and report['preset'] == 0
+    assert len(renders) == len(vtracer_tuning.CANDIDATES) + 1
+
+
+def test_most_faithful_result_when_nothing_meets_the_target():
+    results = [{'index': 0, 'bytes': 10, 'paths': 1, 'ssim': 0.5, 'delta_e': 20},
+               {'index': 1, 'bytes': 90, 'paths': 9, 'ssim': 0.8, 'delta_e': 9}]
+    assert choose(results)['index'] == 1